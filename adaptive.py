@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+from datetime import datetime
+
+
+class ChangeStats:
+    """单个商品的状态变化历史"""
+    __slots__ = ('value', 'last_change', 'last_poll', 'mean_gap', 'hourly')
+
+    def __init__(self, now):
+        # 最近一次观察到的 (库存状态, 价格)
+        self.value = None
+        self.last_change = now
+        self.last_poll = None
+        # 两次变化之间间隔的指数移动平均，没有观察到变化前为None
+        self.mean_gap = None
+        # 按小时统计的变化次数（带衰减），用于识别变化集中的时段
+        self.hourly = [0.0] * 24
+
+
+class AdaptiveMetrics:
+    """自适应检查的效果统计：节省的请求数与发现变化的延迟"""
+
+    def __init__(self):
+        self.polls = 0
+        # 使用固定检查间隔时同样时间内需要的请求数
+        self.fixed_polls = 0.0
+        self.changes = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def summary(self):
+        saved = self.fixed_polls - self.polls
+        return {
+            'polls': self.polls,
+            'fixed_polls': round(self.fixed_polls),
+            'saved': round(saved),
+            'saved_ratio': round(saved / self.fixed_polls, 3) if self.fixed_polls else 0.0,
+            'changes': self.changes,
+            'avg_latency': round(self.latency_total / self.changes, 1) if self.changes else 0.0,
+            'max_latency': round(self.latency_max, 1),
+        }
+
+
+class AdaptivePolicy:
+    """根据商品的变化频率在上下限之间调整检查间隔
+
+    最近变化过、平均变化间隔短、或处在历史上变化集中时段的商品检查得更频繁，
+    长期稳定的商品逐渐放慢到上限。关闭时始终返回固定间隔，只统计效果。
+    """
+
+    # 期望每个平均变化间隔内检查的次数
+    POLLS_PER_CHANGE = 10
+    # 平均变化间隔和小时统计的衰减系数
+    GAP_ALPHA = 0.3
+    HOURLY_DECAY = 0.95
+
+    def __init__(self, base_interval, min_interval, max_interval, enabled=True, clock=time.time):
+        self.base_interval = base_interval
+        self.min_interval = min(min_interval, max_interval)
+        self.max_interval = max_interval
+        self.enabled = enabled
+        self.clock = clock
+        self.metrics = AdaptiveMetrics()
+
+    def new_stats(self):
+        return ChangeStats(self.clock())
+
+    def observe(self, stats, value):
+        """记录一次检查结果，返回该商品的下一次检查间隔"""
+        now = self.clock()
+        metrics = self.metrics
+        metrics.polls += 1
+        if stats.last_poll is not None:
+            metrics.fixed_polls += (now - stats.last_poll) / self.base_interval
+        else:
+            metrics.fixed_polls += 1
+
+        if stats.value is not None and value != stats.value:
+            gap = now - stats.last_change
+            stats.mean_gap = gap if stats.mean_gap is None else \
+                self.GAP_ALPHA * gap + (1 - self.GAP_ALPHA) * stats.mean_gap
+            stats.last_change = now
+
+            hour = datetime.fromtimestamp(now).hour
+            stats.hourly = [count * self.HOURLY_DECAY for count in stats.hourly]
+            stats.hourly[hour] += 1
+
+            # 变化发生在两次检查之间，延迟最多为距上次检查的时间
+            if stats.last_poll is not None:
+                latency = now - stats.last_poll
+                metrics.changes += 1
+                metrics.latency_total += latency
+                metrics.latency_max = max(metrics.latency_max, latency)
+
+        stats.value = value
+        stats.last_poll = now
+        return self.interval(stats, now)
+
+    def interval(self, stats, now):
+        """计算商品当前的检查间隔"""
+        if not self.enabled:
+            return self.base_interval
+
+        since = max(now - stats.last_change, self.min_interval)
+        expected = since if stats.mean_gap is None else min(stats.mean_gap, since)
+        interval = expected / self.POLLS_PER_CHANGE
+
+        # 当前小时的变化次数高于平均水平时相应缩短间隔
+        total = sum(stats.hourly)
+        if total > 0:
+            hour = datetime.fromtimestamp(now).hour
+            interval /= max(1.0, stats.hourly[hour] / (total / 24))
+
+        return min(self.max_interval, max(self.min_interval, interval))
@@ -1,10 +1,18 @@
-from flask import Flask, render_template, jsonify, request
-import subprocess
+from flask import Flask, Response, render_template, jsonify, request, stream_with_context
 import psutil
 import os
-import configparser
 import json
+import time
 from datetime import datetime
+from price_history import PriceHistory
+from config_store import ConfigStore
+from log_tail import tail_lines, read_since
+from log_stream import LogHub, stream_events, format_event
+from status_stream import StatusHub, format_status_event
+from worker_supervisor import WORKERS, SupervisorClient
+from sharding import ShardRegistry
+import metrics
+from structured_log import render_text, query_log, parse_level
 
 app = Flask(__name__)
 
@@ -16,49 +24,62 @@ def health_check():
 def get_env_config(key, default=None):
     return os.environ.get(key, default)
 
-# 脚本配置
-SCRIPTS = {
-    'weather': {
-        'name': '天气监控',
-        'file': 'weather.py',
-        'process': None,
-        'log_file': 'weather.log'
-    },
-    'jd_monitor': {
-        'name': '京东商品监控',
-        'file': 'jd_monitor.py',
-        'process': None,
-        'log_file': 'jd_monitor.log'
-    }
-}
+# 脚本配置，脚本由监督进程运行
+SCRIPTS = WORKERS
 
 # 配置文件路径
 CONFIG_FILE = 'config.ini'
 
+# 所有请求共享的配置缓存，文件修改后自动重新读取
+config_store = ConfigStore(CONFIG_FILE)
+
+# 每个日志文件只由一个后台线程读取，新增内容分发给所有推送连接
+log_hub = LogHub()
+
+# Web工作进程通过 RUN_DIR 中的文件向监督进程提交启动/停止请求并读取状态
+supervisor = SupervisorClient(get_env_config('RUN_DIR', 'run'))
+
+# 各监控进程定期把指标快照写入该目录
+METRICS_DIR = os.path.join(get_env_config('RUN_DIR', 'run'), 'metrics')
+
 def get_script_status(script_id):
     """获取脚本运行状态"""
-    script = SCRIPTS.get(script_id)
-    if not script:
+    if script_id not in SCRIPTS:
         return None
-    
-    # 检查进程是否在运行
-    if script['process'] and script['process'].poll() is None:
-        return 'running'
-    return 'stopped'
+    return supervisor.status([script_id])[script_id]['status']
+
+def collect_status():
+    """所有脚本的运行状态、进程号和重启次数"""
+    return supervisor.status(SCRIPTS)
+
+# psutil.Process按pid缓存，cpu_percent需要和上一次调用比较
+_processes = {}
+
+def sample_process(pid):
+    """进程的运行时长（秒）、内存占用（字节）和CPU占用率"""
+    process = _processes.get(pid)
+    if process is None or not process.is_running():
+        # 清理已退出的进程
+        for old_pid in [old_pid for old_pid, p in _processes.items() if not p.is_running()]:
+            del _processes[old_pid]
+        process = _processes[pid] = psutil.Process(pid)
+        process.cpu_percent(None)
+    with process.oneshot():
+        return {
+            'uptime': int(time.time() - process.create_time()),
+            'rss': process.memory_info().rss,
+            'cpu': process.cpu_percent(None)
+        }
+
+# 一个后台线程检查进程状态，只在状态变化时推送给所有打开的页面
+status_hub = StatusHub(collect_status, sample_process)
 
 @app.route('/')
 def index():
     # 获取配置数据
-    config = configparser.ConfigParser()
-    config_dict = {}
-    if os.path.exists(CONFIG_FILE):
-        config.read(CONFIG_FILE, encoding='utf-8')
-        for section in config.sections():
-            config_dict[section] = {}
-            for key, value in config.items(section):
-                config_dict[section][key] = value
+    config_dict = config_store.as_dict()
     
-    # 创建一个不包含process对象的scripts字典副本
+    # 页面只需要脚本的名称和文件
     scripts_data = {}
     for script_id, script in SCRIPTS.items():
         scripts_data[script_id] = {
@@ -78,41 +99,87 @@ def get_logs(script_id):
     try:
         log_file = script['log_file']
         lines = request.args.get('lines', default=50, type=int)
+        cursor = request.args.get('cursor')
         
         if not os.path.exists(log_file):
             return jsonify({'status': 'error', 'message': '日志文件不存在'})
         
-        with open(log_file, 'r', encoding='utf-8') as f:
-            log_content = f.readlines()
-        
-        # 获取最后N行
-        log_content = log_content[-lines:] if lines > 0 else log_content
+        # 带游标时只返回上次读取之后新增的内容，否则从文件末尾读取最后N行
+        if cursor:
+            log_content, cursor, reset = read_since(log_file, cursor, lines)
+        else:
+            log_content, cursor = tail_lines(log_file, lines)
+            reset = True
         
         return jsonify({
             'status': 'success', 
-            'data': ''.join(log_content),
+            'data': render_text(log_content),
+            'cursor': cursor,
+            'reset': reset,
             'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         })
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)})
 
+@app.route('/api/logs/<script_id>/stream')
+def stream_logs(script_id):
+    script = SCRIPTS.get(script_id)
+    if not script or 'log_file' not in script:
+        return jsonify({'status': 'error', 'message': '日志不存在'})
+    
+    log_file = script['log_file']
+    if not os.path.exists(log_file):
+        return jsonify({'status': 'error', 'message': '日志文件不存在'})
+    
+    # 先发送最后N行（重连时只补齐缺少的部分），之后只推送新增的日志行
+    subscription, initial = log_hub.subscribe(
+        log_file,
+        lines=request.args.get('lines', default=100, type=int),
+        last_cursor=request.headers.get('Last-Event-ID') or request.args.get('cursor')
+    )
+    return Response(
+        stream_with_context(stream_events(subscription, initial, format=format_log_event)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def format_log_event(event):
+    """JSON行日志转换为文本后推送"""
+    kind, text, cursor = event
+    return format_event((kind, render_text(text), cursor))
+
+@app.route('/api/logs/<script_id>/query')
+def query_logs(script_id):
+    """按级别、商品ID和时间范围（Unix时间戳）查询日志，通过偏移索引定位，不扫描整个文件"""
+    script = SCRIPTS.get(script_id)
+    if not script or 'log_file' not in script:
+        return jsonify({'status': 'error', 'message': '日志不存在'})
+    
+    level = request.args.get('level')
+    if level and parse_level(level) is None:
+        # 无法识别的级别不能当作不过滤，否则会返回全部日志
+        return jsonify({'status': 'error', 'message': f'无效的日志级别: {level}'})
+    
+    try:
+        records = query_log(
+            script['log_file'],
+            level=level,
+            sku=request.args.get('sku'),
+            start=request.args.get('start', type=float),
+            end=request.args.get('end', type=float),
+            limit=max(1, min(request.args.get('limit', default=200, type=int), 5000))
+        )
+        return jsonify({'status': 'success', 'data': records})
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)})
+
 @app.route('/api/config')
 def get_config():
     try:
-        if not os.path.exists(CONFIG_FILE):
+        if not config_store.exists():
             return jsonify({'status': 'error', 'message': '配置文件不存在'})
         
-        config = configparser.ConfigParser()
-        config.read(CONFIG_FILE, encoding='utf-8')
-        
-        # 将配置转换为字典
-        config_dict = {}
-        for section in config.sections():
-            config_dict[section] = {}
-            for key, value in config.items(section):
-                config_dict[section][key] = value
-        
-        return jsonify({'status': 'success', 'data': config_dict})
+        return jsonify({'status': 'success', 'data': config_store.as_dict()})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)})
 
@@ -124,23 +191,11 @@ def update_config():
         
         config_data = request.json
         
-        if not os.path.exists(CONFIG_FILE):
+        if not config_store.exists():
             return jsonify({'status': 'error', 'message': '配置文件不存在'})
         
-        config = configparser.ConfigParser()
-        config.read(CONFIG_FILE, encoding='utf-8')
-        
-        # 更新配置
-        for section, section_data in config_data.items():
-            if section not in config:
-                config.add_section(section)
-            
-            for key, value in section_data.items():
-                config.set(section, key, str(value))
-        
-        # 保存配置
-        with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-            config.write(f)
+        # 更新并原子写入配置
+        config_store.update(config_data)
         
         return jsonify({'status': 'success', 'message': '配置已更新'})
     except Exception as e:
@@ -156,9 +211,10 @@ def start_script(script_id):
         return jsonify({'status': 'error', 'message': '脚本已在运行'})
     
     try:
-        script['process'] = subprocess.Popen(['python3', script['file']], 
-                                            stdout=subprocess.PIPE,
-                                            stderr=subprocess.PIPE)
+        # 记录期望状态，由监督进程启动脚本并在意外退出后自动重启
+        supervisor.set_desired(script_id, True)
+        supervisor.ensure_running()
+        status_hub.refresh()
         return jsonify({'status': 'success', 'message': f'{script["name"]}已启动'})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)})
@@ -173,15 +229,30 @@ def stop_script(script_id):
         return jsonify({'status': 'error', 'message': '脚本未在运行'})
     
     try:
-        process = psutil.Process(script['process'].pid)
-        for child in process.children(recursive=True):
-            child.terminate()
-        process.terminate()
-        script['process'] = None
+        supervisor.set_desired(script_id, False)
+        status_hub.refresh()
         return jsonify({'status': 'success', 'message': f'{script["name"]}已停止'})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)})
 
+@app.route('/api/status')
+def all_status():
+    """所有脚本的状态汇总，包括进程号、运行时长、内存和CPU占用"""
+    try:
+        return jsonify({'status': 'success', 'data': status_hub.snapshot()})
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)})
+
+@app.route('/api/status/stream')
+def stream_status():
+    # 连接时发送全部状态，之后只在状态变化时推送
+    subscription, initial = status_hub.subscribe()
+    return Response(
+        stream_with_context(stream_events(subscription, initial, format=format_status_event)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/api/status/<script_id>')
 def script_status(script_id):
     status = get_script_status(script_id)
@@ -189,6 +260,44 @@ def script_status(script_id):
         return jsonify({'status': 'error', 'message': '脚本不存在'})
     return jsonify({'status': 'success', 'data': status})
 
+@app.route('/api/history/<product_id>')
+def get_history(product_id):
+    try:
+        history = PriceHistory(config_store.get('History', 'path', 'history'))
+        
+        records = history.query(
+            product_id,
+            start=request.args.get('start', type=int),
+            end=request.args.get('end', type=int),
+            limit=request.args.get('limit', default=1000, type=int)
+        )
+        return jsonify({'status': 'success', 'data': records})
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)})
+
+@app.route('/api/shards')
+def get_shards():
+    """京东监控各分片的心跳和负责的商品数"""
+    try:
+        path = config_store.get('Shard', 'path', 'shards.db')
+        if not os.path.exists(path):
+            return jsonify({'status': 'success', 'data': {'epoch': 0, 'members': {}}})
+        
+        registry = ShardRegistry(path)
+        try:
+            epoch, _ = registry.members()
+            return jsonify({'status': 'success', 'data': {'epoch': epoch, 'members': registry.status()}})
+        finally:
+            registry.close()
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)})
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """汇总所有监控进程的指标，Prometheus文本格式，按 process 标签区分进程"""
+    return Response(metrics.render(metrics.load_snapshots(METRICS_DIR)),
+                    content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/wxpusher/callback', methods=['POST'])
 def wxpusher_callback():
     try:
@@ -196,21 +305,15 @@ def wxpusher_callback():
         if data and 'data' in data and 'uid' in data['data']:
             uid = data['data']['uid']
             
-            # 读取现有配置
-            config = configparser.ConfigParser()
-            config.read(CONFIG_FILE, encoding='utf-8')
-            
-            # 获取现有的uids列表
-            current_uids = json.loads(config.get('WxPusher', 'uids'))
+            # 如果uid不在列表中，添加它；在写锁内读取最新配置，避免和页面保存配置互相覆盖
+            def add_uid(config):
+                current_uids = json.loads(config.get('WxPusher', 'uids'))
+                if uid not in current_uids:
+                    current_uids.append(uid)
+                    config.set('WxPusher', 'uids', json.dumps(current_uids))
             
-            # 如果uid不在列表中，添加它
-            if uid not in current_uids:
-                current_uids.append(uid)
-                config.set('WxPusher', 'uids', json.dumps(current_uids))
-                
-                # 保存更新后的配置
-                with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-                    config.write(f)
+            if uid not in json.loads(config_store.get('WxPusher', 'uids', '[]')):
+                config_store.modify(add_uid)
                     
             return jsonify({'status': 'success', 'message': 'UID已更新'})
         return jsonify({'status': 'error', 'message': '无效的请求数据'})
@@ -218,5 +321,7 @@ def wxpusher_callback():
         return jsonify({'status': 'error', 'message': str(e)})
 
 if __name__ == '__main__':
+    # 开发调试用；生产环境使用 gunicorn -c gunicorn.conf.py wsgi:app
     port = int(get_env_config('PORT', 7860))
-    app.run(host='0.0.0.0', debug=True,port=port)
\ No newline at end of file
+    debug = get_env_config('FLASK_DEBUG', '0') == '1'
+    app.run(host='0.0.0.0', debug=debug, port=port, threaded=True)
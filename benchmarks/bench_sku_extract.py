@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""商品ID提取的微基准：原来的逐个正则+查询参数解析 对比 预编译的单个正则
+
+用法: python benchmarks/bench_sku_extract.py [链接数量]
+"""
+
+import re
+import sys
+import os
+import timeit
+from urllib.parse import urlparse, parse_qs
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sku_extract import extract_sku, iter_skus
+
+
+def legacy_extract(url):
+    """原 extract_product_id 中的提取逻辑（不含短链接解析）"""
+    patterns = [
+        r'item\.jd\.com\/(\d+)\.html',
+        r'product\/(\d+)\.html',
+        r'\?id=(\d+)'
+    ]
+    for pattern in patterns:
+        match = re.search(pattern, url)
+        if match:
+            return match.group(1)
+    query_params = parse_qs(urlparse(url).query)
+    for param in ['id', 'productId', 'product_id', 'sku', 'skuId']:
+        if param in query_params:
+            return query_params[param][0]
+    return None
+
+
+def make_urls(count):
+    templates = [
+        'https://item.jd.com/{}.html',
+        'https://item.m.jd.com/product/{}.html?sid=abc',
+        'https://so.m.jd.com/ware/view.action?from=share&skuId={}',
+        'https://3.cn/{}-x',
+    ]
+    return [templates[i % len(templates)].format(100000000000 + i) for i in range(count)]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    urls = make_urls(count)
+    lines = [f'【京东】分享 {url} 快来看看' for url in urls]
+
+    for name, func in (
+        ('legacy', lambda: [legacy_extract(url) for url in urls]),
+        ('compiled', lambda: [extract_sku(url) for url in urls]),
+        ('pipeline', lambda: list(iter_skus(lines))),
+    ):
+        best = min(timeit.repeat(func, number=1, repeat=5))
+        print(f"{name:>9}: {best / count * 1e9:8.0f} ns/url  ({count} urls, {best * 1000:.1f} ms)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""getWareBusiness响应解析的微基准：完整json.loads 对比 只解析用到的字段 对比 内容未变时的哈希比较
+
+用法: python benchmarks/bench_ware_business.py [促销条目数]
+"""
+
+import hashlib
+import json
+import sys
+import os
+import timeit
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from jd_api import extract_fields, parse_ware_business
+
+
+def make_body(activities):
+    """模拟的响应：用到的字段很小，促销、店铺和服务信息占大部分体积"""
+    data = {
+        'promotion': {'activity': [{'text': '满199减20', 'skus': list(range(30)), 'limit': 2} for _ in range(activities)]},
+        'shopInfo': {'shop': {'name': '京东自营', 'score': [4.9] * 100}},
+        'wareInfo': {'wname': '测试商品', 'images': ['jfs/t1/example.jpg'] * 50},
+        'stockInfo': {'stockState': 33, 'stockDesc': '有货'},
+        'price': {'p': '99.00', 'op': '129.00'},
+        'servicesInfo': [{'name': '服务', 'desc': '说明' * 50} for _ in range(20)],
+        'yuyueInfo': {'startTime': 1700000000000},
+    }
+    return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+
+def main():
+    activities = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    body = make_body(activities)
+    number = 2000
+
+    for name, func in (
+        ('json.loads', lambda: parse_ware_business(json.loads(body))),
+        ('extract', lambda: parse_ware_business(extract_fields(body))),
+        ('unchanged', lambda: hashlib.blake2b(body, digest_size=8).digest()),
+    ):
+        best = min(timeit.repeat(func, number=number, repeat=5))
+        print(f"{name:>10}: {best / number * 1e6:8.1f} us/check  ({len(body)} bytes)")
+
+
+if __name__ == '__main__':
+    main()
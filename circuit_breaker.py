@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+# 错误分类：
+# network   连接失败、超时
+# http_5xx  服务器错误
+# json      响应不是有效的JSON
+# blocked   403/429，被限流或封禁
+# captcha   返回了验证码页面
+# http_4xx  其他客户端错误（如商品不存在），与接口是否可用无关
+COUNTED_ERRORS = ('network', 'http_5xx', 'json')
+# 反爬拦截出现一次就熔断，继续请求只会延长封禁
+TRIP_ERRORS = ('blocked', 'captcha')
+# 短时间内重试可能成功的错误
+RETRYABLE_ERRORS = ('network', 'http_5xx', 'json')
+
+CAPTCHA_MARKERS = (b'captcha', b'\xe9\xaa\x8c\xe8\xaf\x81', b'risk_handler', b'passport.jd.com')  # 验证
+
+
+class RequestError(Exception):
+    """分类后的请求失败，kind为错误类别"""
+
+    def __init__(self, kind, message):
+        super().__init__(message)
+        self.kind = kind
+
+
+class CircuitOpenError(Exception):
+    """熔断期间拒绝请求"""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"{name} 熔断中，{retry_after:.0f}秒后重试")
+        self.name = name
+        self.retry_after = retry_after
+
+
+def classify_response(status, body):
+    """按状态码和内容判断JSON接口的响应是否失败，返回错误类别，正常时返回None"""
+    if status == 304:
+        return None
+    if status in (403, 429):
+        return 'blocked'
+    if status >= 500:
+        return 'http_5xx'
+    if status >= 400:
+        return 'http_4xx'
+    head = body[:512].lstrip()
+    if head.startswith(b'<'):
+        lowered = body[:4096].lower()
+        return 'captcha' if any(marker in lowered for marker in CAPTCHA_MARKERS) else 'json'
+    if not head.startswith((b'{', b'[')):
+        return 'json'
+    return None
+
+
+def decorrelated_jitter(previous, base, cap, rng=random):
+    """去相关抖动的指数退避：在 [base, previous*3] 中随机取值，不超过cap"""
+    return min(cap, rng.uniform(base, max(base, previous) * 3))
+
+
+class CircuitBreaker:
+    """单个接口（主机）的熔断器，所有商品的请求共享
+
+    连续失败 threshold 次或遇到反爬拦截时熔断，熔断期间直接拒绝请求；
+    到期后进入半开状态，只放行一个探测请求：成功则恢复，失败则按
+    去相关抖动的指数退避延长熔断时间。
+    """
+
+    def __init__(self, name, threshold=5, base_delay=30.0, max_delay=600.0, probe_timeout=60.0,
+                 clock=time.monotonic, rng=random):
+        self.name = name
+        self.threshold = threshold
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.probe_timeout = probe_timeout
+        self.clock = clock
+        self.rng = rng
+        self.lock = threading.Lock()
+        # closed / open / half_open
+        self.state = 'closed'
+        self.failures = 0
+        self.delay = 0.0
+        self.open_until = 0.0
+        self.probe_started = None
+
+    def allow(self):
+        """是否可以发送请求；半开状态下只放行一个探测请求"""
+        with self.lock:
+            if self.state == 'closed':
+                return True
+            now = self.clock()
+            if self.state == 'open':
+                if now < self.open_until:
+                    return False
+                self.state = 'half_open'
+            # 探测请求没有结果（如线程卡住）时允许再发一个
+            if self.probe_started is not None and now - self.probe_started < self.probe_timeout:
+                return False
+            self.probe_started = now
+            return True
+
+    def retry_after(self):
+        with self.lock:
+            if self.state != 'open':
+                return 0.0
+            return max(0.0, self.open_until - self.clock())
+
+    def record_success(self):
+        with self.lock:
+            recovered = self.state != 'closed'
+            self.state = 'closed'
+            self.failures = 0
+            self.delay = 0.0
+            self.probe_started = None
+        if recovered:
+            logging.info(f"{self.name} 探测请求成功，已恢复")
+
+    def record_failure(self, kind):
+        """记录一次失败，返回是否因此熔断"""
+        if kind not in COUNTED_ERRORS and kind not in TRIP_ERRORS:
+            # 探测请求得到了正常的4xx响应（如商品不存在），说明接口已经可用
+            if self.state == 'half_open':
+                self.record_success()
+            return False
+        with self.lock:
+            self.failures += 1
+            if self.state == 'closed' and kind not in TRIP_ERRORS and self.failures < self.threshold:
+                return False
+            self.delay = decorrelated_jitter(self.delay or self.base_delay, self.base_delay, self.max_delay, self.rng)
+            self.state = 'open'
+            self.open_until = self.clock() + self.delay
+            self.probe_started = None
+            delay, failures = self.delay, self.failures
+        logging.warning(f"{self.name} 请求失败({kind})，连续失败{failures}次，熔断{delay:.0f}秒")
+        return True
+
+    def state_value(self):
+        """0 正常，1 半开，2 熔断"""
+        return {'closed': 0, 'half_open': 1, 'open': 2}[self.state]
+
+
+class BreakerRegistry:
+    """按主机分配熔断器，同一主机的所有请求共享"""
+
+    def __init__(self, **options):
+        self.options = options
+        self.breakers = {}
+        self.lock = threading.Lock()
+
+    def configure(self, **options):
+        """修改熔断参数，已有的熔断器立即生效"""
+        with self.lock:
+            self.options.update(options)
+            for breaker in self.breakers.values():
+                for name, value in options.items():
+                    setattr(breaker, name, value)
+
+    def get(self, url):
+        """返回URL所属主机的熔断器，也可以直接传入主机名"""
+        host = urlsplit(url).netloc or url
+        with self.lock:
+            breaker = self.breakers.get(host)
+            if breaker is None:
+                breaker = self.breakers[host] = CircuitBreaker(host, **self.options)
+            return breaker
+
+    def states(self):
+        """各主机的熔断状态，导出指标时调用"""
+        with self.lock:
+            breakers = list(self.breakers.items())
+        return {(('host', host),): breaker.state_value() for host, breaker in breakers}
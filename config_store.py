@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import configparser
+import copy
+import os
+import stat
+import tempfile
+import threading
+from contextlib import contextmanager
+from config_watcher import ConfigWatcher
+
+try:
+    import fcntl
+except ImportError:  # Windows下没有fcntl，只能保证进程内的写入互斥
+    fcntl = None
+
+
+class ConfigStore:
+    """缓存解析结果的配置文件读写
+
+    读取时只stat一次文件，修改时间等没变就直接返回缓存；
+    写入时加锁（进程内线程锁 + 跨进程文件锁），在最新内容上修改后
+    写入临时文件再原子替换，并发写入不会互相覆盖或留下半个文件。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.RLock()
+        self.watcher = ConfigWatcher(path)
+        self.data = self._read()
+
+    def _read(self):
+        config = configparser.ConfigParser()
+        if os.path.exists(self.path):
+            config.read(self.path, encoding='utf-8')
+        return {section: dict(config.items(section)) for section in config.sections()}
+
+    def _refresh(self):
+        with self.lock:
+            if self.watcher.changed():
+                self.data = self._read()
+            return self.data
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def as_dict(self):
+        """返回全部配置的副本：section -> {key: value}"""
+        return copy.deepcopy(self._refresh())
+
+    def get(self, section, option, fallback=None):
+        return self._refresh().get(section, {}).get(option, fallback)
+
+    @contextmanager
+    def _write_lock(self):
+        with self.lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.path + '.lock', 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def modify(self, func):
+        """在最新的配置上调用 func(ConfigParser) 并原子写回，返回func的返回值"""
+        with self._write_lock():
+            config = configparser.ConfigParser()
+            config.read(self.path, encoding='utf-8')
+            result = func(config)
+
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp_path = tempfile.mkstemp(prefix='.config.', suffix='.tmp', dir=directory)
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    config.write(f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                if os.path.exists(self.path):
+                    os.chmod(tmp_path, stat.S_IMODE(os.stat(self.path).st_mode))
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+            self.watcher.changed()
+            self.data = {section: dict(config.items(section)) for section in config.sections()}
+            return result
+
+    def update(self, changes):
+        """按 section -> {key: value} 合并更新配置"""
+        def apply(config):
+            for section, section_data in changes.items():
+                if section not in config:
+                    config.add_section(section)
+                for key, value in section_data.items():
+                    config.set(section, key, str(value))
+        self.modify(apply)
@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+
+
+class ConfigWatcher:
+    """通过轮询文件的修改时间、大小和inode检测文件变化
+
+    每次检查只有一次stat调用，可以放在监控循环中频繁调用。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.signature = self._stat()
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def changed(self):
+        """文件自上次检查以来发生变化时返回True"""
+        signature = self._stat()
+        if signature != self.signature:
+            self.signature = signature
+            return True
+        return False
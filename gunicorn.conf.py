@@ -0,0 +1,30 @@
+# gunicorn配置：gunicorn -c gunicorn.conf.py wsgi:app
+# 所有参数都可以通过环境变量调整
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '7860')}"
+
+# 多个工作进程，每个进程用线程处理请求；日志和状态推送是长连接，
+# 每个连接占用一个线程，线程数需要大于同时打开的页面数
+workers = int(os.environ.get('WEB_WORKERS', '2'))
+worker_class = 'gthread'
+threads = int(os.environ.get('WEB_THREADS', '16'))
+
+# 长连接保持时间、工作进程无响应多久后重启、收到停止信号后等待请求完成的时间（秒）
+keepalive = int(os.environ.get('WEB_KEEPALIVE', '5'))
+timeout = int(os.environ.get('WEB_TIMEOUT', '60'))
+graceful_timeout = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', '30'))
+
+# 处理一定数量的请求后重启工作进程，避免内存缓慢增长
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', '10000'))
+max_requests_jitter = max_requests // 10
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('WEB_LOG_LEVEL', 'info')
+
+
+def on_starting(server):
+    # 启动监督进程运行监控脚本，上次设置为运行的脚本会自动恢复
+    from worker_supervisor import SupervisorClient
+    SupervisorClient(os.environ.get('RUN_DIR', 'run')).ensure_running()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import base64
+import gzip
+import http.client
+import ssl
+import threading
+import time
+import urllib.request
+from collections import namedtuple
+from urllib.parse import unquote, urlsplit
+
+# status为状态码，headers不区分大小写，body为解压后的响应内容
+HTTPResult = namedtuple('HTTPResult', ['status', 'reason', 'headers', 'body'])
+
+# 复用的连接已被服务器关闭时出现的错误，换新连接重试一次
+STALE_ERRORS = (http.client.RemoteDisconnected, http.client.BadStatusLine, ConnectionResetError,
+                BrokenPipeError, ConnectionAbortedError)
+
+# 服务器可能已经处理过请求时，只有这些方法可以安全地重发
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE', 'TRACE')
+
+
+class ConnectionPool:
+    """按主机复用 http.client 连接，不依赖requests也能保持长连接
+
+    每个 (协议, 主机, 端口) 最多保留 max_idle 个空闲连接，空闲超过
+    idle_timeout 秒的连接不再使用；复用的连接已被服务器关闭时，幂等的请求
+    自动重新建立连接重试一次。请求带 Accept-Encoding: gzip，响应自动解压。
+    与 urlopen 一样使用 HTTP(S)_PROXY / NO_PROXY 环境变量中的代理，
+    HTTPS 请求通过 CONNECT 隧道。
+    """
+
+    def __init__(self, headers=None, timeout=15.0, max_idle=4, idle_timeout=60.0, compress=True,
+                 clock=time.monotonic, proxies=None):
+        self.headers = dict(headers or {})
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.compress = compress
+        self.clock = clock
+        self.ssl_context = ssl.create_default_context()
+        # 协议 -> 代理地址，默认读取环境变量
+        self.proxies = urllib.request.getproxies() if proxies is None else proxies
+        # (协议, 主机, 端口) -> [(连接, 放回时间)]
+        self.idle = {}
+        self.lock = threading.Lock()
+        # 新建连接的次数，用于观察复用效果
+        self.connects = 0
+
+    def _proxy_for(self, scheme, host):
+        """返回 (代理地址, 代理认证请求头)，不使用代理时返回 (None, {})"""
+        proxy = self.proxies.get(scheme)
+        if not proxy or urllib.request.proxy_bypass_environment(host, self.proxies):
+            return None, {}
+        if '://' not in proxy:
+            proxy = f"http://{proxy}"
+        parts = urlsplit(proxy)
+        headers = {}
+        if parts.username:
+            credentials = f"{unquote(parts.username)}:{unquote(parts.password or '')}"
+            headers['Proxy-Authorization'] = 'Basic ' + base64.b64encode(credentials.encode('utf-8')).decode('ascii')
+        return parts, headers
+
+    def _new_connection(self, key, timeout):
+        scheme, host, port = key
+        self.connects += 1
+        proxy, proxy_headers = self._proxy_for(scheme, host)
+        if proxy is None:
+            if scheme == 'https':
+                return http.client.HTTPSConnection(host, port, timeout=timeout, context=self.ssl_context)
+            return http.client.HTTPConnection(host, port, timeout=timeout)
+        if scheme == 'https':
+            conn = http.client.HTTPSConnection(proxy.hostname, proxy.port or 80, timeout=timeout,
+                                               context=self.ssl_context)
+            conn.set_tunnel(host, port, headers=proxy_headers)
+            return conn
+        return http.client.HTTPConnection(proxy.hostname, proxy.port or 80, timeout=timeout)
+
+    def _acquire(self, key, timeout):
+        """取出一个未过期的空闲连接，没有时新建，返回 (连接, 是否复用)"""
+        now = self.clock()
+        with self.lock:
+            idle = self.idle.get(key, [])
+            while idle:
+                conn, released = idle.pop()
+                if now - released <= self.idle_timeout:
+                    break
+                conn.close()
+            else:
+                conn = None
+        if conn is None:
+            return self._new_connection(key, timeout), False
+        conn.timeout = timeout
+        if conn.sock is not None:
+            try:
+                conn.sock.settimeout(timeout)
+            except OSError:
+                conn.close()
+                return self._new_connection(key, timeout), False
+        return conn, True
+
+    def _release(self, key, conn):
+        with self.lock:
+            idle = self.idle.setdefault(key, [])
+            if len(idle) < self.max_idle:
+                idle.append((conn, self.clock()))
+                return
+        conn.close()
+
+    def request(self, method, url, body=None, headers=None, timeout=None):
+        """发送请求并读取完整响应，网络错误时抛出OSError或http.client.HTTPException"""
+        parts = urlsplit(url)
+        scheme = parts.scheme or 'http'
+        port = parts.port or (443 if scheme == 'https' else 80)
+        key = (scheme, parts.hostname, port)
+        path = (parts.path or '/') + (f"?{parts.query}" if parts.query else '')
+        request_headers = dict(self.headers)
+        if self.compress:
+            request_headers['Accept-Encoding'] = 'gzip'
+        if scheme == 'http':
+            # 通过代理的HTTP请求使用完整URL
+            proxy, proxy_headers = self._proxy_for(scheme, parts.hostname)
+            if proxy is not None:
+                path = f"http://{parts.netloc}{path}"
+                request_headers.update(proxy_headers)
+        request_headers.update(headers or {})
+        timeout = self.timeout if timeout is None else timeout
+
+        while True:
+            conn, reused = self._acquire(key, timeout)
+            try:
+                conn.request(method, path, body=body, headers=request_headers)
+                response = conn.getresponse()
+                data = response.read()
+            except STALE_ERRORS:
+                conn.close()
+                # 非幂等的请求（如发送通知的POST）可能已被处理，重发会重复发送
+                if reused and method.upper() in IDEMPOTENT_METHODS:
+                    continue
+                raise
+            except BaseException:
+                conn.close()
+                raise
+            break
+
+        if response.will_close:
+            conn.close()
+        else:
+            self._release(key, conn)
+        if response.headers.get('Content-Encoding', '').lower() == 'gzip':
+            data = gzip.decompress(data)
+        return HTTPResult(response.status, response.reason, response.headers, data)
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, {}
+        for connections in idle.values():
+            for conn, _ in connections:
+                conn.close()
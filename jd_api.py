@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import logging
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# 京东接口地址
+WARE_BUSINESS_API = "https://item-soa.jd.com/getWareBusiness?skuId={sku}"
+STOCK_BATCH_API = "https://c0.3.cn/stocks?type=getstocks&skuIds={skus}&area={area}"
+PRICE_BATCH_API = "https://p.3.cn/prices/mgets?skuIds={skus}"
+
+# getWareBusiness 响应中用到的顶层字段，其余（促销、店铺等）不解析
+WARE_BUSINESS_FIELDS = ('stockInfo', 'wareInfo', 'price', 'yuyueInfo')
+
+# 默认配送区域（北京）
+DEFAULT_AREA = '1_72_2799_0'
+
+# 商品是否可购买 (33 - 有货, 34 - 无货, 36 - 预售, 40 - 可配送)
+AVAILABLE_STATES = (33, 40)
+# 预售商品可能有预约信息，批量接口不返回开售时间
+PRESALE_STATES = (36,)
+
+ProductStatus = namedtuple('ProductStatus', ['is_available', 'product_name', 'start_time', 'price', 'stock_state'])
+
+# 商品ID无效或请求失败时的状态
+EMPTY_STATUS = ProductStatus(False, None, None, None, 0)
+
+
+def parse_price(value):
+    """解析价格字符串，无效价格返回None"""
+    try:
+        price = float(value)
+    except (TypeError, ValueError):
+        return None
+    return price if price >= 0 else None
+
+
+_decoder = json.JSONDecoder()
+_MISSING = object()
+
+
+def _decode_value(text, pos):
+    """解析 "字段" 之后的 :值，格式不对时返回_MISSING"""
+    length = len(text)
+    while pos < length and text[pos] in ' \t\r\n':
+        pos += 1
+    if pos >= length or text[pos] != ':':
+        return _MISSING
+    pos += 1
+    while pos < length and text[pos] in ' \t\r\n':
+        pos += 1
+    try:
+        return _decoder.raw_decode(text, pos)[0]
+    except ValueError:
+        return _MISSING
+
+
+def _is_key(text, pos):
+    """pos处的字符串前面是 { 或 ,，说明它是对象的键而不是值"""
+    pos -= 1
+    while pos >= 0 and text[pos] in ' \t\r\n':
+        pos -= 1
+    return pos >= 0 and text[pos] in '{,'
+
+
+def extract_fields(body, fields=WARE_BUSINESS_FIELDS):
+    """只解析响应中需要的字段，返回 {字段: 值}
+
+    字段名在响应中只出现一次时直接定位并只解码对应的值，跳过体积较大的
+    促销和店铺数据；字段名出现多次（可能是嵌套对象中的同名字段）或
+    找不到库存信息时回退为完整解析，响应不是JSON时抛出ValueError。
+    """
+    text = body.decode('utf-8') if isinstance(body, bytes) else body
+    result = {}
+    for field in fields:
+        needle = f'"{field}"'
+        count = text.count(needle)
+        if count == 0:
+            continue
+        pos = text.find(needle)
+        if count > 1 or not _is_key(text, pos):
+            break
+        value = _decode_value(text, pos + len(needle))
+        if value is _MISSING:
+            break
+        result[field] = value
+    else:
+        if 'stockInfo' in result:
+            return result
+    return _parse_all(text, fields)
+
+
+def _parse_all(text, fields):
+    data = json.loads(text)
+    if not isinstance(data, dict):
+        raise ValueError("响应不是JSON对象")
+    return {field: data[field] for field in fields if field in data}
+
+
+def parse_ware_business(data):
+    """解析getWareBusiness接口返回的商品数据"""
+    stock_state = data.get('stockInfo', {}).get('stockState', 0)
+    product_name = data.get('wareInfo', {}).get('wname', '未知商品')
+    price = parse_price(data.get('price', {}).get('p'))
+
+    # 获取预约或抢购信息
+    start_time = None
+    yuyue_info = data.get('yuyueInfo', {})
+    if yuyue_info:
+        yuyue_start_time = yuyue_info.get('startTime', 0) / 1000 if 'startTime' in yuyue_info else 0
+        if yuyue_start_time > 0:
+            start_time = datetime.fromtimestamp(yuyue_start_time)
+
+    return ProductStatus(stock_state in AVAILABLE_STATES, product_name, start_time, price, stock_state)
+
+
+class WareBusinessReader:
+    """getWareBusiness 请求的快速路径
+
+    带上次的ETag发送条件请求，返回304或响应内容的哈希与上次相同时
+    直接复用上次的解析结果；内容变化时只解析用到的字段。
+    """
+
+    def __init__(self, get, api=WARE_BUSINESS_API, fast_parse=True):
+        # get(url, headers) 返回带 status_code、headers、content 的响应
+        self.get = get
+        self.api = api
+        self.fast_parse = fast_parse
+        # sku -> (ETag, 内容哈希, 解析结果)
+        self.cache = {}
+        self.lock = threading.Lock()
+
+    def fetch(self, sku):
+        """返回商品的ProductStatus，请求失败时抛出异常，响应不是JSON时抛出ValueError"""
+        with self.lock:
+            cached = self.cache.get(sku)
+        headers = {'If-None-Match': cached[0]} if cached and cached[0] else None
+        response = self.get(self.api.format(sku=sku), headers)
+        if response.status_code == 304 and cached:
+            return cached[2]
+
+        body = response.content
+        digest = hashlib.blake2b(body, digest_size=8).digest()
+        if cached and cached[1] == digest:
+            return cached[2]
+        data = extract_fields(body) if self.fast_parse else json.loads(body)
+        status = parse_ware_business(data)
+        with self.lock:
+            self.cache[sku] = (response.headers.get('ETag'), digest, status)
+        return status
+
+    def forget(self, sku):
+        """不再监控的商品删除缓存"""
+        with self.lock:
+            self.cache.pop(sku, None)
+
+
+class BatchFetcher:
+    """批量查询商品库存和价格
+
+    库存和价格接口支持一次查询多个商品（skuIds以逗号分隔），
+    对批量接口未返回的商品、尚不知道名称的商品、有预约信息或处于预售状态的商品，
+    回退为并发的单个getWareBusiness请求；其他商品每批量查询 refresh_every 次
+    也走一次单个请求，以发现之后才公布的预约开售时间。
+    """
+
+    def __init__(self, fetch_json, fetch_single, executor=None, batch_size=50, area=DEFAULT_AREA,
+                 stock_api=STOCK_BATCH_API, price_api=PRICE_BATCH_API, refresh_every=10):
+        # fetch_json(url) 返回解析后的JSON，失败时抛出异常
+        # fetch_single(sku) 返回单个商品的ProductStatus
+        self.fetch_json = fetch_json
+        self.fetch_single = fetch_single
+        self.executor = executor or ThreadPoolExecutor(max_workers=8)
+        self.batch_size = max(1, batch_size)
+        self.area = area
+        self.stock_api = stock_api
+        self.price_api = price_api
+        self.refresh_every = refresh_every
+        # sku -> 上次单个请求之后批量查询的次数
+        self.batched_counts = {}
+        # 商品名称基本不变，从单个请求的结果中缓存
+        self.names = {}
+        # 有预约信息的商品需要单个请求才能拿到开售时间
+        self.yuyue_skus = set()
+
+    def needs_single(self, sku):
+        """判断商品是否必须走单个请求"""
+        return (sku not in self.names or sku in self.yuyue_skus
+                or self.batched_counts.get(sku, 0) >= self.refresh_every)
+
+    def fetch_stocks(self, skus):
+        """批量查询库存状态，返回 sku -> stockState"""
+        url = self.stock_api.format(skus=','.join(skus), area=self.area)
+        data = self.fetch_json(url) or {}
+        stocks = {}
+        for sku in skus:
+            item = data.get(sku)
+            if isinstance(item, dict) and 'StockState' in item:
+                stocks[sku] = int(item['StockState'])
+        return stocks
+
+    def fetch_prices(self, skus):
+        """批量查询价格，返回 sku -> 价格"""
+        url = self.price_api.format(skus=','.join(f"J_{sku}" for sku in skus))
+        data = self.fetch_json(url) or []
+        prices = {}
+        for item in data:
+            sku = str(item.get('id', '')).replace('J_', '', 1)
+            prices[sku] = parse_price(item.get('p'))
+        return prices
+
+    def fetch_chunk(self, skus):
+        """查询一组商品，返回批量接口能给出结果的商品状态"""
+        # 在线程池任务内顺序请求，避免嵌套提交任务导致线程池耗尽
+        try:
+            stocks = self.fetch_stocks(skus)
+        except Exception as e:
+            logging.error(f"批量查询库存失败: {e}")
+            return {}
+        try:
+            prices = self.fetch_prices(skus)
+        except Exception as e:
+            logging.error(f"批量查询价格失败: {e}")
+            prices = {}
+
+        results = {}
+        for sku, stock_state in stocks.items():
+            results[sku] = ProductStatus(stock_state in AVAILABLE_STATES, self.names[sku], None,
+                                         prices.get(sku), stock_state)
+        return results
+
+    def remember(self, sku, status):
+        """记录单个请求得到的商品名称和预约信息，请求失败时保留原有信息"""
+        if not status.product_name:
+            return
+        self.names[sku] = status.product_name
+        self.batched_counts.pop(sku, None)
+        if status.start_time:
+            self.yuyue_skus.add(sku)
+        else:
+            self.yuyue_skus.discard(sku)
+
+    def forget(self, sku):
+        """不再监控的商品删除缓存"""
+        self.names.pop(sku, None)
+        self.yuyue_skus.discard(sku)
+        self.batched_counts.pop(sku, None)
+
+    def fetch_all(self, skus):
+        """查询所有商品状态，返回 sku -> ProductStatus"""
+        singles = [sku for sku in skus if self.needs_single(sku)]
+        batched = [sku for sku in skus if not self.needs_single(sku)]
+
+        # 单个请求和批量请求同时发出
+        single_futures = {sku: self.executor.submit(self.fetch_single, sku) for sku in singles}
+        chunk_futures = [
+            self.executor.submit(self.fetch_chunk, batched[i:i + self.batch_size])
+            for i in range(0, len(batched), self.batch_size)
+        ]
+
+        results = {}
+        for future in chunk_futures:
+            results.update(future.result())
+
+        # 批量接口未返回的商品和预售商品回退为单个请求
+        for sku in batched:
+            status = results.get(sku)
+            if status is None or status.stock_state in PRESALE_STATES:
+                single_futures[sku] = self.executor.submit(self.fetch_single, sku)
+            else:
+                self.batched_counts[sku] = self.batched_counts.get(sku, 0) + 1
+
+        for sku, future in single_futures.items():
+            status = future.result()
+            self.remember(sku, status)
+            # 单个请求失败时保留批量接口的结果
+            if status.product_name or sku not in results:
+                results[sku] = status
+
+        return results
@@ -4,52 +4,213 @@
 import requests
 import json
 import time
-import re
 import logging
 import os
-import random
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from urllib.parse import urlparse, parse_qs
 from configparser import ConfigParser
+from rate_limiter import RateLimiter
+from circuit_breaker import BreakerRegistry, CircuitOpenError, RequestError, classify_response, decorrelated_jitter
+from scheduler import Scheduler
+from adaptive import AdaptivePolicy
+from sku_store import SkuStore
+from price_history import PriceHistory
+from rules import RuleEngine
+from notifier import NotificationDispatcher
+from url_resolver import SkuResolver
+from sku_extract import extract_sku
+from config_watcher import ConfigWatcher
+from sharding import ShardRegistry, ShardMember
+import metrics
+from structured_log import setup_logging
+from jd_api import WARE_BUSINESS_API, DEFAULT_AREA, EMPTY_STATUS, BatchFetcher, WareBusinessReader
+
+# 配置日志：JSON行格式，后台线程批量写入
+setup_logging("jd_monitor.log")
+
+WARE_BUSINESS_HOST = urlsplit(WARE_BUSINESS_API).netloc
+
+
+class SkuState:
+    """单个商品的监控状态"""
+    __slots__ = ('product_id', 'url', 'last_status', 'notification_sent', 'product_name',
+                 'stock_state', 'price', 'start_time', 'burst_until', 'next_check', 'stats', 'last_success')
+
+    def __init__(self, product_id, url):
+        self.product_id = product_id
+        self.url = url
+        self.last_status = False
+        self.notification_sent = False
+        self.product_name = None
+        self.stock_state = None
+        self.price = None
+        # 开售时间及开售前后高频检查的截止时间戳
+        self.start_time = None
+        self.burst_until = 0
+        # 下一次常规检查的时间戳和变化历史，用于自适应检查间隔
+        self.next_check = 0
+        self.stats = None
+        # 上一次成功获取状态的时间戳
+        self.last_success = None
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("jd_monitor.log"),
-        logging.StreamHandler()
-    ]
-)
 
 class JDMonitor:
     def __init__(self, config_file='config.ini'):
         self.config_file = config_file
+        self.skus = {}
+        # 由监督进程设置的分片ID，多个进程按一致性哈希分担商品
+        self.shard_id = os.environ.get('JD_SHARD_ID')
+        self.shard = None
         self.load_config()
+        self.config_watcher = ConfigWatcher(self.config_file)
         self.session = requests.Session()
         self.session.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
             'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
         }
+        # 连接池大小与并发数一致，避免并发检查时反复建立连接
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=self.max_workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        # 所有商品共享的按主机限速器，多个分片平分每个主机的请求配额
+        self.rate_limiter = RateLimiter(*self.shard_rate(), self.jitter)
+        # 所有商品共享的按主机熔断器，被反爬拦截时暂停请求该主机
+        self.breakers = BreakerRegistry(threshold=self.breaker_threshold, base_delay=self.breaker_base_delay,
+                                        max_delay=self.breaker_max_delay)
+        # 一轮检查出错后的等待时间，按去相关抖动逐次增加，成功后清零
+        self.cycle_backoff = 0
+        # 单个商品查询：条件请求、内容未变时复用上次结果、只解析用到的字段
+        self.ware_business = WareBusinessReader(
+            lambda url, headers: self.http_get(url, timeout=15, headers=headers),
+            fast_parse=self.fast_parse
+        )
         
     def load_config(self):
         """加载配置文件"""
         if not os.path.exists(self.config_file):
             self.create_default_config()
-            
+        self.apply_config(*self.read_config())
+        
+    def read_config(self):
+        """读取配置文件并解析商品链接，返回 (配置项, 链接解析器, 监控列表)，不修改当前配置
+
+        解析短链接需要访问网络，重新加载时在线程池中调用；解析完成后由
+        apply_config 一次性替换，读取或解析出错时原配置不受影响。
+        """
         config = ConfigParser()
         config.read(self.config_file, encoding='utf-8')
+        settings = {}
+        
+        # product_urls 为JSON格式的链接列表，兼容旧的单个 product_url 配置
+        if config.has_option('JD', 'product_urls'):
+            settings['jd_urls'] = json.loads(config.get('JD', 'product_urls'))
+        else:
+            settings['jd_urls'] = [config.get('JD', 'product_url')]
+        settings['jd_url'] = settings['jd_urls'][0] if settings['jd_urls'] else ''
+        settings['check_interval'] = config.getint('Monitor', 'check_interval')
+        settings['notify_minutes_before'] = config.getint('Monitor', 'notify_minutes_before')
+        settings['max_workers'] = config.getint('Monitor', 'max_workers', fallback=16)
+        settings['batch_size'] = config.getint('Monitor', 'batch_size', fallback=50)
+        # 批量查询的商品每 single_refresh 轮走一次单个请求，获取之后公布的预约开售时间
+        settings['single_refresh'] = config.getint('Monitor', 'single_refresh', fallback=10)
+        settings['area'] = config.get('JD', 'area', fallback=DEFAULT_AREA)
+        settings['requests_per_second'] = config.getfloat('Monitor', 'requests_per_second', fallback=2.0)
+        settings['burst'] = config.getint('Monitor', 'burst', fallback=5)
+        settings['jitter'] = config.getfloat('Monitor', 'jitter', fallback=0.5)
+        # 开售前后的高频检查：提前 burst_before 秒开始，每 burst_interval 秒检查一次，持续到开售后 burst_after 秒
+        settings['burst_interval'] = config.getfloat('Monitor', 'burst_interval', fallback=1.0)
+        settings['burst_before'] = config.getint('Monitor', 'burst_before', fallback=30)
+        settings['burst_after'] = config.getint('Monitor', 'burst_after', fallback=120)
+        # 自适应检查间隔：按商品变化频率在 min_interval 和 max_interval 之间调整
+        settings['adaptive'] = config.getboolean('Monitor', 'adaptive', fallback=False)
+        settings['min_interval'] = config.getint('Monitor', 'min_interval', fallback=15)
+        settings['max_interval'] = config.getint('Monitor', 'max_interval', fallback=600)
+        settings['metrics_interval'] = config.getint('Monitor', 'metrics_interval', fallback=600)
+        # 只解析getWareBusiness响应中用到的字段，关闭后完整解析
+        settings['fast_parse'] = config.getboolean('Monitor', 'fast_parse', fallback=True)
+        # 熔断：同一主机连续失败 breaker_threshold 次或遇到验证码时暂停请求，
+        # 暂停时间从 breaker_base_delay 秒开始按去相关抖动增加，最长 breaker_max_delay 秒
+        settings['breaker_threshold'] = config.getint('Monitor', 'breaker_threshold', fallback=5)
+        settings['breaker_base_delay'] = config.getfloat('Monitor', 'breaker_base_delay', fallback=30.0)
+        settings['breaker_max_delay'] = config.getfloat('Monitor', 'breaker_max_delay', fallback=600.0)
+        # 检查配置文件是否修改的间隔，修改后不重启直接生效
+        settings['reload_interval'] = config.getint('Monitor', 'reload_interval', fallback=5)
+        # 商品状态持久化，重启后不会重复通知
+        settings['store_path'] = config.get('Store', 'path', fallback='jd_monitor.db')
+        settings['flush_interval'] = config.getint('Store', 'flush_interval', fallback=5)
+        # 价格和库存历史，超过 raw_days 天的数据按 bucket 秒降采样
+        settings['history_path'] = config.get('History', 'path', fallback='history')
+        settings['history_raw_days'] = config.getint('History', 'raw_days', fallback=7)
+        settings['history_bucket'] = config.getint('History', 'bucket', fallback=3600)
+        # 自定义提醒规则文件（JSON列表）
+        settings['rules_path'] = config.get('Rules', 'path', fallback='rules.json')
+        settings['wxpusher_token'] = config.get('WxPusher', 'token')
+        settings['wxpusher_uids'] = json.loads(config.get('WxPusher', 'uids'))
+        # 未送达的通知保存在该文件中，重启后继续发送
+        settings['notify_queue_file'] = config.get('WxPusher', 'queue_file', fallback='jd_notify_queue.json')
+        # 合并窗口内的通知合并为一条摘要（默认不等待，上架通知立即发送）；同一事件在去重有效期内只通知一次
+        settings['coalesce_window'] = config.getfloat('WxPusher', 'coalesce_window', fallback=0.0)
+        settings['dedup_ttl'] = config.getfloat('WxPusher', 'dedup_ttl', fallback=600.0)
+        settings['dedup_size'] = config.getint('WxPusher', 'dedup_size', fallback=10000)
+        # 分片：workers 个进程共同检查商品，成员信息保存在共享的SQLite文件中
+        settings['shard_workers'] = config.getint('Shard', 'workers', fallback=1)
+        settings['shard_path'] = config.get('Shard', 'path', fallback='shards.db')
+        settings['shard_heartbeat'] = config.getfloat('Shard', 'heartbeat', fallback=5.0)
+        settings['shard_ttl'] = config.getfloat('Shard', 'ttl', fallback=20.0)
+        
+        # 短链接解析结果缓存在文件中，成功和失败分别设置有效期
+        resolver = SkuResolver(
+            self.resolve_short_url, extract_sku,
+            cache_file=config.get('JD', 'url_cache', fallback='url_cache.json'),
+            ttl=config.getint('JD', 'url_cache_ttl', fallback=30 * 86400),
+            negative_ttl=config.getint('JD', 'url_cache_negative_ttl', fallback=3600)
+        )
         
-        self.jd_url = config.get('JD', 'product_url')
-        self.check_interval = config.getint('Monitor', 'check_interval')
-        self.notify_minutes_before = config.getint('Monitor', 'notify_minutes_before')
-        self.wxpusher_token = config.get('WxPusher', 'token')
-        self.wxpusher_uids = json.loads(config.get('WxPusher', 'uids'))
+        # 解析商品ID（整批并发）
+        watchlist = {}
+        product_ids = resolver.resolve_all(settings['jd_urls'])
+        for url in settings['jd_urls']:
+            product_id = product_ids[url]
+            if product_id and product_id not in watchlist:
+                watchlist[product_id] = url
+        return settings, resolver, watchlist
         
-        # 解析商品ID
-        self.product_id = self.extract_product_id(self.jd_url)
-        logging.info(f"监控商品ID: {self.product_id}")
+    def apply_config(self, settings, resolver, watchlist):
+        """替换为 read_config 读取的配置，并重新分配商品"""
+        vars(self).update(settings)
+        self.resolver = resolver
+        self.watchlist = watchlist
+        if self.shard is None and self.shard_id and self.shard_workers > 1:
+            self.shard = ShardMember(ShardRegistry(self.shard_path), self.shard_id, self.shard_ttl)
+            self.shard.join()
+        if self.shard:
+            # 每个分片使用自己的通知队列文件
+            base, ext = os.path.splitext(self.notify_queue_file)
+            self.notify_queue_file = f"{base}.{self.shard_id}{ext}"
+        self.assign_skus()
+        logging.info(f"监控商品ID: {', '.join(self.skus) or None}")
+        
+    def assign_skus(self):
+        """从监控列表中选出本进程负责的商品，每个商品一条状态记录，已有商品保留原状态"""
+        skus = {}
+        for product_id, url in self.watchlist.items():
+            if self.shard is None or self.shard.owns(product_id):
+                skus[product_id] = self.skus.get(product_id) or SkuState(product_id, url)
+        self.added_skus = [product_id for product_id in skus if product_id not in self.skus]
+        self.removed_skus = [product_id for product_id in self.skus if product_id not in skus]
+        self.skus = skus
+        self.product_id = next(iter(self.skus), None)
+        
+    def shard_rate(self):
+        """本进程的每秒请求数和突发请求数
+
+        requests_per_second 和 burst 是所有分片合计的配额，每个分片各占 1/N，
+        N 取配置的分片数和当前成员数中较大的一个（滚动重启时成员可能多于配置）。
+        """
+        count = max(self.shard_workers, len(self.shard.ring.nodes)) if self.shard else 1
+        return self.requests_per_second / count, max(1.0, self.burst / count)
         
     def create_default_config(self):
         """创建默认配置文件"""
@@ -61,7 +222,25 @@ class JDMonitor:
         
         config['Monitor'] = {
             'check_interval': '60',  # 检查间隔，单位秒
-            'notify_minutes_before': '5'  # 提前通知时间，单位分钟
+            'notify_minutes_before': '5',  # 提前通知时间，单位分钟
+            'max_workers': '16',  # 并发检查的线程数
+            'batch_size': '50',  # 批量查询时每个请求包含的商品数
+            'single_refresh': '10',  # 批量查询的商品每隔多少轮单独查询一次预约信息
+            'requests_per_second': '2',  # 每个主机每秒允许的请求数
+            'burst': '5',  # 每个主机允许的突发请求数
+            'jitter': '0.5',  # 限速排队时附加的随机延迟上限，单位秒
+            'burst_interval': '1',  # 开售前后高频检查的间隔，单位秒
+            'burst_before': '30',  # 开售前多少秒开始高频检查
+            'burst_after': '120',  # 开售后高频检查持续的秒数
+            'adaptive': 'false',  # 是否根据商品变化频率自动调整检查间隔
+            'min_interval': '15',  # 自适应检查间隔下限，单位秒
+            'max_interval': '600',  # 自适应检查间隔上限，单位秒
+            'metrics_interval': '600',  # 输出自适应检查统计的间隔，单位秒
+            'fast_parse': 'true',  # 只解析商品接口响应中用到的字段
+            'breaker_threshold': '5',  # 同一主机连续失败多少次后暂停请求
+            'breaker_base_delay': '30',  # 首次暂停请求的秒数，之后逐次增加
+            'breaker_max_delay': '600',  # 暂停请求的最长秒数
+            'reload_interval': '5'  # 检查配置文件是否修改的间隔，单位秒
         }
         
         config['WxPusher'] = {
@@ -69,6 +248,28 @@ class JDMonitor:
             'uids': '[]'  # 接收通知的用户ID列表，JSON格式
         }
         
+        config['Store'] = {
+            'path': 'jd_monitor.db',  # 商品状态数据库文件
+            'flush_interval': '5'  # 批量写入数据库的间隔，单位秒
+        }
+        
+        config['History'] = {
+            'path': 'history',  # 价格和库存历史目录
+            'raw_days': '7',  # 保留完整记录的天数
+            'bucket': '3600'  # 更早的记录降采样的时间段，单位秒
+        }
+        
+        config['Rules'] = {
+            'path': 'rules.json'  # 自定义提醒规则文件，JSON格式
+        }
+        
+        config['Shard'] = {
+            'workers': '1',  # 检查商品的进程数，大于1时由监督进程启动多个分片
+            'path': 'shards.db',  # 分片成员信息文件
+            'heartbeat': '5',  # 分片心跳间隔，单位秒
+            'ttl': '20'  # 超过该秒数没有心跳的分片视为失联，其商品由其他分片接手
+        }
+        
         with open(self.config_file, 'w', encoding='utf-8') as f:
             config.write(f)
             
@@ -76,159 +277,524 @@ class JDMonitor:
         
     def extract_product_id(self, url):
         """从京东链接中提取商品ID"""
-        # 处理短链接
-        if '3.cn' in url or 'item.jd.com' not in url:
-            try:
-                r = requests.get(url, allow_redirects=False)
-                if 'Location' in r.headers:
-                    url = r.headers['Location']
-            except Exception as e:
-                logging.error(f"解析短链接失败: {e}")
-        
-        # 尝试从URL中提取商品ID
-        patterns = [
-            r'item\.jd\.com\/(\d+)\.html',  # 标准商品页面
-            r'product\/(\d+)\.html',         # 有些商品页面格式
-            r'\?id=(\d+)'                    # URL参数中的ID
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, url)
-            if match:
-                return match.group(1)
-        
-        # 如果上面都没匹配到，尝试解析查询参数
-        parsed_url = urlparse(url)
-        query_params = parse_qs(parsed_url.query)
-        
-        # 检查常见的ID参数名
-        for param in ['id', 'productId', 'product_id', 'sku', 'skuId']:
-            if param in query_params:
-                return query_params[param][0]
-                
-        logging.error(f"无法从URL中提取商品ID: {url}")
-        return None
+        return self.resolver.get(url)
     
-    def check_product_status(self):
+    def resolve_short_url(self, url):
+        """解析短链接，返回跳转后的链接"""
+        r = requests.get(url, allow_redirects=False, timeout=10)
+        return r.headers.get('Location', url)
+    
+    def check_product_status(self, product_id=None):
         """检查商品状态"""
-        if not self.product_id:
+        product_id = product_id or self.product_id
+        if not product_id:
             logging.error("商品ID无效，无法检查商品状态")
-            return False, None, None
+            return EMPTY_STATUS
             
         try:
             # 使用京东API检查商品状态
-            api_url = f"https://item-soa.jd.com/getWareBusiness?skuId={self.product_id}"
-            response = self.session.get(api_url)
-            data = response.json()
-            
-            # 添加随机延迟，避免被检测为机器人
-            time.sleep(random.uniform(1, 3))
-            
-            # 检查商品状态
-            stock_state = data.get('stockInfo', {}).get('stockState', 0)
-            product_name = data.get('wareInfo', {}).get('wname', '未知商品')
-            price = data.get('price', {}).get('p', '未知价格')
-            
-            # 商品是否可购买 (33 - 有货, 34 - 无货, 36 - 预售, 40 - 可配送)
-            is_available = stock_state in [33, 40]
-            
-            # 获取预约或抢购信息
-            yuyue_info = data.get('yuyueInfo', {})
-            if yuyue_info:
-                yuyue_start_time = yuyue_info.get('startTime', 0) / 1000 if 'startTime' in yuyue_info else 0
-                if yuyue_start_time > 0:
-                    start_time = datetime.fromtimestamp(yuyue_start_time)
-                    return is_available, product_name, start_time
-            
-            return is_available, product_name, None
+            return self.ware_business.fetch(product_id)
             
+        except CircuitOpenError as e:
+            # 熔断期间不发请求，也不逐个商品报错
+            logging.debug(f"跳过商品{product_id}: {e}", extra={'sku': product_id})
+            return EMPTY_STATUS
+        except ValueError as e:
+            metrics.inc('json_decode_errors_total', host=WARE_BUSINESS_HOST)
+            logging.error(f"检查商品{product_id}状态时出错: {e}", extra={'sku': product_id})
+            return EMPTY_STATUS
         except Exception as e:
-            logging.error(f"检查商品状态时出错: {e}")
-            return False, None, None
+            logging.error(f"检查商品{product_id}状态时出错: {e}", extra={'sku': product_id})
+            return EMPTY_STATUS
     
-    def send_wxpusher_notification(self, title, content):
-        """发送WxPusher通知"""
+    def http_get(self, url, timeout=15, headers=None):
+        """限速后发送请求，记录耗时和失败次数
+
+        主机熔断中时抛出CircuitOpenError；响应为错误状态码、验证码页面或不是JSON时
+        计入熔断器并抛出RequestError。
+        """
+        host = urlsplit(url).netloc
+        breaker = self.breakers.get(host)
+        if not breaker.allow():
+            metrics.inc('circuit_rejected_total', host=host)
+            raise CircuitOpenError(host, breaker.retry_after())
+        # 按主机限速，避免被检测为机器人；等待时间不计入请求耗时
+        self.rate_limiter.acquire(url)
+        start = time.perf_counter()
+        try:
+            response = self.session.get(url, timeout=timeout, headers=headers)
+        except Exception as e:
+            breaker.record_failure('network')
+            metrics.inc('http_request_errors_total', host=host, reason=type(e).__name__)
+            raise
+        finally:
+            metrics.observe('http_request_duration_seconds', time.perf_counter() - start, host=host)
+        kind = classify_response(response.status_code, response.content)
+        if kind is None:
+            breaker.record_success()
+            return response
+        breaker.record_failure(kind)
+        metrics.inc('http_request_errors_total', host=host, reason=kind)
+        if kind in ('json', 'captcha'):
+            metrics.inc('json_decode_errors_total', host=host)
+        raise RequestError(kind, f"{host} 请求失败({kind}): HTTP {response.status_code} {response.text[:100]!r}")
+
+    def fetch_json(self, url, timeout=15):
+        """请求接口并解析JSON，记录JSON解析失败次数"""
+        response = self.http_get(url, timeout)
+        try:
+            return response.json()
+        except ValueError:
+            host = urlsplit(url).netloc
+            self.breakers.get(host).record_failure('json')
+            metrics.inc('json_decode_errors_total', host=host)
+            raise
+    
+    def notify(self, title, content, product_id=None, event=None):
+        """通知交给后台线程发送，不阻塞监控循环；同一商品的同一事件在去重有效期内只发送一次"""
         if not self.wxpusher_token or not self.wxpusher_uids:
             logging.error("WxPusher配置不完整，无法发送通知")
             return False
+        product_id = product_id or self.product_id
+        url = f"https://item.jd.com/{product_id}.html"
+        key = f"{product_id}:{event}" if event else None
+        return self.dispatcher.notify(title, content, self.wxpusher_uids, url, key=key)
+    
+    def send_wxpusher_notification(self, title, content, url=None, uids=None):
+        """发送WxPusher通知"""
+        uids = uids or self.wxpusher_uids
+        if not self.wxpusher_token or not uids:
+            logging.error("WxPusher配置不完整，无法发送通知")
+            return False
             
         try:
-            url = "https://wxpusher.zjiecode.com/api/send/message"
+            api_url = "https://wxpusher.zjiecode.com/api/send/message"
             data = {
                 "appToken": self.wxpusher_token,
                 "content": content,
                 "summary": title,  # 消息摘要，显示在微信通知上
                 "contentType": 1,  # 内容类型 1-文本 2-HTML
-                "uids": self.wxpusher_uids,
-                "url": f"https://item.jd.com/{self.product_id}.html"  # 点击消息跳转的链接
+                "uids": uids
             }
+            if url:
+                data["url"] = url  # 点击消息跳转的链接，合并后的摘要消息没有
             
-            response = requests.post(url, json=data)
+            start = time.perf_counter()
+            response = requests.post(api_url, json=data, timeout=10)
             result = response.json()
+            metrics.observe('notify_send_duration_seconds', time.perf_counter() - start)
             
             if result.get('success'):
+                metrics.inc('notify_sent_total', result='success')
                 logging.info(f"WxPusher通知发送成功: {title}")
                 return True
             else:
+                metrics.inc('notify_sent_total', result='failed')
                 logging.error(f"WxPusher通知发送失败: {result}")
                 return False
                 
         except Exception as e:
+            metrics.inc('notify_sent_total', result='error')
             logging.error(f"发送WxPusher通知时出错: {e}")
             return False
     
+    def start_cycle(self):
+        """开始一轮常规检查，并安排下一轮"""
+        now = time.time()
+        self.scheduler.schedule(now + self.cycle_interval, self.start_cycle, key='cycle')
+        if self.cycle_running:
+            logging.warning("上一轮检查尚未完成，跳过本轮")
+            return
+        
+        # 只检查已到检查时间的商品（按最接近的一轮取整），处于高频检查中的商品不参与常规检查
+        due = now + self.cycle_interval / 2
+        product_ids = [
+            product_id for product_id, state in self.skus.items()
+            if not state.burst_until and state.next_check <= due
+        ]
+        if not product_ids:
+            return
+        self.cycle_running = True
+        future = self.cycle_executor.submit(self.fetcher.fetch_all, product_ids)
+        future.add_done_callback(lambda f: self.scheduler.call_soon(self.finish_cycle, f))
+
+    def finish_cycle(self, future):
+        """在调度线程中处理一轮检查的结果"""
+        self.cycle_running = False
+        try:
+            results = future.result()
+        except Exception as e:
+            # 出错后等待一段时间再继续，连续出错时按去相关抖动增加等待时间
+            self.cycle_backoff = decorrelated_jitter(self.cycle_backoff, self.check_interval, self.breaker_max_delay)
+            logging.error(f"监控过程中出错: {e}，{self.cycle_backoff:.0f}秒后重试")
+            self.scheduler.schedule(time.time() + self.cycle_backoff, self.start_cycle, key='cycle')
+            return
+        
+        self.cycle_backoff = 0
+        for product_id, status in results.items():
+            state = self.skus.get(product_id)
+            if state:
+                self.handle_status(state, status)
+
+    def handle_status(self, state, status):
+        """根据单个商品的检查结果更新状态并发送通知"""
+        product_id = state.product_id
+        if self.skus.get(product_id) is not state:
+            # 检查期间商品已被移除（重新加载配置或移交给其他分片），结果丢弃，不再写入记录和发送通知
+            return
+        is_available, product_name, start_time = status.is_available, status.product_name, status.start_time
+        if not product_name:
+            # 检查失败时保留原有状态，不计入变化历史，按固定间隔重试
+            state.next_check = time.time() + self.check_interval
+            return
+        
+        state.last_success = time.time()
+        if status.price is None and state.price is not None:
+            # 价格接口失败时沿用上次的价格，不当作价格变化，恢复后也不会重复触发价格规则
+            status = status._replace(price=state.price)
+        status_changed = is_available != state.last_status
+        prev_stock_state, prev_price = state.stock_state, state.price
+        # 只在首次获取和状态变化时记录，不再每次检查都写一行日志
+        if status_changed or state.product_name is None:
+            logging.info(f"商品: {product_name} - {'可购买' if is_available else '不可购买'}", extra={'sku': product_id})
+        state.last_status = is_available
+        state.product_name = product_name
+        state.stock_state = status.stock_state
+        state.price = status.price
+        state.next_check = time.time() + self.policy.observe(state.stats, (status.stock_state, status.price))
+        self.history.append(product_id, time.time(), status.stock_state, status.price)
+        self.store.update(product_id, product_name=product_name, last_status=int(is_available),
+                          stock_state=status.stock_state, price=status.price)
+        
+        # 如果有开售时间，按开售时间安排提醒和高频检查
+        if start_time:
+            self.schedule_start(state, start_time)
+        
+        # 如果商品状态变为可购买，发送通知
+        if is_available and status_changed:
+            title = f"🎉 京东商品已上架可购买"
+            content = f"您监控的商品【{product_name}】已经上架可以购买了！\n\n立即前往: https://item.jd.com/{product_id}.html"
+            
+            self.notify(title, content, product_id, 'available')
+            logging.info(f"商品{product_id}已上架可购买，已发送通知", extra={'sku': product_id})
+        elif status_changed:
+            # 重新缺货后清除上架通知的去重记录，去重有效期内再次补货也会通知
+            self.dispatcher.reset(f"{product_id}:available", self.wxpusher_uids)
+        
+        # 自定义规则只评估与该商品相关的规则
+        for rule, title, content in self.rules.evaluate(product_id, status, prev_stock_state, prev_price):
+            self.notify(title, content, product_id, f"rule:{rule.rule_id}")
+            logging.info(f"商品{product_id}触发规则{rule.rule_id}({rule.kind})，已发送通知", extra={'sku': product_id})
+
+    def schedule_start(self, state, start_time):
+        """开售时间已知后，精确安排开售提醒和开售前后的高频检查"""
+        if state.start_time == start_time:
+            return
+        if state.start_time is not None:
+            # 开售时间变化后需要重新提醒
+            state.notification_sent = False
+        state.start_time = start_time
+        self.store.update(state.product_id, start_time=start_time.timestamp(),
+                          notification_sent=int(state.notification_sent))
+        
+        now = time.time()
+        start_ts = start_time.timestamp()
+        if start_ts + self.burst_after <= now:
+            return
+        
+        product_id = state.product_id
+        if not state.notification_sent and start_ts > now:
+            remind_at = start_ts - self.notify_minutes_before * 60
+            self.scheduler.schedule(max(now, remind_at), self.send_start_reminder, state, key=('remind', product_id))
+        self.scheduler.schedule(max(now, start_ts - self.burst_before), self.begin_burst, state, key=('burst', product_id))
+        logging.info(f"商品{product_id}开售时间: {start_time}，已安排提醒和高频检查", extra={'sku': product_id})
+
+    def send_start_reminder(self, state):
+        """发送即将开售提醒"""
+        if state.notification_sent or not state.start_time:
+            return
+        
+        minutes_to_start = (state.start_time - datetime.now()).total_seconds() / 60
+        if minutes_to_start <= 0:
+            return
+        
+        title = f"⏰ 京东商品即将开售提醒"
+        content = f"您监控的商品【{state.product_name}】将在{minutes_to_start:.1f}分钟后开始销售！\n\n开售时间: {state.start_time.strftime('%Y-%m-%d %H:%M:%S')}\n立即前往: https://item.jd.com/{state.product_id}.html"
+        
+        self.notify(title, content, state.product_id, f"remind:{state.start_time.timestamp():.0f}")
+        state.notification_sent = True
+        self.store.update(state.product_id, notification_sent=1)
+        logging.info(f"已发送商品即将开售提醒，开售时间: {state.start_time}", extra={'sku': state.product_id})
+
+    def begin_burst(self, state):
+        """进入开售前后的高频检查"""
+        state.burst_until = state.start_time.timestamp() + self.burst_after
+        logging.info(f"商品{state.product_id}进入高频检查，间隔{self.burst_interval}秒", extra={'sku': state.product_id})
+        self.burst_poll(state)
+
+    def burst_poll(self, state):
+        """高频检查一次，到期后恢复常规检查"""
+        now = time.time()
+        if now > state.burst_until:
+            state.burst_until = 0
+            self.burst_futures.pop(state.product_id, None)
+            logging.info(f"商品{state.product_id}结束高频检查，恢复常规间隔", extra={'sku': state.product_id})
+            return
+        
+        # 上一次检查还没有返回（如被限速排队）时不再提交，避免请求堆积、结果越来越滞后
+        pending = self.burst_futures.get(state.product_id)
+        if pending is None or pending.done():
+            future = self.executor.submit(self.check_product_status, state.product_id)
+            self.burst_futures[state.product_id] = future
+            future.add_done_callback(lambda f: self.scheduler.call_soon(self.handle_status, state, f.result()))
+        self.scheduler.schedule(now + self.burst_interval, self.burst_poll, state, key=('burst', state.product_id))
+
+    def log_metrics(self):
+        """定期输出自适应检查的效果统计"""
+        self.scheduler.schedule(time.time() + self.metrics_interval, self.log_metrics, key='metrics')
+        metrics = self.policy.metrics.summary()
+        logging.info(
+            f"检查统计: 请求{metrics['polls']}次, 固定间隔需{metrics['fixed_polls']}次, "
+            f"节省{metrics['saved']}次({metrics['saved_ratio']:.0%}), 发现变化{metrics['changes']}次, "
+            f"平均延迟{metrics['avg_latency']}秒, 最大延迟{metrics['max_latency']}秒"
+        )
+
+    def sku_ages(self):
+        """各商品距上一次成功获取状态的秒数，导出指标时调用"""
+        now = time.time()
+        return {
+            (('sku', state.product_id),): round(now - state.last_success, 1)
+            for state in list(self.skus.values()) if state.last_success
+        }
+
+    def restore_state(self, product_ids=None):
+        """从数据库恢复商品状态，已开售的提醒和高频检查重新安排"""
+        saved = self.store.load_all()
+        restored = 0
+        for product_id in product_ids or list(self.skus):
+            state = self.skus[product_id]
+            row = saved.get(product_id)
+            if not row:
+                continue
+            restored += 1
+            state.product_name = row['product_name']
+            state.last_status = bool(row['last_status'])
+            state.stock_state = row['stock_state']
+            state.price = row['price']
+            state.notification_sent = bool(row['notification_sent'])
+            state.stats.value = (row['stock_state'], row['price'])
+            if row['start_time']:
+                self.schedule_start(state, datetime.fromtimestamp(row['start_time']))
+        logging.info(f"已从 {self.store_path} 恢复{restored}个商品的状态")
+
+    def flush_store(self):
+        """定期批量写入商品状态"""
+        self.scheduler.schedule(time.time() + self.flush_interval, self.flush_store, key='flush')
+        try:
+            self.store.flush()
+            self.history.flush()
+        except Exception as e:
+            logging.error(f"保存商品状态失败: {e}")
+
+    def compact_history(self):
+        """每天对较早的价格历史降采样"""
+        self.scheduler.schedule(time.time() + 86400, self.compact_history, key='compact')
+        try:
+            before = time.time() - self.history_raw_days * 86400
+            # 只处理本进程负责的商品，其他分片的商品由其他分片处理
+            removed = self.history.compact_all(before, self.history_bucket, list(self.skus))
+            logging.info(f"价格历史降采样完成，删除{removed}条记录")
+        except Exception as e:
+            logging.error(f"价格历史降采样失败: {e}")
+
+    def reload_config(self):
+        """配置文件修改后增量应用：增删商品、调整间隔和限速、更换接收人
+
+        已有商品的状态、HTTP连接和线程池都保留；并发数需要重启才能生效。
+        读取配置和解析短链接在线程池中进行，不阻塞调度线程。
+        """
+        self.scheduler.schedule(time.time() + self.reload_interval, self.reload_config, key='reload')
+        if self.reload_running:
+            return
+        rules_changed = self.rules_watcher.changed()
+        if not self.config_watcher.changed():
+            if rules_changed:
+                self.rules = RuleEngine.load(self.rules_path)
+                logging.info(f"规则文件已修改，重新加载{self.rules.count}条提醒规则")
+            return
+        
+        self.reload_running = True
+        future = self.executor.submit(self.read_config)
+        future.add_done_callback(lambda f: self.scheduler.call_soon(self.finish_reload, f, rules_changed))
+
+    def finish_reload(self, future, rules_changed):
+        """在调度线程中一次性应用读取到的新配置"""
+        self.reload_running = False
+        try:
+            new_config = future.result()
+        except Exception as e:
+            logging.error(f"重新加载配置失败，继续使用原配置: {e}")
+            return
+        
+        old_rules_path, old_cycle_interval = self.rules_path, self.cycle_interval
+        old_store_path, old_history_path = self.store_path, self.history_path
+        self.apply_config(*new_config)
+        self.reopen_storage(old_store_path, old_history_path)
+        self.apply_sku_changes()
+        
+        self.rate_limiter.configure(*self.shard_rate(), self.jitter)
+        self.breakers.configure(threshold=self.breaker_threshold, base_delay=self.breaker_base_delay,
+                                max_delay=self.breaker_max_delay)
+        self.policy.base_interval = self.check_interval
+        self.policy.min_interval = min(self.min_interval, self.max_interval)
+        self.policy.max_interval = self.max_interval
+        self.policy.enabled = self.adaptive
+        self.fetcher.batch_size = max(1, self.batch_size)
+        self.fetcher.area = self.area
+        self.fetcher.refresh_every = max(1, self.single_refresh)
+        self.dispatcher.coalesce_window = self.coalesce_window
+        self.dispatcher.dedup.ttl = self.dedup_ttl
+        self.dispatcher.dedup.max_size = self.dedup_size
+        
+        self.cycle_interval = min(self.min_interval, self.check_interval) if self.adaptive else self.check_interval
+        if self.cycle_interval != old_cycle_interval:
+            self.scheduler.schedule(time.time() + self.cycle_interval, self.start_cycle, key='cycle')
+        if rules_changed or self.rules_path != old_rules_path:
+            self.rules = RuleEngine.load(self.rules_path)
+            self.rules_watcher = ConfigWatcher(self.rules_path)
+        
+        logging.info(
+            f"配置已重新加载: 新增商品{len(self.added_skus)}个, 移除商品{len(self.removed_skus)}个, "
+            f"当前商品{len(self.skus)}个, 检查间隔{self.check_interval}秒"
+        )
+
+    def reopen_storage(self, old_store_path, old_history_path):
+        """存储路径修改后改用新的数据库和历史目录，内存中的商品状态写入新数据库"""
+        if self.store_path != old_store_path:
+            self.store.close()
+            self.store = SkuStore(self.store_path)
+            for state in self.skus.values():
+                if state.product_name is None:
+                    continue
+                self.store.update(state.product_id, product_name=state.product_name,
+                                  last_status=int(state.last_status), stock_state=state.stock_state,
+                                  price=state.price, notification_sent=int(state.notification_sent),
+                                  start_time=state.start_time.timestamp() if state.start_time else None)
+            logging.info(f"商品状态数据库已改为 {self.store_path}")
+        if self.history_path != old_history_path:
+            self.history.flush()
+            self.history = PriceHistory(self.history_path)
+            logging.info(f"价格历史目录已改为 {self.history_path}，之前的记录保留在 {old_history_path}")
+
+    def apply_sku_changes(self):
+        """新增的商品从数据库恢复状态，移除的商品取消提醒和高频检查
+
+        从监控列表中删除的商品同时删除数据库记录；移交给其他分片的商品保留记录，由接手的分片恢复。
+        """
+        for product_id in self.added_skus:
+            state = self.skus[product_id]
+            state.stats = self.policy.new_stats()
+        if self.added_skus:
+            self.restore_state(self.added_skus)
+        for product_id in self.removed_skus:
+            self.scheduler.cancel(('remind', product_id))
+            self.scheduler.cancel(('burst', product_id))
+            self.burst_futures.pop(product_id, None)
+            self.ware_business.forget(product_id)
+            self.fetcher.forget(product_id)
+        dropped = [product_id for product_id in self.removed_skus if product_id not in self.watchlist]
+        if dropped:
+            self.store.delete(dropped)
+
+    def sync_shard(self):
+        """发送分片心跳，成员变化后重新分配商品"""
+        self.scheduler.schedule(time.time() + self.shard_heartbeat, self.sync_shard, key='shard')
+        try:
+            if not self.shard.sync(len(self.skus)):
+                return
+        except Exception as e:
+            logging.error(f"同步分片信息失败: {e}")
+            return
+        self.assign_skus()
+        self.rate_limiter.configure(*self.shard_rate(), self.jitter)
+        # 移交出去的商品先写入未保存的状态，接手的分片读到的是最新记录
+        self.store.flush()
+        self.apply_sku_changes()
+        logging.info(
+            f"分片{self.shard_id}重新分配商品: 接手{len(self.added_skus)}个, 移交{len(self.removed_skus)}个, "
+            f"当前负责{len(self.skus)}/{len(self.watchlist)}个"
+        )
+
     def run(self):
         """运行监控程序"""
-        logging.info(f"开始监控京东商品: {self.jd_url}")
+        logging.info(f"开始监控京东商品: {', '.join(self.jd_urls)}")
+        logging.info(f"商品数量: {len(self.skus)}, 并发数: {self.max_workers}")
         logging.info(f"检查间隔: {self.check_interval}秒, 提前通知时间: {self.notify_minutes_before}分钟")
         
-        notification_sent = False
-        last_status = False
+        self.scheduler = Scheduler()
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        # 常规检查在单独的线程中进行，调度线程始终能及时处理提醒和高频检查
+        self.cycle_executor = ThreadPoolExecutor(max_workers=1)
+        self.cycle_running = False
+        # 每个商品正在进行的高频检查，同一商品同时只有一个
+        self.burst_futures = {}
+        self.reload_running = False
+        self.policy = AdaptivePolicy(self.check_interval, self.min_interval, self.max_interval, self.adaptive)
+        # 自适应模式下按间隔下限轮询，每轮只检查到期的商品
+        self.cycle_interval = min(self.min_interval, self.check_interval) if self.adaptive else self.check_interval
+        for state in self.skus.values():
+            state.stats = self.policy.new_stats()
+        self.fetcher = BatchFetcher(self.fetch_json, self.check_product_status, self.executor,
+                                    batch_size=self.batch_size, area=self.area,
+                                    refresh_every=max(1, self.single_refresh))
         
-        while True:
-            try:
-                is_available, product_name, start_time = self.check_product_status()
-                
-                current_time = datetime.now()
-                status_changed = is_available != last_status
-                last_status = is_available
-                
-                if product_name:
-                    logging.info(f"商品: {product_name} - {'可购买' if is_available else '不可购买'}")
-                
-                # 如果有开售时间，检查是否需要提前通知
-                if start_time and not notification_sent:
-                    time_diff = start_time - current_time
-                    minutes_to_start = time_diff.total_seconds() / 60
-                    
-                    # 如果距离开售时间小于等于提前通知时间，发送通知
-                    if 0 < minutes_to_start <= self.notify_minutes_before:
-                        title = f"⏰ 京东商品即将开售提醒"
-                        content = f"您监控的商品【{product_name}】将在{minutes_to_start:.1f}分钟后开始销售！\n\n开售时间: {start_time.strftime('%Y-%m-%d %H:%M:%S')}\n立即前往: https://item.jd.com/{self.product_id}.html"
-                        
-                        self.send_wxpusher_notification(title, content)
-                        notification_sent = True
-                        logging.info(f"已发送商品即将开售提醒，开售时间: {start_time}")
-                
-                # 如果商品状态变为可购买，发送通知
-                if is_available and status_changed:
-                    title = f"🎉 京东商品已上架可购买"
-                    content = f"您监控的商品【{product_name}】已经上架可以购买了！\n\n立即前往: https://item.jd.com/{self.product_id}.html"
-                    
-                    self.send_wxpusher_notification(title, content)
-                    logging.info(f"商品已上架可购买，已发送通知")
-                
-                # 等待下一次检查
-                time.sleep(self.check_interval)
-                
-            except KeyboardInterrupt:
-                logging.info("程序已手动停止")
-                break
-                
-            except Exception as e:
-                logging.error(f"监控过程中出错: {e}")
-                # 出错后等待一段时间再继续
-                time.sleep(max(30, self.check_interval))
+        self.store = SkuStore(self.store_path)
+        self.history = PriceHistory(self.history_path)
+        self.rules = RuleEngine.load(self.rules_path)
+        self.rules_watcher = ConfigWatcher(self.rules_path)
+        logging.info(f"已加载{self.rules.count}条提醒规则")
+        self.dispatcher = NotificationDispatcher(
+            lambda n: self.send_wxpusher_notification(n.title, n.content, n.url, list(n.uids)),
+            queue_file=self.notify_queue_file,
+            coalesce_window=self.coalesce_window,
+            dedup_ttl=self.dedup_ttl,
+            dedup_size=self.dedup_size
+        )
+        self.dispatcher.start()
+        self.restore_state()
+        
+        metrics.gauge_callback('notify_queue_depth', self.dispatcher.pending_count)
+        metrics.gauge_callback('scheduler_pending_tasks', lambda: len(self.scheduler.heap))
+        metrics.gauge_callback('sku_last_success_age_seconds', self.sku_ages)
+        metrics.gauge_callback('circuit_state', self.breakers.states)
+        self.metrics_exporter = metrics.start_exporter(self.shard_id or 'jd_monitor')
+        
+        if self.shard:
+            # 同时启动的其他分片加入后再开始第一轮检查，避免每个分片都先检查全部商品
+            logging.info(f"分片{self.shard_id}负责{len(self.skus)}/{len(self.watchlist)}个商品")
+            self.scheduler.schedule(time.time() + self.shard_heartbeat, self.sync_shard, key='shard')
+            self.scheduler.schedule(time.time() + self.shard_heartbeat, self.start_cycle, key='cycle')
+        else:
+            self.scheduler.call_soon(self.start_cycle)
+        self.scheduler.schedule(time.time() + self.metrics_interval, self.log_metrics, key='metrics')
+        self.scheduler.schedule(time.time() + self.flush_interval, self.flush_store, key='flush')
+        self.scheduler.schedule(time.time() + 3600, self.compact_history, key='compact')
+        self.scheduler.schedule(time.time() + self.reload_interval, self.reload_config, key='reload')
+        try:
+            self.scheduler.run()
+        except KeyboardInterrupt:
+            logging.info("程序已手动停止")
+        finally:
+            if self.shard:
+                # 主动离开，其他分片立即接手本进程的商品
+                self.shard.leave()
+            self.scheduler.stop()
+            self.store.close()
+            self.history.flush()
+            self.dispatcher.stop()
+            self.metrics_exporter.stop()
+            self.cycle_executor.shutdown(wait=False)
+            self.executor.shutdown(wait=False)
 
 if __name__ == "__main__":
     monitor = JDMonitor()
@@ -3,25 +3,23 @@
 
 import json
 import time
-import re
 import logging
 import os
-import random
+import http.client
 import urllib.request
-import urllib.parse
-import urllib.error
+from urllib.parse import urlsplit
 from datetime import datetime, timedelta
 from configparser import ConfigParser
+from rate_limiter import RateLimiter
+from url_resolver import SkuResolver
+from sku_extract import extract_sku
+from http_pool import ConnectionPool
+from circuit_breaker import BreakerRegistry, RETRYABLE_ERRORS, classify_response, decorrelated_jitter
+import metrics
+from structured_log import setup_logging
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("jd_monitor.log"),
-        logging.StreamHandler()
-    ]
-)
+# 配置日志：JSON行格式，后台线程批量写入
+setup_logging("jd_monitor.log")
 
 class JDMonitor:
     def __init__(self, config_file='config.ini'):
@@ -31,7 +29,14 @@ class JDMonitor:
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
             'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
         }
+        # 按主机复用连接，每次检查不再重新建立TCP和TLS连接
+        self.http = ConnectionPool(self.headers)
         self.load_config()
+        # 按主机限速，替代每次请求前的固定随机延迟
+        self.rate_limiter = RateLimiter(self.requests_per_second, self.burst, self.jitter)
+        # 按主机熔断，被反爬拦截时暂停请求
+        self.breakers = BreakerRegistry(threshold=self.breaker_threshold, base_delay=self.breaker_base_delay,
+                                        max_delay=self.breaker_max_delay)
         
     def load_config(self):
         """加载配置文件"""
@@ -44,9 +49,26 @@ class JDMonitor:
         self.jd_url = config.get('JD', 'product_url')
         self.check_interval = config.getint('Monitor', 'check_interval')
         self.notify_minutes_before = config.getint('Monitor', 'notify_minutes_before')
+        self.requests_per_second = config.getfloat('Monitor', 'requests_per_second', fallback=2.0)
+        self.burst = config.getint('Monitor', 'burst', fallback=5)
+        self.jitter = config.getfloat('Monitor', 'jitter', fallback=0.5)
+        # 失败重试的等待时间从 retry_base_delay 秒开始按去相关抖动增加
+        self.retry_base_delay = config.getfloat('Monitor', 'retry_base_delay', fallback=1.0)
+        self.retry_max_delay = config.getfloat('Monitor', 'retry_max_delay', fallback=30.0)
+        self.breaker_threshold = config.getint('Monitor', 'breaker_threshold', fallback=5)
+        self.breaker_base_delay = config.getfloat('Monitor', 'breaker_base_delay', fallback=30.0)
+        self.breaker_max_delay = config.getfloat('Monitor', 'breaker_max_delay', fallback=600.0)
         self.wxpusher_token = config.get('WxPusher', 'token')
         self.wxpusher_uids = json.loads(config.get('WxPusher', 'uids'))
         
+        # 短链接解析结果缓存在文件中，成功和失败分别设置有效期
+        self.resolver = SkuResolver(
+            self.resolve_short_url, extract_sku,
+            cache_file=config.get('JD', 'url_cache', fallback='url_cache.json'),
+            ttl=config.getint('JD', 'url_cache_ttl', fallback=30 * 86400),
+            negative_ttl=config.getint('JD', 'url_cache_negative_ttl', fallback=3600)
+        )
+        
         # 解析商品ID
         self.product_id = self.extract_product_id(self.jd_url)
         logging.info(f"监控商品ID: {self.product_id}")
@@ -76,85 +98,63 @@ class JDMonitor:
         
     def extract_product_id(self, url):
         """从京东链接中提取商品ID"""
-        # 处理短链接
-        if '3.cn' in url or 'item.jd.com' not in url:
-            try:
-                req = urllib.request.Request(url, headers=self.headers)
-                response = urllib.request.urlopen(req, timeout=10)
-                if response.geturl() != url:
-                    url = response.geturl()
-            except Exception as e:
-                logging.error(f"解析短链接失败: {e}")
-        
-        # 尝试从URL中提取商品ID
-        patterns = [
-            r'item\.jd\.com\/(\d+)\.html',  # 标准商品页面
-            r'product\/(\d+)\.html',         # 有些商品页面格式
-            r'\?id=(\d+)'                    # URL参数中的ID
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, url)
-            if match:
-                return match.group(1)
-        
-        # 如果上面都没匹配到，尝试解析查询参数
-        parsed_url = urllib.parse.urlparse(url)
-        query_params = urllib.parse.parse_qs(parsed_url.query)
-        
-        # 检查常见的ID参数名
-        for param in ['id', 'productId', 'product_id', 'sku', 'skuId']:
-            if param in query_params:
-                return query_params[param][0]
-                
-        logging.error(f"无法从URL中提取商品ID: {url}")
-        return None
+        return self.resolver.get(url)
+    
+    def resolve_short_url(self, url):
+        """解析短链接，返回跳转后的链接"""
+        req = urllib.request.Request(url, headers=self.headers)
+        response = urllib.request.urlopen(req, timeout=10)
+        return response.geturl()
     
     def make_request(self, url):
-        """发送HTTP请求"""
+        """发送HTTP请求，返回解析后的JSON，失败时返回None
+
+        网络错误、5xx和JSON解析失败按去相关抖动退避后重试；被限流、遇到验证码或
+        其他4xx错误时不再重试。同一主机连续失败时熔断，到期后只放行一个探测请求。
+        """
         max_retries = 3
-        retry_delay = 5
+        host = urlsplit(url).netloc
+        breaker = self.breakers.get(host)
+        delay = 0
         
         for retry in range(max_retries):
-            try:
-                # 请求前添加随机延迟
-                time.sleep(random.uniform(2, 5))
-                
-                req = urllib.request.Request(url, headers=self.headers)
-                response = urllib.request.urlopen(req, timeout=15)
-                content = response.read().decode('utf-8')
-                
-                # 验证返回的内容是否为有效的JSON
-                try:
-                    data = json.loads(content)
-                    return data
-                except json.JSONDecodeError as je:
-                    logging.error(f"JSON解析失败: {je}, 响应内容: {content[:200]}")
-                    if retry < max_retries - 1:
-                        time.sleep(retry_delay)
-                        continue
-                    return None
-                    
-            except urllib.error.HTTPError as he:
-                logging.error(f"HTTP错误: {he.code} - {he.reason}")
-                if retry < max_retries - 1:
-                    time.sleep(retry_delay)
-                    continue
-                return None
-                
-            except urllib.error.URLError as ue:
-                logging.error(f"URL错误: {ue.reason}")
-                if retry < max_retries - 1:
-                    time.sleep(retry_delay)
-                    continue
+            if not breaker.allow():
+                metrics.inc('circuit_rejected_total', host=host)
+                logging.warning(f"{host} 熔断中，{breaker.retry_after():.0f}秒后重试")
                 return None
-                
-            except Exception as e:
-                logging.error(f"请求失败: {e}")
-                if retry < max_retries - 1:
-                    time.sleep(retry_delay)
-                    continue
+            if retry:
+                metrics.inc('http_retries_total', host=host)
+            
+            # 请求前按主机限速
+            self.rate_limiter.acquire(url)
+            start = time.perf_counter()
+            try:
+                response = self.http.request('GET', url, timeout=15)
+            except (OSError, http.client.HTTPException) as e:
+                kind, detail = 'network', f"连接错误: {e}"
+            else:
+                kind = classify_response(response.status, response.body)
+                detail = f"HTTP {response.status} {response.reason}, 响应内容: {response.body[:200]!r}"
+                if kind is None:
+                    # 验证返回的内容是否为有效的JSON
+                    try:
+                        data = json.loads(response.body)
+                        breaker.record_success()
+                        return data
+                    except ValueError as je:
+                        kind, detail = 'json', f"JSON解析失败: {je}, 响应内容: {response.body[:200]!r}"
+            finally:
+                metrics.observe('http_request_duration_seconds', time.perf_counter() - start, host=host)
+            
+            breaker.record_failure(kind)
+            metrics.inc('http_request_errors_total', host=host, reason=kind)
+            if kind in ('json', 'captcha'):
+                metrics.inc('json_decode_errors_total', host=host)
+            logging.error(f"请求失败({kind}): {detail}")
+            if kind not in RETRYABLE_ERRORS or retry == max_retries - 1:
                 return None
+            delay = decorrelated_jitter(delay, self.retry_base_delay, self.retry_max_delay)
+            time.sleep(delay)
         
         return None
     
@@ -172,9 +172,6 @@ class JDMonitor:
             if not data:
                 return False, None, None
             
-            # 添加随机延迟，避免被检测为机器人
-            time.sleep(random.uniform(1, 3))
-            
             # 检查商品状态
             stock_state = data.get('stockInfo', {}).get('stockState', 0)
             product_name = data.get('wareInfo', {}).get('wname', '未知商品')
@@ -222,20 +219,24 @@ class JDMonitor:
                 'Content-Type': 'application/json',
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
             }
-            req = urllib.request.Request(url, data=data_json, headers=headers, method='POST')
             
-            # 发送请求
-            response = urllib.request.urlopen(req, timeout=10)
-            result = json.loads(response.read().decode('utf-8'))
+            # 发送请求，复用与WxPusher的连接
+            start = time.perf_counter()
+            response = self.http.request('POST', url, body=data_json, headers=headers, timeout=10)
+            result = json.loads(response.body.decode('utf-8'))
+            metrics.observe('notify_send_duration_seconds', time.perf_counter() - start)
             
             if result.get('success'):
+                metrics.inc('notify_sent_total', result='success')
                 logging.info(f"WxPusher通知发送成功: {title}")
                 return True
             else:
+                metrics.inc('notify_sent_total', result='failed')
                 logging.error(f"WxPusher通知发送失败: {result}")
                 return False
                 
         except Exception as e:
+            metrics.inc('notify_sent_total', result='error')
             logging.error(f"发送WxPusher通知时出错: {e}")
             return False
     
@@ -244,55 +245,63 @@ class JDMonitor:
         logging.info(f"开始监控京东商品: {self.jd_url}")
         logging.info(f"检查间隔: {self.check_interval}秒, 提前通知时间: {self.notify_minutes_before}分钟")
         
-        # notification_sent = False
-        # last_status = False
+        # 请求、通知和熔断的指标写入快照文件，由 /metrics 汇总
+        metrics.gauge_callback('circuit_state', self.breakers.states)
+        self.metrics_exporter = metrics.start_exporter('jd_monitor_lite')
+        
+        try:
+            # notification_sent = False
+            # last_status = False
         
-        # while True:
-        #     try:
-                # is_available, product_name, start_time = self.check_product_status()
+            # while True:
+            #     try:
+                    # is_available, product_name, start_time = self.check_product_status()
                 
-                # current_time = datetime.now()
-                # status_changed = is_available != last_status
-                # last_status = is_available
+                    # current_time = datetime.now()
+                    # status_changed = is_available != last_status
+                    # last_status = is_available
                 
-                # if product_name:
-                #     logging.info(f"商品: {product_name} - {'可购买' if is_available else '不可购买'}")
+                    # if product_name:
+                    #     logging.info(f"商品: {product_name} - {'可购买' if is_available else '不可购买'}")
                 
-                # # 如果有开售时间，检查是否需要提前通知
-                # if start_time and not notification_sent:
-                #     time_diff = start_time - current_time
-                #     minutes_to_start = time_diff.total_seconds() / 60
+                    # # 如果有开售时间，检查是否需要提前通知
+                    # if start_time and not notification_sent:
+                    #     time_diff = start_time - current_time
+                    #     minutes_to_start = time_diff.total_seconds() / 60
                     
-                #     # 如果距离开售时间小于等于提前通知时间，发送通知
-                #     if 0 < minutes_to_start <= self.notify_minutes_before:
-                #         title = f"⏰ 京东商品即将开售提醒"
-                #         content = f"您监控的商品【{product_name}】将在{minutes_to_start:.1f}分钟后开始销售！\n\n开售时间: {start_time.strftime('%Y-%m-%d %H:%M:%S')}\n立即前往: https://item.jd.com/{self.product_id}.html"
+                    #     # 如果距离开售时间小于等于提前通知时间，发送通知
+                    #     if 0 < minutes_to_start <= self.notify_minutes_before:
+                    #         title = f"⏰ 京东商品即将开售提醒"
+                    #         content = f"您监控的商品【{product_name}】将在{minutes_to_start:.1f}分钟后开始销售！\n\n开售时间: {start_time.strftime('%Y-%m-%d %H:%M:%S')}\n立即前往: https://item.jd.com/{self.product_id}.html"
                         
-                #         self.send_wxpusher_notification(title, content)
-                #         notification_sent = True
-                #         logging.info(f"已发送商品即将开售提醒，开售时间: {start_time}")
+                    #         self.send_wxpusher_notification(title, content)
+                    #         notification_sent = True
+                    #         logging.info(f"已发送商品即将开售提醒，开售时间: {start_time}")
                 
-                # 如果商品状态变为可购买，发送通知
-                # if is_available and status_changed:
-        if True:
-            title = f"🎉 京东商品已上架可购买"
-            # content = f"您监控的商品【{product_name}】已经上架可以购买了！\n\n立即前往: https://item.jd.com/{self.product_id}.html"
-            content = f"您监控的商品已经上架可以购买了！\n\n立即前往: https://item.jd.com/{self.product_id}.html"
+                    # 如果商品状态变为可购买，发送通知
+                    # if is_available and status_changed:
+            if True:
+                title = f"🎉 京东商品已上架可购买"
+                # content = f"您监控的商品【{product_name}】已经上架可以购买了！\n\n立即前往: https://item.jd.com/{self.product_id}.html"
+                content = f"您监控的商品已经上架可以购买了！\n\n立即前往: https://item.jd.com/{self.product_id}.html"
 
-            self.send_wxpusher_notification(title, content)
-            logging.info(f"商品已上架可购买，已发送通知")
+                self.send_wxpusher_notification(title, content)
+                logging.info(f"商品已上架可购买，已发送通知")
                 
-            #     # 等待下一次检查
-            #     time.sleep(self.check_interval)
+                #     # 等待下一次检查
+                #     time.sleep(self.check_interval)
                 
-            # except KeyboardInterrupt:
-            #     logging.info("程序已手动停止")
-            #     break
+                # except KeyboardInterrupt:
+                #     logging.info("程序已手动停止")
+                #     break
                 
-            # except Exception as e:
-            #     logging.error(f"监控过程中出错: {e}")
-            #     # 出错后等待一段时间再继续
-            #     time.sleep(max(30, self.check_interval))
+                # except Exception as e:
+                #     logging.error(f"监控过程中出错: {e}")
+                #     # 出错后等待一段时间再继续
+                #     time.sleep(max(30, self.check_interval))
+        finally:
+            self.metrics_exporter.stop()
+            self.http.close()
 
 if __name__ == "__main__":
     monitor = JDMonitor()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+import os
+import queue
+import threading
+from log_tail import MAX_READ_BYTES, parse_cursor, read_since, tail_lines
+
+
+class Subscription:
+    """一个客户端的订阅，后台线程把新事件放入队列"""
+
+    def __init__(self, source, max_pending):
+        # source 需要提供 unsubscribe(subscription)
+        self.source = source
+        self.queue = queue.Queue(max_pending)
+        # 客户端太慢、队列满时置为True，由客户端重连后从游标处补齐
+        self.overflowed = False
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout=None):
+        """取出下一个事件，超时返回None"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.source.unsubscribe(self)
+
+
+class LogFollower:
+    """跟踪一个日志文件的追加内容并分发给所有订阅者
+
+    每个文件只有一个后台线程按偏移量轮询读取新增的完整行，
+    有订阅者时启动，最后一个订阅者离开后退出。
+    """
+
+    def __init__(self, path, poll_interval=0.5, max_pending=256):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.max_pending = max_pending
+        self.subscribers = set()
+        self.cursor = None
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    def subscribe(self, lines=100, last_cursor=None):
+        """订阅新增内容，返回 (订阅, 初始事件)
+
+        初始事件在锁内生成，和之后分发的内容首尾相接：带上次的游标且
+        中间缺的内容不多时只补齐缺的部分，否则返回当前的最后lines行。
+        """
+        with self.lock:
+            if self.cursor is None:
+                self.cursor = tail_lines(self.path, 0)[1]
+            ino, end = parse_cursor(self.cursor)
+
+            last = parse_cursor(last_cursor) if last_cursor else None
+            if last and last[0] == ino and end - MAX_READ_BYTES <= last[1] <= end:
+                with open(self.path, 'rb') as f:
+                    f.seek(last[1])
+                    text = f.read(end - last[1]).decode('utf-8', errors='replace')
+                initial = ('append', text, self.cursor)
+            else:
+                initial = ('reset', tail_lines(self.path, lines, end=end)[0], self.cursor)
+
+            subscription = Subscription(self, self.max_pending)
+            self.subscribers.add(subscription)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.worker, name=f'log-follower-{os.path.basename(self.path)}',
+                                               daemon=True)
+                self.thread.start()
+        return subscription, initial
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscribers.discard(subscription)
+        self.wakeup.set()
+
+    def poll(self):
+        """读取一次新增内容并分发，返回是否还有没读完的内容"""
+        with self.lock:
+            text, cursor, reset = read_since(self.path, self.cursor)
+            if cursor == self.cursor and not reset:
+                return False
+            self.cursor = cursor
+            event = ('reset' if reset else 'append', text, cursor)
+            for subscription in self.subscribers:
+                subscription.put(event)
+        # 读到内容时立即再读一次，直到追上文件末尾
+        return True
+
+    def worker(self):
+        while True:
+            with self.lock:
+                if not self.subscribers:
+                    self.thread = None
+                    self.cursor = None
+                    return
+            try:
+                if os.path.exists(self.path) and self.poll():
+                    continue
+            except Exception as e:
+                logging.error(f"读取日志 {self.path} 失败: {e}")
+            self.wakeup.wait(self.poll_interval)
+            self.wakeup.clear()
+
+
+class LogHub:
+    """按文件路径共享LogFollower"""
+
+    def __init__(self, poll_interval=0.5, max_pending=256):
+        self.poll_interval = poll_interval
+        self.max_pending = max_pending
+        self.followers = {}
+        self.lock = threading.Lock()
+
+    def follower(self, path):
+        with self.lock:
+            follower = self.followers.get(path)
+            if follower is None:
+                follower = self.followers[path] = LogFollower(path, self.poll_interval, self.max_pending)
+            return follower
+
+    def subscribe(self, path, lines=100, last_cursor=None):
+        return self.follower(path).subscribe(lines, last_cursor)
+
+
+def format_event(event):
+    """转换为SSE格式，游标作为事件ID，断线重连时浏览器会通过Last-Event-ID带回"""
+    kind, text, cursor = event
+    payload = json.dumps({'text': text, 'cursor': cursor}, ensure_ascii=False)
+    return f"id: {cursor}\nevent: {kind}\ndata: {payload}\n\n"
+
+
+def stream_events(subscription, initial, heartbeat=15.0, format=format_event):
+    """SSE响应体生成器，format把事件转换为SSE文本，客户端断开时取消订阅"""
+    try:
+        yield "retry: 3000\n\n"
+        yield format(initial)
+        while True:
+            event = subscription.get(timeout=heartbeat)
+            if subscription.overflowed:
+                # 客户端跟不上时断开，浏览器重连后重新获取
+                yield "event: overflow\ndata: {}\n\n"
+                return
+            if event is None:
+                # 注释行作为心跳，及时发现已断开的连接
+                yield ": keepalive\n\n"
+                continue
+            yield format(event)
+    finally:
+        subscription.close()
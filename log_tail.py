@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+
+BLOCK_SIZE = 8192
+# 增量读取时单次最多返回的字节数，剩余部分下次请求继续读
+MAX_READ_BYTES = 1024 * 1024
+
+
+def format_cursor(ino, offset):
+    return f"{ino}:{offset}"
+
+
+def parse_cursor(cursor):
+    """解析 "inode:偏移量" 形式的游标，格式不对时返回None"""
+    try:
+        ino, offset = cursor.split(':', 1)
+        return int(ino), int(offset)
+    except (AttributeError, ValueError):
+        return None
+
+
+def tail_lines(path, lines=50, block_size=BLOCK_SIZE, end=None):
+    """从文件末尾按块向前读取最后lines行，返回 (文本, 游标)
+
+    只读取包含这些行的块，耗时与文件大小无关；末尾没有换行的半行不返回，
+    游标指向已返回内容的末尾，下次从这里增量读取。
+    指定end（必须在行尾）时读取该位置之前的最后lines行。
+    """
+    with open(path, 'rb') as f:
+        st = os.fstat(f.fileno())
+        if end is None or end > st.st_size:
+            end = st.st_size
+            # 末尾的半行可能还在写入，留到下次读取
+            end -= len(_partial_tail(f, end, block_size))
+        if lines <= 0 or end <= 0:
+            return '', format_cursor(st.st_ino, end)
+
+        position = end
+        data = b''
+        # 需要 lines 个换行之前的内容，多找到一个换行即可停止
+        while position > 0 and data.count(b'\n') <= lines:
+            size = min(block_size, position)
+            position -= size
+            f.seek(position)
+            data = f.read(size) + data
+
+        # 去掉最后一个换行后保留最后lines行
+        start = len(data) - 1
+        for _ in range(lines):
+            start = data.rfind(b'\n', 0, start)
+            if start < 0:
+                break
+        return data[start + 1:].decode('utf-8', errors='replace'), format_cursor(st.st_ino, end)
+
+
+def _partial_tail(f, end, block_size):
+    """返回文件末尾最后一个换行之后的内容"""
+    position = end
+    tail = b''
+    while position > 0:
+        size = min(block_size, position)
+        position -= size
+        f.seek(position)
+        chunk = f.read(size)
+        index = chunk.rfind(b'\n')
+        if index >= 0:
+            return chunk[index + 1:] + tail
+        tail = chunk + tail
+    return tail
+
+
+def read_since(path, cursor, lines=50, max_bytes=MAX_READ_BYTES):
+    """从游标处读取新增的完整行，返回 (文本, 新游标, 是否重新开始)
+
+    文件被轮转（inode变化）或截断（大小小于偏移量）时，
+    改为返回新文件的最后lines行，并标记为重新开始。
+    """
+    parsed = parse_cursor(cursor)
+    st = os.stat(path)
+    if parsed is None or parsed[0] != st.st_ino or parsed[1] > st.st_size:
+        text, new_cursor = tail_lines(path, lines)
+        return text, new_cursor, True
+
+    ino, offset = parsed
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        data = f.read(min(max_bytes, st.st_size - offset))
+    # 只返回完整的行，半行留到下次
+    end = data.rfind(b'\n') + 1
+    if end == 0 and len(data) >= max_bytes:
+        # 单行超过读取上限时直接返回，避免游标永远停在原地
+        end = len(data)
+    return data[:end].decode('utf-8', errors='replace'), format_cursor(ino, offset + end), False
@@ -1,35 +1,51 @@
 #!/bin/bash
 
+# 监控脚本由 worker_supervisor.py 管理：意外退出后自动重启，输出写入 run/<脚本>.out.log
+cd "$(dirname "$0")"
+SUPERVISOR="python3 worker_supervisor.py"
+SCRIPT="${2:-weather}"
+
 function start_supervisor() {
-    supervisord -c supervisor.conf
-    echo "Supervisor已启动"
+    $SUPERVISOR daemon
 }
 
 function stop_supervisor() {
-    supervisorctl -c supervisor.conf shutdown
-    echo "Supervisor已停止"
+    $SUPERVISOR shutdown
+}
+
+function start_service() {
+    $SUPERVISOR start "$SCRIPT"
+}
+
+function stop_service() {
+    $SUPERVISOR stop "$SCRIPT"
 }
 
 function restart_service() {
-    supervisorctl -c supervisor.conf restart weather_monitor
-    echo "天气监控服务已重启"
+    $SUPERVISOR restart "$SCRIPT"
 }
 
 function check_status() {
-    supervisorctl -c supervisor.conf status
+    $SUPERVISOR status
 }
 
 function show_logs() {
-    tail -f weather_supervisor.log
+    tail -f "run/$SCRIPT.out.log"
 }
 
 case "$1" in
-    start)
+    daemon)
         start_supervisor
         ;;
-    stop)
+    shutdown)
         stop_supervisor
         ;;
+    start)
+        start_service
+        ;;
+    stop)
+        stop_service
+        ;;
     restart)
         restart_service
         ;;
@@ -40,9 +56,9 @@ case "$1" in
         show_logs
         ;;
     *)
-        echo "用法: $0 {start|stop|restart|status|logs}"
+        echo "用法: $0 {daemon|shutdown|start|stop|restart|status|logs} [weather|jd_monitor]"
         exit 1
         ;;
 esac
 
-exit 0
\ No newline at end of file
+exit 0
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import bisect
+import glob
+import json
+import logging
+import math
+import os
+import threading
+import time
+
+# 默认的耗时分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _key(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+class MetricsRegistry:
+    """进程内的计数器、直方图和仪表盘
+
+    计数器和直方图按线程累加：每个线程只写自己的字典，不需要加锁，
+    一次记录只有几微秒；导出时再把所有线程的数据相加。
+    """
+
+    def __init__(self):
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        # 所有线程的累加数据：[(计数器字典, 直方图字典)]
+        self.shards = []
+        self.gauges = {}
+        self.callbacks = {}
+        self.buckets = {}
+        self.help = {}
+
+    def _shard(self):
+        shard = getattr(self.local, 'shard', None)
+        if shard is None:
+            shard = self.local.shard = ({}, {})
+            with self.lock:
+                self.shards.append(shard)
+        return shard
+
+    def describe(self, name, kind, help_text, buckets=None):
+        """登记指标的类型（counter/histogram/gauge）和说明"""
+        self.help[name] = (kind, help_text)
+        if buckets is not None:
+            self.buckets[name] = tuple(buckets)
+
+    def inc(self, name, value=1, **labels):
+        counters = self._shard()[0]
+        key = (name, _key(labels))
+        counters[key] = counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        histograms = self._shard()[1]
+        key = (name, _key(labels))
+        bounds = self.buckets.get(name, DEFAULT_BUCKETS)
+        cell = histograms.get(key)
+        if cell is None:
+            # 每个分桶的计数，最后两项为总和与次数
+            cell = histograms[key] = [0] * (len(bounds) + 1) + [0.0, 0]
+        cell[bisect.bisect_left(bounds, value)] += 1
+        cell[-2] += value
+        cell[-1] += 1
+
+    def set_gauge(self, name, value, **labels):
+        self.gauges[(name, _key(labels))] = value
+
+    def gauge_callback(self, name, func):
+        """导出时调用func获取仪表盘的值，返回数值或 {标签元组: 数值}"""
+        self.callbacks[name] = func
+
+    def snapshot(self):
+        """汇总所有线程的数据，返回可以JSON序列化的字典"""
+        counters, histograms = {}, {}
+        with self.lock:
+            shards = list(self.shards)
+        for shard_counters, shard_histograms in shards:
+            # 其他线程可能同时写入，先复制一份
+            for key, value in list(shard_counters.items()):
+                counters[key] = counters.get(key, 0) + value
+            for key, cell in list(shard_histograms.items()):
+                total = histograms.get(key)
+                if total is None:
+                    histograms[key] = list(cell)
+                else:
+                    for i, value in enumerate(cell):
+                        total[i] += value
+
+        gauges = dict(self.gauges)
+        for name, func in list(self.callbacks.items()):
+            try:
+                value = func()
+            except Exception as e:
+                logging.debug(f"获取指标{name}失败: {e}")
+                continue
+            if isinstance(value, dict):
+                for labels, v in value.items():
+                    gauges[(name, labels)] = v
+            elif value is not None:
+                gauges[(name, ())] = value
+
+        return {
+            'help': self.help,
+            'buckets': {name: list(bounds) for name, bounds in self.buckets.items()},
+            'counters': [[name, list(labels), value] for (name, labels), value in counters.items()],
+            'histograms': [[name, list(labels), cell] for (name, labels), cell in histograms.items()],
+            'gauges': [[name, list(labels), value] for (name, labels), value in gauges.items()],
+        }
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    parts = []
+    for name, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{name}="{value}"')
+    return '{' + ','.join(parts) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        if math.isinf(value):
+            return '+Inf' if value > 0 else '-Inf'
+        return repr(value)
+    return str(value)
+
+
+def render(snapshots):
+    """把多个进程的快照合并为Prometheus文本格式，snapshots为 {进程名: 快照}"""
+    families = {}
+    help_texts = {}
+    for process, snapshot in sorted(snapshots.items()):
+        help_texts.update(snapshot.get('help', {}))
+        buckets = snapshot.get('buckets', {})
+        for kind in ('counters', 'histograms', 'gauges'):
+            for name, labels, value in snapshot.get(kind, []):
+                labels = [('process', process)] + [tuple(label) for label in labels]
+                families.setdefault(name, []).append((kind, labels, value, buckets.get(name, DEFAULT_BUCKETS)))
+
+    lines = []
+    for name in sorted(families):
+        samples = families[name]
+        kind, help_text = help_texts.get(name, (None, None))
+        if help_text:
+            lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind or {'counters': 'counter', 'histograms': 'histogram'}.get(samples[0][0], 'gauge')}")
+        for sample_kind, labels, value, bounds in samples:
+            if sample_kind != 'histograms':
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(list(bounds) + [math.inf], value[:-2]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(labels + [('le', _format_value(float(bound)))])} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(float(value[-2]))}")
+            lines.append(f"{name}_count{_format_labels(labels)} {value[-1]}")
+    return '\n'.join(lines) + '\n'
+
+
+def load_snapshots(directory, max_age=300.0):
+    """读取各监控进程导出的快照，忽略超过max_age秒没有更新的（进程已退出）"""
+    snapshots = {}
+    now = time.time()
+    for path in glob.glob(os.path.join(directory, '*.json')):
+        try:
+            if now - os.path.getmtime(path) > max_age:
+                continue
+            with open(path, 'r', encoding='utf-8') as f:
+                snapshots[os.path.splitext(os.path.basename(path))[0]] = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.debug(f"读取指标快照 {path} 失败: {e}")
+    return snapshots
+
+
+class MetricsExporter:
+    """后台线程定期把快照写入文件，供Web端的 /metrics 汇总"""
+
+    def __init__(self, registry, directory, name, interval=15.0):
+        self.registry = registry
+        self.path = os.path.join(directory, f"{name}.json")
+        self.interval = interval
+        self.stopping = threading.Event()
+        self.thread = None
+        os.makedirs(directory, exist_ok=True)
+
+    def flush(self):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.registry.snapshot(), f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except (OSError, TypeError, ValueError) as e:
+            logging.error(f"写入指标快照失败: {e}")
+
+    def start(self):
+        self.thread = threading.Thread(target=self.worker, name='metrics-exporter', daemon=True)
+        self.thread.start()
+
+    def worker(self):
+        self.flush()
+        while not self.stopping.wait(self.interval):
+            self.flush()
+
+    def stop(self):
+        """停止导出并删除快照文件，已停止的进程不再出现在 /metrics 中"""
+        self.stopping.set()
+        if self.thread:
+            self.thread.join(5)
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+# 进程内共享的默认注册表
+REGISTRY = MetricsRegistry()
+describe = REGISTRY.describe
+inc = REGISTRY.inc
+observe = REGISTRY.observe
+set_gauge = REGISTRY.set_gauge
+gauge_callback = REGISTRY.gauge_callback
+
+
+def metrics_dir():
+    """快照目录，由监督进程通过环境变量指定，默认为 RUN_DIR/metrics"""
+    return os.environ.get('METRICS_DIR') or os.path.join(os.environ.get('RUN_DIR', 'run'), 'metrics')
+
+
+def start_exporter(name, interval=15.0):
+    """启动默认注册表的导出线程，进程名优先使用监督进程设置的 METRICS_NAME"""
+    exporter = MetricsExporter(REGISTRY, metrics_dir(), os.environ.get('METRICS_NAME', name), interval)
+    exporter.start()
+    return exporter
+
+describe('http_request_duration_seconds', 'histogram', 'HTTP请求耗时（秒）')
+describe('http_request_errors_total', 'counter', 'HTTP请求失败次数')
+describe('http_retries_total', 'counter', 'HTTP请求重试次数')
+describe('json_decode_errors_total', 'counter', '响应内容JSON解析失败次数')
+describe('circuit_state', 'gauge', '各主机熔断器状态：0 正常，1 半开，2 熔断')
+describe('circuit_rejected_total', 'counter', '熔断期间被拒绝的请求数')
+describe('notify_send_duration_seconds', 'histogram', '发送一条WxPusher通知的耗时（秒）')
+describe('notify_sent_total', 'counter', 'WxPusher通知发送次数')
+describe('notify_lag_seconds', 'histogram', '通知从入队到送达的延迟（秒）',
+         buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600))
+describe('notify_retries_total', 'counter', '通知发送失败后安排重试的次数')
+describe('notify_queue_depth', 'gauge', '等待发送和等待重试的通知数')
+describe('scheduler_pending_tasks', 'gauge', '调度器中等待执行的任务数')
+describe('sku_last_success_age_seconds', 'gauge', '距商品上一次成功获取状态的秒数')
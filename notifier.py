@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+
+
+class DedupCache:
+    """带过期时间的LRU去重缓存，只保存事件key的短哈希"""
+
+    def __init__(self, max_size=10000, ttl=600.0, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        # 哈希 -> 过期时间
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def seen(self, key):
+        """key在有效期内出现过时返回True，否则记录并返回False"""
+        digest = self.digest(key)
+        now = self.clock()
+        with self.lock:
+            expires = self.entries.get(digest)
+            if expires is not None and expires > now:
+                self.entries.move_to_end(digest)
+                return True
+            self.entries[digest] = now + self.ttl
+            self.entries.move_to_end(digest)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+            return False
+
+    def forget(self, key):
+        """删除key的记录，下次出现时不算重复"""
+        with self.lock:
+            self.entries.pop(self.digest(key), None)
+
+    @staticmethod
+    def digest(key):
+        return hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest()
+
+
+class Notification:
+    """一条待发送的通知"""
+    __slots__ = ('title', 'content', 'uids', 'url', 'attempts', 'next_attempt', 'created')
+
+    def __init__(self, title, content, uids, url=None, attempts=0, next_attempt=0, created=None):
+        self.title = title
+        self.content = content
+        self.uids = tuple(uids)
+        self.url = url
+        self.attempts = attempts
+        self.next_attempt = next_attempt
+        # 入队时间，用于统计通知送达的延迟
+        self.created = time.time() if created is None else created
+
+    def to_dict(self):
+        return {
+            'title': self.title,
+            'content': self.content,
+            'uids': list(self.uids),
+            'url': self.url,
+            'attempts': self.attempts,
+            'created': self.created,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['title'], data['content'], data['uids'], data.get('url'), data.get('attempts', 0),
+                   created=data.get('created'))
+
+
+def merge_notifications(items):
+    """把同一批接收人的多条通知合并为一条摘要"""
+    if len(items) == 1:
+        return items[0]
+    urls = {item.url for item in items}
+    content = "\n\n----------\n\n".join(f"{item.title}\n{item.content}" for item in items)
+    return Notification(f"📬 {len(items)}条新提醒", content, items[0].uids,
+                        urls.pop() if len(urls) == 1 else None)
+
+
+class NotificationDispatcher:
+    """后台发送通知，监控循环只负责入队
+
+    带key的通知在去重有效期内只发送一次；收到通知后等待 coalesce_window 秒，
+    期间同一批接收人的通知合并为一条摘要发送；发送失败按指数退避重试。
+    尚未送达的通知由后台线程收到后立即写入文件（同时到达的多条只写一次），
+    进程崩溃后下次启动时继续发送。
+    """
+
+    def __init__(self, send, queue_file='notify_queue.json', max_batch=30, max_retries=5,
+                 base_delay=2.0, max_delay=300.0, coalesce_window=0.0, dedup_ttl=600.0, dedup_size=10000):
+        # send(notification) 返回是否发送成功
+        self.send = send
+        self.queue_file = queue_file
+        self.max_batch = max_batch
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.coalesce_window = coalesce_window
+        self.dedup = DedupCache(dedup_size, dedup_ttl)
+        self.queue = queue.Queue()
+        # 等待重试的通知
+        self.retries = []
+        # 所有尚未送达的通知（按入队顺序），持久化文件保存的就是这些
+        self.undelivered = {}
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def notify(self, title, content, uids, url=None, key=None):
+        """通知入队，立即返回；key（如 商品ID:事件）相同的通知在有效期内只入队一次"""
+        if key is not None and self.dedup.seen(self.dedup_key(key, uids)):
+            logging.info(f"忽略重复通知: {key}")
+            return False
+        item = Notification(title, content, uids, url)
+        with self.lock:
+            self.undelivered[item] = None
+        self.queue.put(item)
+        return True
+
+    def reset(self, key, uids):
+        """清除事件的去重记录，如商品重新缺货后，下一次上架仍然通知"""
+        self.dedup.forget(self.dedup_key(key, uids))
+
+    @staticmethod
+    def dedup_key(key, uids):
+        return f"{key}|{','.join(sorted(uids))}"
+
+    def pending_count(self):
+        with self.lock:
+            return self.queue.qsize() + len(self.retries)
+
+    def start(self):
+        """加载上次未送达的通知并启动后台线程"""
+        for item in self.load():
+            with self.lock:
+                self.undelivered[item] = None
+            self.queue.put(item)
+        self.thread = threading.Thread(target=self.worker, name='notifier', daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=10):
+        """停止后台线程，未送达的通知写入文件"""
+        self.stopping.set()
+        self.queue.put(None)
+        if self.thread:
+            self.thread.join(timeout)
+        self.persist()
+
+    def load(self):
+        if not self.queue_file or not os.path.exists(self.queue_file):
+            return []
+        try:
+            with open(self.queue_file, 'r', encoding='utf-8') as f:
+                items = [Notification.from_dict(data) for data in json.load(f)]
+            logging.info(f"加载{len(items)}条未送达的通知")
+            return items
+        except Exception as e:
+            logging.error(f"读取未送达通知失败: {e}")
+            return []
+
+    def persist(self):
+        """把尚未送达的通知写入文件，没有时删除文件"""
+        if not self.queue_file:
+            return
+        with self.lock:
+            items = list(self.undelivered)
+        try:
+            if items:
+                tmp_file = f"{self.queue_file}.{os.getpid()}.tmp"
+                with open(tmp_file, 'w', encoding='utf-8') as f:
+                    json.dump([item.to_dict() for item in items], f, ensure_ascii=False)
+                os.replace(tmp_file, self.queue_file)
+            elif os.path.exists(self.queue_file):
+                os.remove(self.queue_file)
+        except Exception as e:
+            logging.error(f"保存未送达通知失败: {e}")
+
+    def backoff(self, attempts):
+        """第attempts次失败后的重试等待时间"""
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    def collect(self):
+        """取出当前可以发送的通知：队列中的全部以及到期的重试"""
+        now = time.time()
+        with self.lock:
+            due = [item for item in self.retries if item.next_attempt <= now]
+            self.retries = [item for item in self.retries if item.next_attempt > now]
+            wait = min((item.next_attempt for item in self.retries), default=now + 60) - now
+
+        items = list(due)
+        try:
+            item = self.queue.get(timeout=max(0.0, wait)) if not items else self.queue.get_nowait()
+        except queue.Empty:
+            return items
+        item = self.drain(item, items)
+
+        # 收到新通知后在合并窗口内继续收集，突发的多条通知合并发送
+        deadline = time.monotonic() + self.coalesce_window
+        while item is not None and not self.stopping.is_set():
+            remaining = deadline - time.monotonic()
+            try:
+                item = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            item = self.drain(item, items)
+        return [item for item in items if item is not None]
+
+    def drain(self, item, items):
+        """收下item和队列中已有的通知，写入持久化文件后返回最后一个"""
+        items.append(item)
+        while item is not None:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            items.append(item)
+        # 合并窗口内进程崩溃也不会丢失已入队的通知
+        self.persist()
+        return item
+
+    def dispatch(self, items):
+        """按接收人分组合并后发送，返回失败的通知"""
+        groups = {}
+        for item in items:
+            groups.setdefault(item.uids, []).append(item)
+
+        failed = []
+        for group in groups.values():
+            for i in range(0, len(group), self.max_batch):
+                batch = group[i:i + self.max_batch]
+                message = merge_notifications(batch)
+                try:
+                    ok = self.send(message)
+                except Exception as e:
+                    logging.error(f"发送通知时出错: {e}")
+                    ok = False
+                if not ok:
+                    failed.extend(batch)
+                    continue
+                now = time.time()
+                with self.lock:
+                    for item in batch:
+                        self.undelivered.pop(item, None)
+                for item in batch:
+                    metrics.observe('notify_lag_seconds', now - item.created)
+        return failed
+
+    def worker(self):
+        while not self.stopping.is_set():
+            items = self.collect()
+            if not items:
+                continue
+            failed = self.dispatch(items)
+            if not failed:
+                # 发送成功后更新持久化文件
+                self.persist()
+                continue
+
+            now = time.time()
+            retry = []
+            for item in failed:
+                item.attempts += 1
+                if item.attempts > self.max_retries:
+                    logging.error(f"通知重试{self.max_retries}次仍失败，已放弃: {item.title}")
+                    with self.lock:
+                        self.undelivered.pop(item, None)
+                    continue
+                item.next_attempt = now + self.backoff(item.attempts)
+                retry.append(item)
+                metrics.inc('notify_retries_total')
+            with self.lock:
+                self.retries.extend(retry)
+            self.persist()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import math
+import mmap
+import os
+import struct
+import threading
+from structured_log import file_lock
+
+# 每条记录固定10字节：时间戳(uint32)、库存状态(int16)、价格(float32，未知为NaN)
+RECORD = struct.Struct('<Ihf')
+
+
+class PriceHistory:
+    """商品价格和库存的时间序列，每个商品一个定长记录文件
+
+    记录按时间顺序追加，查询时通过mmap二分查找时间范围，
+    不需要读取整个文件；较早的数据可以通过compact降采样。
+    多个分片进程共用目录时，追加和降采样通过目录下的 .lock 文件互斥。
+    """
+
+    def __init__(self, directory='history'):
+        self.directory = directory
+        self.lock = threading.Lock()
+        # product_id -> 待写入的记录
+        self.pending = {}
+        os.makedirs(directory, exist_ok=True)
+        self.lock_path = os.path.join(directory, '.lock')
+
+    def path_for(self, product_id):
+        product_id = str(product_id)
+        if not product_id.isdigit():
+            raise ValueError(f"无效的商品ID: {product_id}")
+        return os.path.join(self.directory, f"{product_id}.bin")
+
+    def append(self, product_id, timestamp, stock_state, price):
+        """记录一次观察结果，等待flush写入"""
+        record = RECORD.pack(int(timestamp), int(stock_state or 0), math.nan if price is None else price)
+        with self.lock:
+            self.pending.setdefault(str(product_id), []).append(record)
+
+    def flush(self):
+        """把缓存的记录追加到各商品的文件，返回写入的记录数"""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            if not pending:
+                return 0
+            count = 0
+            with file_lock(self.lock_path):
+                for product_id, records in pending.items():
+                    with open(self.path_for(product_id), 'ab') as f:
+                        f.write(b''.join(records))
+                    count += len(records)
+            return count
+
+    @staticmethod
+    def _unpack(record):
+        timestamp, stock_state, price = record
+        return {
+            'timestamp': timestamp,
+            'stock_state': stock_state,
+            'price': None if math.isnan(price) else round(price, 2),
+        }
+
+    @staticmethod
+    def _bisect(buf, count, timestamp):
+        """返回第一条时间戳不小于timestamp的记录序号"""
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if RECORD.unpack_from(buf, mid * RECORD.size)[0] < timestamp:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def query(self, product_id, start=None, end=None, limit=None):
+        """查询时间范围 [start, end] 内的记录，limit限制返回最近的条数"""
+        path = self.path_for(product_id)
+        if not os.path.exists(path) or os.path.getsize(path) < RECORD.size:
+            return []
+
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            count = len(buf) // RECORD.size
+            first = self._bisect(buf, count, start) if start is not None else 0
+            last = self._bisect(buf, count, end + 1) if end is not None else count
+            if limit:
+                first = max(first, last - limit)
+            return [
+                self._unpack(RECORD.unpack_from(buf, i * RECORD.size))
+                for i in range(first, last)
+            ]
+
+    def compact(self, product_id, before, bucket=3600):
+        """对before之前的记录降采样：每个时间段只保留最后一条以及所有状态变化
+
+        返回删除的记录数。
+        """
+        path = self.path_for(product_id)
+        # 读取和替换之间其他进程追加的记录不能丢失
+        with self.lock, file_lock(self.lock_path):
+            if not os.path.exists(path):
+                return 0
+            with open(path, 'rb') as f:
+                data = f.read()
+            count = len(data) // RECORD.size
+            records = [RECORD.unpack_from(data, i * RECORD.size) for i in range(count)]
+
+            kept = []
+            previous = None
+            for i, record in enumerate(records):
+                timestamp, stock_state, price = record
+                if timestamp >= before:
+                    kept.extend(records[i:])
+                    break
+                value = (stock_state, None if math.isnan(price) else price)
+                next_record = records[i + 1] if i + 1 < count else None
+                last_in_bucket = next_record is None or next_record[0] // bucket != timestamp // bucket
+                if value != previous or last_in_bucket:
+                    kept.append(record)
+                previous = value
+
+            if len(kept) == count:
+                return 0
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(b''.join(RECORD.pack(*record) for record in kept))
+            os.replace(tmp_path, path)
+            return count - len(kept)
+
+    def compact_all(self, before, bucket=3600, product_ids=None):
+        """对所有商品（或指定的商品）的历史降采样，返回删除的记录数"""
+        if product_ids is None:
+            product_ids = [name[:-4] for name in os.listdir(self.directory) if name.endswith('.bin')]
+        removed = 0
+        for product_id in product_ids:
+            removed += self.compact(product_id, before, bucket)
+        return removed
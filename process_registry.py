@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+import os
+
+try:
+    import psutil
+except ImportError:  # 没有psutil时无法确认进程是否存在，按已停止处理
+    psutil = None
+
+
+def probe_process(pid):
+    """进程的启动时间，进程不存在或已退出（僵尸进程）时返回None"""
+    if psutil is None:
+        return None
+    try:
+        process = psutil.Process(pid)
+        if process.status() == psutil.STATUS_ZOMBIE:
+            return None
+        return process.create_time()
+    except psutil.Error:
+        return None
+
+
+class ProcessRegistry:
+    """用pid文件记录监督进程启动的脚本进程，监督进程异常退出后据此结束遗留的进程
+
+    pid文件中同时保存进程的启动时间，pid被系统复用给其他进程时
+    启动时间对不上，按已停止处理。
+    """
+
+    def __init__(self, run_dir, probe):
+        # probe(pid) 返回进程的启动时间，进程不存在或已退出时返回None
+        self.run_dir = run_dir
+        self.probe = probe
+        os.makedirs(run_dir, exist_ok=True)
+
+    def pid_path(self, script_id):
+        return os.path.join(self.run_dir, f"{script_id}.pid")
+
+    def record(self, script_id, pid):
+        """记录新启动的进程"""
+        path = self.pid_path(script_id)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'pid': pid, 'started': self.probe(pid)}, f)
+        os.replace(tmp_path, path)
+
+    def get(self, script_id):
+        """返回正在运行的进程号，没有运行时返回None"""
+        path = self.pid_path(script_id)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logging.error(f"读取pid文件 {path} 失败: {e}")
+            return None
+
+        started = self.probe(data['pid'])
+        if started is None or (data.get('started') is not None and abs(started - data['started']) > 1):
+            return None
+        return data['pid']
+
+    def remove(self, script_id):
+        try:
+            os.remove(self.pid_path(script_id))
+        except FileNotFoundError:
+            pass
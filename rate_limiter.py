@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+
+class TokenBucket:
+    """令牌桶：以固定速率补充令牌，最多积攒 burst 个"""
+
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.clock = clock
+        self.tokens = self.burst
+        self.updated = clock()
+
+    def reserve(self):
+        """预占一个令牌，返回需要等待的秒数
+
+        令牌不足时允许余额为负，后来的请求依次排在后面，
+        这样等待可以在锁外进行，不会阻塞其他主机的请求。
+        """
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+
+class RateLimiter:
+    """按主机共享的请求限速器，替代每次请求前后的固定随机延迟"""
+
+    def __init__(self, rate=2.0, burst=5, jitter=0.5, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.burst = burst
+        self.jitter = jitter
+        self.clock = clock
+        self.sleep = sleep
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def configure(self, rate, burst, jitter):
+        """修改限速参数，已有的令牌桶立即生效"""
+        with self.lock:
+            self.rate, self.burst, self.jitter = rate, burst, jitter
+            for bucket in self.buckets.values():
+                bucket.rate = float(rate)
+                bucket.burst = float(burst)
+
+    def reserve(self, url):
+        """为URL所属主机预占一个请求名额，返回需要等待的秒数"""
+        host = urlparse(url).netloc or url
+        with self.lock:
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                bucket = self.buckets[host] = TokenBucket(self.rate, self.burst, self.clock)
+            wait = bucket.reserve()
+        if wait > 0 and self.jitter > 0:
+            # 只在需要排队时加入随机抖动，避免请求间隔过于规律
+            wait += random.uniform(0, self.jitter)
+        return wait
+
+    def acquire(self, url):
+        """等待直到可以向URL所属主机发送请求，只阻塞当前线程"""
+        wait = self.reserve(url)
+        if wait > 0:
+            self.sleep(wait)
+        return wait
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+import os
+from datetime import datetime
+
+# 规则类型
+PRICE_BELOW = 'price_below'      # 价格低于 value
+PRICE_DROP = 'price_drop'        # 单次降价幅度不小于 value 百分比
+STOCK_CHANGE = 'stock_change'    # 库存状态从 from_state 变为 to_state（不填表示任意）
+START_WINDOW = 'start_window'    # 距开售时间不超过 value 分钟
+
+RULE_KINDS = (PRICE_BELOW, PRICE_DROP, STOCK_CHANGE, START_WINDOW)
+
+# 对所有商品生效的规则使用的商品ID
+ANY_SKU = '*'
+
+
+class Rule:
+    """单条提醒规则"""
+    __slots__ = ('rule_id', 'product_id', 'kind', 'value', 'from_state', 'to_state')
+
+    def __init__(self, rule_id, product_id, kind, value=None, from_state=None, to_state=None):
+        if kind not in RULE_KINDS:
+            raise ValueError(f"未知的规则类型: {kind}")
+        if kind != STOCK_CHANGE and value is None:
+            raise ValueError(f"规则 {kind} 缺少 value")
+        self.rule_id = rule_id
+        self.product_id = str(product_id)
+        self.kind = kind
+        self.value = None if value is None else float(value)
+        self.from_state = from_state
+        self.to_state = to_state
+
+    @classmethod
+    def from_dict(cls, rule_id, data):
+        return cls(rule_id, data.get('sku', ANY_SKU), data['type'], data.get('value'),
+                   data.get('from'), data.get('to'))
+
+
+class RuleEngine:
+    """按商品和条件类型建立索引的规则引擎
+
+    每次观察只取出该商品（以及对所有商品生效）的规则，并且只检查
+    输入发生变化的条件类型：价格没变不看价格规则，库存没变不看库存规则，
+    因此耗时只和真正相关的规则数量有关。
+    """
+
+    def __init__(self, rules=()):
+        # product_id -> 规则类型 -> [Rule]
+        self.index = {}
+        self.count = 0
+        # 已经触发过的开售窗口规则，避免同一开售时间重复提醒
+        self.fired_windows = set()
+        for rule in rules:
+            self.add(rule)
+
+    def add(self, rule):
+        self.index.setdefault(rule.product_id, {}).setdefault(rule.kind, []).append(rule)
+        self.count += 1
+
+    def remove_sku(self, product_id):
+        """删除某个商品的全部规则"""
+        kinds = self.index.pop(str(product_id), {})
+        self.count -= sum(len(rules) for rules in kinds.values())
+
+    @classmethod
+    def load(cls, path):
+        """从JSON文件加载规则，文件不存在时返回空引擎"""
+        engine = cls()
+        if not path or not os.path.exists(path):
+            return engine
+        with open(path, 'r', encoding='utf-8') as f:
+            items = json.load(f)
+        for i, item in enumerate(items):
+            try:
+                engine.add(Rule.from_dict(item.get('id', i), item))
+            except (KeyError, ValueError, TypeError) as e:
+                logging.error(f"忽略无效规则 {item}: {e}")
+        return engine
+
+    def _rules(self, product_id, kind):
+        for key in (product_id, ANY_SKU):
+            kinds = self.index.get(key)
+            if kinds:
+                yield from kinds.get(kind, ())
+
+    def evaluate(self, product_id, status, prev_stock_state, prev_price, now=None):
+        """评估一次观察，返回触发的 (规则, 标题, 内容) 列表"""
+        now = now or datetime.now()
+        if product_id not in self.index and ANY_SKU not in self.index:
+            return []
+
+        name = status.product_name
+        link = f"https://item.jd.com/{product_id}.html"
+        fired = []
+
+        price = status.price
+        if price is not None and price != prev_price:
+            for rule in self._rules(product_id, PRICE_BELOW):
+                if price < rule.value and (prev_price is None or prev_price >= rule.value):
+                    fired.append((rule, "💰 京东商品低于目标价",
+                                  f"您监控的商品【{name}】当前价格¥{price:.2f}，已低于目标价¥{rule.value:.2f}！\n\n立即前往: {link}"))
+            if prev_price:
+                drop = (prev_price - price) / prev_price * 100
+                for rule in self._rules(product_id, PRICE_DROP):
+                    if drop >= rule.value:
+                        fired.append((rule, "📉 京东商品降价提醒",
+                                      f"您监控的商品【{name}】从¥{prev_price:.2f}降至¥{price:.2f}，降幅{drop:.1f}%！\n\n立即前往: {link}"))
+
+        stock_state = status.stock_state
+        if prev_stock_state is not None and stock_state != prev_stock_state:
+            for rule in self._rules(product_id, STOCK_CHANGE):
+                if rule.from_state is not None and rule.from_state != prev_stock_state:
+                    continue
+                if rule.to_state is not None and rule.to_state != stock_state:
+                    continue
+                fired.append((rule, "📦 京东商品库存变化",
+                              f"您监控的商品【{name}】库存状态由{prev_stock_state}变为{stock_state}！\n\n立即前往: {link}"))
+
+        start_time = status.start_time
+        if start_time:
+            minutes_to_start = (start_time - now).total_seconds() / 60
+            for rule in self._rules(product_id, START_WINDOW):
+                key = (rule.rule_id, product_id, start_time)
+                if 0 < minutes_to_start <= rule.value and key not in self.fired_windows:
+                    self.fired_windows.add(key)
+                    fired.append((rule, "⏰ 京东商品即将开售提醒",
+                                  f"您监控的商品【{name}】将在{minutes_to_start:.1f}分钟后开始销售！\n\n开售时间: {start_time.strftime('%Y-%m-%d %H:%M:%S')}\n立即前往: {link}"))
+
+        return fired
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+
+class Scheduler:
+    """基于最小堆的定时任务调度器
+
+    任务按到期时间排序，调度线程只在最近一个任务到期时醒来，
+    不再受固定检查间隔限制。带key的任务重复安排时只保留最后一次，
+    其他线程可以通过 call_soon 把回调交给调度线程执行。
+    """
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.heap = []
+        # key -> 最新一次安排的序号，用于丢弃被覆盖或取消的任务
+        self.entries = {}
+        self.counter = itertools.count()
+        self.condition = threading.Condition()
+        self.stopped = False
+
+    def schedule(self, when, callback, *args, key=None):
+        """在时间戳when执行callback，key相同的旧任务会被覆盖"""
+        with self.condition:
+            seq = next(self.counter)
+            if key is not None:
+                self.entries[key] = seq
+            heapq.heappush(self.heap, (when, seq, key, callback, args))
+            self.condition.notify()
+
+    def call_soon(self, callback, *args):
+        """尽快在调度线程中执行callback"""
+        self.schedule(self.clock(), callback, *args)
+
+    def cancel(self, key):
+        """取消key对应的任务"""
+        with self.condition:
+            self.entries.pop(key, None)
+
+    def is_scheduled(self, key):
+        """判断key对应的任务是否还在等待执行"""
+        with self.condition:
+            return key in self.entries
+
+    def _is_live(self, seq, key):
+        return key is None or self.entries.get(key) == seq
+
+    def _pop_due(self, now):
+        """取出所有到期的任务，需持有锁"""
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            when, seq, key, callback, args = heapq.heappop(self.heap)
+            if self._is_live(seq, key):
+                if key is not None:
+                    del self.entries[key]
+                due.append((callback, args))
+        return due
+
+    def _next_delay(self):
+        """距离下一个有效任务的秒数，需持有锁"""
+        while self.heap and not self._is_live(self.heap[0][1], self.heap[0][2]):
+            heapq.heappop(self.heap)
+        if not self.heap:
+            return None
+        return max(0.0, self.heap[0][0] - self.clock())
+
+    def run_pending(self):
+        """执行所有到期的任务，返回执行的任务数"""
+        with self.condition:
+            due = self._pop_due(self.clock())
+        for callback, args in due:
+            try:
+                callback(*args)
+            except Exception as e:
+                logging.error(f"定时任务执行出错: {e}")
+        return len(due)
+
+    def run(self):
+        """在当前线程中循环执行任务，直到调用stop"""
+        while True:
+            with self.condition:
+                while not self.stopped:
+                    delay = self._next_delay()
+                    if delay == 0:
+                        break
+                    self.condition.wait(delay)
+                if self.stopped:
+                    return
+            self.run_pending()
+
+    def stop(self):
+        """停止调度循环"""
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import bisect
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    """一致性哈希环，每个节点在环上放 vnodes 个虚拟节点
+
+    节点加入或离开时只有相邻区间的商品换节点，约为 1/N，
+    其余商品仍由原来的进程检查，已有状态和定时任务不受影响。
+    """
+
+    def __init__(self, nodes=(), vnodes=64):
+        self.vnodes = vnodes
+        self.nodes = set(nodes)
+        self.points = []
+        self.owners = []
+        self.rebuild()
+
+    def rebuild(self):
+        ring = sorted((_hash(f"{node}#{i}"), node) for node in self.nodes for i in range(self.vnodes))
+        self.points = [point for point, _ in ring]
+        self.owners = [node for _, node in ring]
+
+    def add(self, node):
+        if node not in self.nodes:
+            self.nodes.add(node)
+            self.rebuild()
+
+    def remove(self, node):
+        if node in self.nodes:
+            self.nodes.discard(node)
+            self.rebuild()
+
+    def node_for(self, key):
+        """key所属的节点，环为空时返回None"""
+        if not self.points:
+            return None
+        index = bisect.bisect(self.points, _hash(key)) % len(self.points)
+        return self.owners[index]
+
+
+class ShardRegistry:
+    """记录分片工作进程的共享存储（SQLite，多进程安全）
+
+    每个工作进程定期写入心跳；成员加入、离开或因心跳超时被移除时
+    递增epoch，各进程看到epoch变化后重新计算自己负责的商品。
+    """
+
+    def __init__(self, path='shards.db', clock=time.time):
+        self.path = path
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        with self.conn:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS shard_member (
+                    worker_id TEXT PRIMARY KEY,
+                    pid INTEGER,
+                    heartbeat REAL NOT NULL,
+                    sku_count INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+            self.conn.execute('CREATE TABLE IF NOT EXISTS shard_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+            self.conn.execute("INSERT OR IGNORE INTO shard_meta (key, value) VALUES ('epoch', 0)")
+
+    def _bump(self):
+        self.conn.execute("UPDATE shard_meta SET value = value + 1 WHERE key = 'epoch'")
+
+    def join(self, worker_id, pid=None):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO shard_member (worker_id, pid, heartbeat) VALUES (?, ?, ?)",
+                (worker_id, pid or os.getpid(), self.clock()))
+            self._bump()
+
+    def heartbeat(self, worker_id, sku_count=0, pid=None):
+        """更新心跳；已被当作失联移除时重新加入"""
+        with self.lock, self.conn:
+            updated = self.conn.execute(
+                "UPDATE shard_member SET heartbeat = ?, sku_count = ? WHERE worker_id = ?",
+                (self.clock(), sku_count, worker_id)).rowcount
+            if not updated:
+                self.conn.execute(
+                    "INSERT INTO shard_member (worker_id, pid, heartbeat, sku_count) VALUES (?, ?, ?, ?)",
+                    (worker_id, pid or os.getpid(), self.clock(), sku_count))
+                self._bump()
+
+    def leave(self, worker_id):
+        with self.lock, self.conn:
+            if self.conn.execute("DELETE FROM shard_member WHERE worker_id = ?", (worker_id,)).rowcount:
+                self._bump()
+
+    def prune(self, ttl):
+        """移除心跳超时的成员，返回被移除的worker_id列表"""
+        with self.lock, self.conn:
+            deadline = self.clock() - ttl
+            stale = [row[0] for row in self.conn.execute(
+                "SELECT worker_id FROM shard_member WHERE heartbeat < ?", (deadline,))]
+            if stale:
+                self.conn.executemany("DELETE FROM shard_member WHERE worker_id = ?", [(w,) for w in stale])
+                self._bump()
+        for worker_id in stale:
+            logging.warning(f"分片 {worker_id} 心跳超时，已移除")
+        return stale
+
+    def members(self):
+        """返回 (epoch, 成员worker_id列表)"""
+        with self.lock:
+            epoch = self.conn.execute("SELECT value FROM shard_meta WHERE key = 'epoch'").fetchone()[0]
+            members = [row[0] for row in self.conn.execute("SELECT worker_id FROM shard_member ORDER BY worker_id")]
+        return epoch, members
+
+    def status(self):
+        """各成员的进程号、距上次心跳的秒数和负责的商品数"""
+        now = self.clock()
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT worker_id, pid, heartbeat, sku_count FROM shard_member ORDER BY worker_id").fetchall()
+        return {
+            worker_id: {'pid': pid, 'heartbeat_age': round(now - heartbeat, 1), 'skus': sku_count}
+            for worker_id, pid, heartbeat, sku_count in rows
+        }
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class ShardMember:
+    """单个工作进程在分片中的身份，决定它负责检查哪些商品"""
+
+    def __init__(self, registry, worker_id, ttl=20.0, vnodes=64):
+        self.registry = registry
+        self.worker_id = worker_id
+        self.ttl = ttl
+        self.ring = HashRing(vnodes=vnodes)
+        self.epoch = None
+
+    def join(self):
+        self.registry.join(self.worker_id)
+        self.sync()
+
+    def sync(self, sku_count=0):
+        """发送心跳并移除失联的成员，成员变化时重建哈希环并返回True"""
+        self.registry.heartbeat(self.worker_id, sku_count)
+        self.registry.prune(self.ttl)
+        epoch, members = self.registry.members()
+        if epoch == self.epoch:
+            return False
+        self.epoch = epoch
+        if set(members) == self.ring.nodes:
+            return False
+        self.ring = HashRing(members, self.ring.vnodes)
+        logging.info(f"分片成员变化，当前{len(members)}个: {', '.join(members)}")
+        return True
+
+    def owns(self, product_id):
+        return self.ring.node_for(product_id) in (self.worker_id, None)
+
+    def leave(self):
+        self.registry.leave(self.worker_id)
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import re
+
+# 一个预编译的正则覆盖所有支持的链接格式，每个分支只有一个分组
+SKU_PATTERN = re.compile(
+    r'item(?:\.m)?\.jd\.com/(?:product/)?(\d+)\.html'                   # item.jd.com/123.html, item.m.jd.com/product/123.html
+    r'|product/(\d+)\.html'                                              # 其他带product路径的页面
+    r'|[?&](?:id|productId|product_id|sku|skuId|wareId)=(\d+)'          # URL参数中的ID
+)
+
+# 从分享文本中找出链接，遇到空白、引号、中文标点即结束
+URL_PATTERN = re.compile(r'https?://[^\s"\'<>，。！、）)]+')
+
+# 需要联网解析的短链接
+SHORT_LINK_PATTERN = re.compile(r'^https?://(?:[\w-]+\.)?3\.cn/')
+
+
+def extract_sku(url):
+    """从链接中提取商品ID，不联网，提取不到返回None"""
+    match = SKU_PATTERN.search(url)
+    if match:
+        return match.group(match.lastindex)
+    return None
+
+
+def is_short_link(url):
+    return SHORT_LINK_PATTERN.match(url) is not None
+
+
+def iter_urls(lines):
+    """从文本行（表格粘贴、分享文本等）中逐个取出链接"""
+    for line in lines:
+        yield from URL_PATTERN.findall(line)
+
+
+def iter_skus(lines):
+    """逐个产出 (链接, 商品ID)，短链接等无法直接提取的商品ID为None"""
+    for url in iter_urls(lines):
+        yield url, extract_sku(url)
+
+
+def extract_skus(lines, resolver=None):
+    """批量提取去重后的商品ID列表
+
+    能直接提取的不联网；其余链接交给resolver（SkuResolver）整批并发解析。
+    """
+    skus = {}
+    unresolved = []
+    for url, sku in iter_skus(lines):
+        if sku:
+            skus.setdefault(sku, None)
+        elif resolver is not None:
+            unresolved.append(url)
+
+    if unresolved:
+        for sku in resolver.resolve_all(unresolved).values():
+            if sku:
+                skus.setdefault(sku, None)
+    return list(skus)
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sqlite3
+import threading
+import time
+
+# 持久化的商品状态字段
+FIELDS = ('product_name', 'last_status', 'stock_state', 'price', 'start_time', 'notification_sent')
+
+
+class SkuStore:
+    """基于SQLite（WAL模式）的商品状态存储
+
+    启动时一次性读取全部商品状态；运行中的修改先合并在内存里，
+    由 flush 在一个事务中批量写入，避免每次检查都落盘。
+    """
+
+    def __init__(self, path='jd_monitor.db'):
+        self.path = path
+        self.lock = threading.Lock()
+        # product_id -> 待写入的字段
+        self.pending = {}
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS sku_state (
+                product_id TEXT PRIMARY KEY,
+                product_name TEXT,
+                last_status INTEGER NOT NULL DEFAULT 0,
+                stock_state INTEGER,
+                price REAL,
+                start_time REAL,
+                notification_sent INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL
+            )
+        ''')
+        self.conn.commit()
+
+    def load_all(self):
+        """读取全部商品状态，返回 product_id -> 字段字典"""
+        with self.lock:
+            cursor = self.conn.execute(f"SELECT product_id, {', '.join(FIELDS)} FROM sku_state")
+            return {row[0]: dict(zip(FIELDS, row[1:])) for row in cursor}
+
+    def update(self, product_id, **fields):
+        """记录商品状态的修改，等待下次flush写入"""
+        unknown = set(fields) - set(FIELDS)
+        if unknown:
+            raise ValueError(f"未知的商品状态字段: {', '.join(sorted(unknown))}")
+        with self.lock:
+            self.pending.setdefault(product_id, {}).update(fields)
+
+    def flush(self):
+        """把累积的修改在一个事务中写入，返回写入的商品数"""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            if not pending:
+                return 0
+            now = time.time()
+            with self.conn:
+                for product_id, fields in pending.items():
+                    columns = list(fields)
+                    self.conn.execute(
+                        f"INSERT INTO sku_state (product_id, {', '.join(columns)}, updated_at) "
+                        f"VALUES (?, {', '.join('?' * len(columns))}, ?) "
+                        f"ON CONFLICT(product_id) DO UPDATE SET "
+                        f"{', '.join(f'{c} = excluded.{c}' for c in columns)}, updated_at = excluded.updated_at",
+                        [product_id, *fields.values(), now],
+                    )
+            return len(pending)
+
+    def delete(self, product_ids):
+        """删除不再监控的商品"""
+        with self.lock:
+            for product_id in product_ids:
+                self.pending.pop(product_id, None)
+            with self.conn:
+                self.conn.executemany("DELETE FROM sku_state WHERE product_id = ?",
+                                      [(product_id,) for product_id in product_ids])
+
+    def close(self):
+        self.flush()
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+import threading
+import time
+from log_stream import Subscription
+
+
+def format_status_event(event):
+    kind, data = event
+    return f"event: {kind}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class StatusHub:
+    """汇总所有脚本的运行状态并推送给订阅者
+
+    一个后台线程每 interval 秒检查一次进程状态，只在启动、停止、
+    进程退出等变化时推送；有脚本在运行时每 metrics_interval 秒
+    额外推送一次资源占用。没有订阅者时线程退出。
+    """
+
+    def __init__(self, collect, sample, interval=1.0, metrics_interval=10.0, max_pending=64, clock=time.monotonic):
+        # collect() 返回 {脚本ID: {'status': 'running'/'stopped', 'pid': pid或None}}
+        # sample(pid) 返回进程的 uptime、rss、cpu 等信息，进程不存在时抛出异常
+        self.collect = collect
+        self.sample = sample
+        self.interval = interval
+        self.metrics_interval = metrics_interval
+        self.max_pending = max_pending
+        self.clock = clock
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+        # 后台线程上次检查到的状态
+        self.last_state = None
+
+    def snapshot(self, state=None):
+        """当前状态加上运行中进程的资源占用"""
+        if state is None:
+            state = self.collect()
+        data = {}
+        for script_id, info in state.items():
+            info = dict(info)
+            if info.get('pid') and info.get('status') == 'running':
+                try:
+                    info.update(self.sample(info['pid']))
+                except Exception as e:
+                    logging.debug(f"获取进程{info['pid']}信息失败: {e}")
+            data[script_id] = info
+        return data
+
+    def subscribe(self):
+        """订阅状态变化，返回 (订阅, 包含当前状态的初始事件)"""
+        subscription = Subscription(self, self.max_pending)
+        state = self.collect()
+        with self.lock:
+            self.subscribers.add(subscription)
+            if self.thread is None:
+                # 从发送给第一个订阅者的状态开始比较，之后的变化都会推送
+                self.last_state = state
+                self.thread = threading.Thread(target=self.worker, name='status-hub', daemon=True)
+                self.thread.start()
+        return subscription, ('status', self.snapshot(state))
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscribers.discard(subscription)
+        self.wakeup.set()
+
+    def refresh(self):
+        """启动或停止脚本后调用，立即检查并推送状态"""
+        self.wakeup.set()
+
+    def publish(self, event):
+        with self.lock:
+            for subscription in self.subscribers:
+                subscription.put(event)
+
+    def worker(self):
+        next_metrics = self.clock() + self.metrics_interval
+        while True:
+            with self.lock:
+                if not self.subscribers:
+                    self.thread = None
+                    return
+            try:
+                state = self.collect()
+                now = self.clock()
+                if state != self.last_state:
+                    self.last_state = state
+                    self.publish(('status', self.snapshot(state)))
+                    next_metrics = now + self.metrics_interval
+                elif now >= next_metrics:
+                    if any(info.get('status') == 'running' for info in state.values()):
+                        self.publish(('metrics', self.snapshot(state)))
+                    next_metrics = now + self.metrics_interval
+            except Exception as e:
+                logging.error(f"检查脚本状态失败: {e}")
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import glob
+import gzip
+import hashlib
+import json
+import logging
+import os
+import queue
+import re
+import shutil
+import struct
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows下没有fcntl，只能保证进程内互斥
+    fcntl = None
+
+# 索引项：时间戳、日志行在文件中的偏移、商品ID哈希（0表示无）、日志级别
+INDEX_ENTRY = struct.Struct('<dQQB')
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+# 轮转后的文件名：<日志文件>.<时间>[-序号].gz
+BACKUP_PATTERN = re.compile(r'\.\d{8}-\d{6}(-\d+)?\.gz$')
+
+
+def sku_key(sku):
+    """商品ID的8字节哈希，写入索引用于按商品过滤"""
+    if sku is None:
+        return 0
+    return int.from_bytes(hashlib.blake2b(str(sku).encode('utf-8'), digest_size=8).digest(), 'big') or 1
+
+
+@contextmanager
+def file_lock(path, shared=False):
+    """跨进程的文件锁，shared为True时为共享锁"""
+    if fcntl is None:
+        yield
+        return
+    with open(path, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def parse_level(level):
+    """级别名称或数字转换为数字，无法识别时返回None"""
+    if level is None or level == '':
+        return None
+    if isinstance(level, int) or str(level).isdigit():
+        return int(level)
+    value = logging.getLevelName(str(level).upper())
+    return value if isinstance(value, int) else None
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出为一行JSON，通过 extra={'sku': 商品ID} 附带商品ID"""
+
+    def format(self, record):
+        entry = {'ts': round(record.created, 3), 'level': record.levelname, 'msg': record.getMessage()}
+        sku = getattr(record, 'sku', None)
+        if sku is not None:
+            entry['sku'] = str(sku)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def format_entry(entry):
+    """把一条JSON日志转换为与原来相同的文本格式"""
+    ts = entry.get('ts', 0)
+    text = (f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(ts))},{int(ts * 1000) % 1000:03d}"
+            f" - {entry.get('level', '')} - {entry.get('msg', '')}")
+    if entry.get('exc'):
+        text += '\n' + entry['exc']
+    return text
+
+
+def render_text(text):
+    """日志文本中的JSON行转换为可读文本，其他行（旧格式、脚本输出）保持不变"""
+    lines = []
+    for line in text.split('\n'):
+        if line.startswith('{'):
+            try:
+                line = format_entry(json.loads(line))
+            except (ValueError, AttributeError):
+                pass
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+class IndexedLogFile:
+    """JSON行日志文件及其偏移索引（<日志文件>.idx），按大小或时间轮转
+
+    多个进程可以写同一个文件：每批日志在文件锁内用一次追加写入，
+    写入前检查文件是否已被其他进程轮转。轮转后旧文件gzip压缩，
+    最多保留 backup_count 个，索引只覆盖当前文件。
+    """
+
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, rotate_interval=86400, backup_count=5, clock=time.time):
+        self.path = path
+        self.index_path = f"{path}.idx"
+        self.lock_path = f"{path}.lock"
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.backup_count = backup_count
+        self.clock = clock
+        self.fd = None
+        self.index_fd = None
+        self.inode = None
+        # 当前文件第一条日志的时间，用于按时间轮转
+        self.started = None
+        with file_lock(self.lock_path):
+            self.open()
+
+    def open(self):
+        flags = os.O_WRONLY | os.O_CREAT | os.O_APPEND
+        self.fd = os.open(self.path, flags, 0o644)
+        self.index_fd = os.open(self.index_path, flags, 0o644)
+        self.inode = os.fstat(self.fd).st_ino
+        self.started = read_first_timestamp(self.index_path)
+
+    def close(self):
+        for fd in (self.fd, self.index_fd):
+            if fd is not None:
+                os.close(fd)
+        self.fd = self.index_fd = None
+
+    def reopen_if_rotated(self):
+        """其他进程轮转了文件时重新打开"""
+        try:
+            inode = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            inode = None
+        if inode != self.inode:
+            self.close()
+            self.open()
+
+    def should_rotate(self, now):
+        if os.fstat(self.fd).st_size >= self.max_bytes:
+            return True
+        return self.started is not None and now - self.started >= self.rotate_interval
+
+    def rotate(self, now):
+        """重命名当前文件并压缩，删除多余的旧文件，需持有锁"""
+        self.close()
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(now))
+        backup = f"{self.path}.{stamp}"
+        suffix = 1
+        while os.path.exists(f"{backup}.gz"):
+            backup = f"{self.path}.{stamp}-{suffix}"
+            suffix += 1
+        os.replace(self.path, backup)
+        try:
+            os.remove(self.index_path)
+        except FileNotFoundError:
+            pass
+        self.open()
+
+        # 所有写入都在锁内并先检查文件是否被轮转，压缩时已没有进程写旧文件
+        with open(backup, 'rb') as src, gzip.open(f"{backup}.gz", 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(backup)
+        backups = sorted(p for p in glob.glob(f"{glob.escape(self.path)}.*.gz") if BACKUP_PATTERN.search(p))
+        for old in backups[:max(0, len(backups) - self.backup_count)]:
+            os.remove(old)
+
+    def write(self, entries):
+        """写入一批日志，entries为 [(时间戳, 级别, 商品ID, JSON文本)]"""
+        if not entries:
+            return
+        lines = [(created, levelno, sku, (line + '\n').encode('utf-8')) for created, levelno, sku, line in entries]
+        data = b''.join(item[3] for item in lines)
+        with file_lock(self.lock_path):
+            self.reopen_if_rotated()
+            now = self.clock()
+            if self.should_rotate(now):
+                self.rotate(now)
+            os.write(self.fd, data)
+            # O_APPEND写入后的位置即为本批日志的末尾
+            offset = os.lseek(self.fd, 0, os.SEEK_CUR) - len(data)
+            index = bytearray()
+            for created, levelno, sku, line in lines:
+                index += INDEX_ENTRY.pack(created, offset, sku_key(sku), min(levelno, 255))
+                offset += len(line)
+            os.write(self.index_fd, bytes(index))
+            if self.started is None:
+                self.started = lines[0][0]
+
+
+def read_first_timestamp(index_path):
+    try:
+        with open(index_path, 'rb') as f:
+            data = f.read(INDEX_ENTRY.size)
+    except FileNotFoundError:
+        return None
+    return INDEX_ENTRY.unpack(data)[0] if len(data) == INDEX_ENTRY.size else None
+
+
+class AsyncLogHandler(logging.Handler):
+    """日志先放入有界队列，由后台线程批量写入文件
+
+    调用方只负责格式化和入队，磁盘变慢时不会阻塞监控；
+    队列满时丢弃日志并记录丢弃的条数。
+    """
+
+    def __init__(self, logfile, max_queue=10000, batch_size=512):
+        super().__init__()
+        self.logfile = logfile
+        self.batch_size = batch_size
+        self.queue = queue.Queue(max_queue)
+        self.dropped = 0
+        self.thread = threading.Thread(target=self.worker, name='log-writer', daemon=True)
+        self.thread.start()
+
+    def emit(self, record):
+        try:
+            item = (record.created, record.levelno, getattr(record, 'sku', None), self.format(record))
+        except Exception:
+            self.handleError(record)
+            return
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+
+    def collect(self):
+        """取出一批日志，遇到停止标记时返回 (批次, True)"""
+        items = [self.queue.get()]
+        while items[-1] is not None and len(items) < self.batch_size:
+            try:
+                items.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        if items[-1] is None:
+            return items[:-1], True
+        return items, False
+
+    def worker(self):
+        while True:
+            items, stopping = self.collect()
+            if self.dropped:
+                dropped, self.dropped = self.dropped, 0
+                message = json.dumps({'ts': round(time.time(), 3), 'level': 'WARNING',
+                                      'msg': f"日志队列已满，丢弃了{dropped}条日志"}, ensure_ascii=False)
+                items.append((time.time(), logging.WARNING, None, message))
+            try:
+                self.logfile.write(items)
+            except Exception as e:
+                # 写入线程退出后所有日志都会丢失，任何错误都只报告不退出
+                sys.stderr.write(f"写入日志文件失败: {e}\n")
+            if stopping:
+                return
+
+    def close(self):
+        """写完队列中剩余的日志后关闭文件"""
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join(10)
+        self.logfile.close()
+        super().close()
+
+
+def setup_logging(path, level=logging.INFO, console=None, **file_options):
+    """根日志写入JSON行日志文件，终端运行时同时输出文本格式到终端
+
+    与 logging.basicConfig 一样，已配置过日志时不做修改。
+    """
+    root = logging.getLogger()
+    if root.handlers:
+        return None
+    root.setLevel(level)
+    handler = AsyncLogHandler(IndexedLogFile(path, **file_options))
+    handler.setFormatter(JsonFormatter())
+    root.addHandler(handler)
+    # 由监督进程运行时标准输出写入文件，不再重复输出一份
+    if console is None:
+        console = sys.stderr.isatty()
+    if console:
+        stream = logging.StreamHandler()
+        stream.setFormatter(logging.Formatter(TEXT_FORMAT))
+        root.addHandler(stream)
+    return handler
+
+
+def _search(index, count, ts):
+    """第一个时间戳不小于ts的索引项位置"""
+    lo, hi = 0, count
+    while lo < hi:
+        mid = (lo + hi) // 2
+        index.seek(mid * INDEX_ENTRY.size)
+        if INDEX_ENTRY.unpack(index.read(INDEX_ENTRY.size))[0] < ts:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def query_log(path, level=None, sku=None, start=None, end=None, limit=200, chunk=4096, slack=60.0):
+    """按级别（不低于）、商品ID和时间范围 [start, end) 查询日志，返回最新的limit条（按写入顺序）
+
+    先在索引中二分查找时间范围，再从后往前只比较定长的索引项，
+    最后按偏移读取命中的日志行，不需要逐行解析整个日志文件。
+    多个进程共用日志文件时各自的批次交错写入，时间戳只是大致有序，
+    因此查找范围向两侧各放宽 slack 秒，再逐条按时间过滤。
+    """
+    min_level = parse_level(level)
+    key = sku_key(sku) if sku else None
+    index_path = f"{path}.idx"
+    if not os.path.exists(index_path):
+        return []
+
+    # 持有共享锁，读取期间文件不会被轮转
+    with file_lock(f"{path}.lock", shared=True):
+        offsets = []
+        with open(index_path, 'rb') as index:
+            count = os.fstat(index.fileno()).st_size // INDEX_ENTRY.size
+            lo = _search(index, count, start - slack) if start is not None else 0
+            hi = _search(index, count, end + slack) if end is not None else count
+            while hi > lo and len(offsets) < limit:
+                first = max(lo, hi - chunk)
+                index.seek(first * INDEX_ENTRY.size)
+                entries = list(INDEX_ENTRY.iter_unpack(index.read((hi - first) * INDEX_ENTRY.size)))
+                for ts, offset, entry_sku, levelno in reversed(entries):
+                    if (start is not None and ts < start) or (end is not None and ts >= end):
+                        continue
+                    if min_level is not None and levelno < min_level:
+                        continue
+                    if key is not None and entry_sku != key:
+                        continue
+                    offsets.append(offset)
+                    if len(offsets) >= limit:
+                        break
+                hi = first
+
+        records = []
+        with open(path, 'rb') as f:
+            for offset in reversed(offsets):
+                f.seek(offset)
+                try:
+                    records.append(json.loads(f.readline()))
+                except ValueError:
+                    continue
+    return records
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from adaptive import AdaptivePolicy
+
+
+class TestAdaptivePolicy(unittest.TestCase):
+    def setUp(self):
+        self.now = 1_700_000_000.0
+        self.policy = AdaptivePolicy(60, 15, 600, clock=lambda: self.now)
+
+    def poll(self, stats, value, after):
+        self.now += after
+        return self.policy.observe(stats, value)
+
+    def test_stable_sku_backs_off_to_ceiling(self):
+        stats = self.policy.new_stats()
+        interval = self.poll(stats, (34, 99.0), 0)
+        self.assertEqual(interval, 15)
+
+        for _ in range(50):
+            interval = self.poll(stats, (34, 99.0), interval)
+        self.assertEqual(interval, 600)
+
+    def test_frequent_changes_keep_interval_short(self):
+        stats = self.policy.new_stats()
+        self.poll(stats, (34, 99.0), 0)
+        for i in range(10):
+            interval = self.poll(stats, (33 if i % 2 else 34, 99.0), 120)
+        self.assertLess(interval, 60)
+
+    def test_metrics_count_saved_requests_and_latency(self):
+        stats = self.policy.new_stats()
+        self.poll(stats, (34, 99.0), 0)
+        # 间隔600秒检查一次，固定60秒间隔需要10次请求
+        self.poll(stats, (34, 99.0), 600)
+        self.poll(stats, (33, 99.0), 600)
+
+        metrics = self.policy.metrics.summary()
+        self.assertEqual(metrics['polls'], 3)
+        self.assertEqual(metrics['fixed_polls'], 21)
+        self.assertEqual(metrics['saved'], 18)
+        self.assertEqual(metrics['changes'], 1)
+        self.assertEqual(metrics['max_latency'], 600)
+
+    def test_disabled_uses_fixed_interval(self):
+        policy = AdaptivePolicy(60, 15, 600, enabled=False, clock=lambda: self.now)
+        stats = policy.new_stats()
+        self.assertEqual(policy.observe(stats, (34, 99.0)), 60)
+
+
+if __name__ == '__main__':
+    unittest.main()
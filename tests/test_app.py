@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+import json
+import logging
+import tempfile
+import time
+from configparser import ConfigParser
+from unittest.mock import patch
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config_store import ConfigStore
+from price_history import PriceHistory
+from structured_log import IndexedLogFile
+from sharding import ShardRegistry
+from metrics import MetricsRegistry, MetricsExporter
+
+# app导入时在 RUN_DIR 下创建与监督进程通信的目录，测试中指向临时目录
+RUN_DIR = tempfile.TemporaryDirectory()
+with patch.dict(os.environ, {'RUN_DIR': RUN_DIR.name}):
+    import app
+
+
+class AppTestCase(unittest.TestCase):
+    """使用临时配置文件的测试客户端"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.config_file = os.path.join(self.tmpdir.name, 'config.ini')
+        config = ConfigParser()
+        config.read_dict(self.config_sections())
+        with open(self.config_file, 'w', encoding='utf-8') as f:
+            config.write(f)
+        patcher = patch.object(app, 'config_store', ConfigStore(self.config_file))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = app.app.test_client()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def config_sections(self):
+        return {}
+
+
+class TestHistoryApi(AppTestCase):
+    def config_sections(self):
+        self.history_dir = os.path.join(self.tmpdir.name, 'history')
+        return {'History': {'path': self.history_dir}}
+
+    def setUp(self):
+        super().setUp()
+        history = PriceHistory(self.history_dir)
+        for i in range(5):
+            history.append('1001', 1000 + i * 10, 33, 99.0 + i)
+        history.flush()
+
+    def test_range_and_limit(self):
+        data = self.client.get('/api/history/1001?start=1010&end=1030').get_json()
+        self.assertEqual(data['status'], 'success')
+        self.assertEqual([record['timestamp'] for record in data['data']], [1010, 1020, 1030])
+        # limit 返回最近的记录
+        data = self.client.get('/api/history/1001?limit=2').get_json()
+        self.assertEqual([record['price'] for record in data['data']], [102.0, 103.0])
+
+    def test_invalid_parameters_use_defaults(self):
+        data = self.client.get('/api/history/1001?limit=abc&start=yesterday').get_json()
+        self.assertEqual(data['status'], 'success')
+        self.assertEqual(len(data['data']), 5)
+
+    def test_missing_history(self):
+        # 没有记录的商品返回空列表
+        data = self.client.get('/api/history/9999').get_json()
+        self.assertEqual(data, {'status': 'success', 'data': []})
+        # 不足一条记录的文件（写入中途崩溃）同样返回空列表
+        open(os.path.join(self.history_dir, '1002.bin'), 'wb').close()
+        data = self.client.get('/api/history/1002').get_json()
+        self.assertEqual(data, {'status': 'success', 'data': []})
+        data = self.client.get('/api/history/abc').get_json()
+        self.assertEqual(data['status'], 'error')
+
+
+def read_events(response, count):
+    """读取SSE响应的前count个事件后关闭连接"""
+    events = []
+    chunks = iter(response.response)
+    try:
+        while len(events) < count:
+            chunk = next(chunks)
+            events.append(chunk.decode('utf-8') if isinstance(chunk, bytes) else chunk)
+    finally:
+        response.close()
+    return events
+
+
+def parse_event(text):
+    """SSE事件文本转换为 {字段: 值}"""
+    return dict(line.split(': ', 1) for line in text.strip().split('\n'))
+
+
+class TestStatusStream(AppTestCase):
+    def test_first_frame_is_full_status(self):
+        response = self.client.get('/api/status/stream', buffered=False)
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        self.assertEqual(response.headers['Cache-Control'], 'no-cache')
+        retry, first = read_events(response, 2)
+        self.assertEqual(retry, 'retry: 3000\n\n')
+        event = parse_event(first)
+        self.assertEqual(event['event'], 'status')
+        # 监督进程没有运行时所有脚本都是已停止
+        data = json.loads(event['data'])
+        self.assertEqual(sorted(data), sorted(app.SCRIPTS))
+        self.assertTrue(all(info['status'] == 'stopped' for info in data.values()))
+        # 断开连接后取消订阅
+        self.assertEqual(app.status_hub.subscribers, set())
+
+
+class TestLogStream(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.log_file = os.path.join(self.tmpdir.name, 'jd_monitor.log')
+        patcher = patch.dict(app.SCRIPTS['jd_monitor'], {'log_file': self.log_file})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write_log(self, *messages):
+        with open(self.log_file, 'a', encoding='utf-8') as f:
+            for msg in messages:
+                f.write(json.dumps({'ts': 1700000000.0, 'level': 'INFO', 'msg': msg}, ensure_ascii=False) + '\n')
+
+    def first_event(self, url, **kwargs):
+        response = self.client.get(url, buffered=False, **kwargs)
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        retry, first = read_events(response, 2)
+        self.assertEqual(retry, 'retry: 3000\n\n')
+        event = parse_event(first)
+        return event, json.loads(event['data'])
+
+    def test_first_frame_is_tail(self):
+        self.write_log('第一行', '第二行', '第三行')
+        event, data = self.first_event('/api/logs/jd_monitor/stream?lines=2')
+        self.assertEqual(event['event'], 'reset')
+        self.assertEqual(event['id'], data['cursor'])
+        # JSON行转换为文本后推送
+        self.assertNotIn('第一行', data['text'])
+        self.assertIn('第二行', data['text'])
+        self.assertIn('第三行', data['text'])
+        self.assertFalse(data['text'].lstrip().startswith('{'))
+
+        # lines无效时使用默认行数
+        _, data = self.first_event('/api/logs/jd_monitor/stream?lines=abc')
+        self.assertIn('第一行', data['text'])
+
+    def test_reconnect_sends_only_missing_lines(self):
+        self.write_log('第一行')
+        _, data = self.first_event('/api/logs/jd_monitor/stream')
+        # 等没有订阅者的读取线程退出，重连时由初始事件补齐断开期间的内容
+        follower = app.log_hub.follower(self.log_file)
+        deadline = time.time() + 5
+        while follower.thread is not None and time.time() < deadline:
+            time.sleep(0.01)
+        self.write_log('第二行')
+        event, data = self.first_event('/api/logs/jd_monitor/stream', headers={'Last-Event-ID': data['cursor']})
+        self.assertEqual(event['event'], 'append')
+        self.assertNotIn('第一行', data['text'])
+        self.assertIn('第二行', data['text'])
+
+    def test_empty_and_missing_file(self):
+        data = self.client.get('/api/logs/jd_monitor/stream').get_json()
+        self.assertEqual(data, {'status': 'error', 'message': '日志文件不存在'})
+        data = self.client.get('/api/logs/unknown/stream').get_json()
+        self.assertEqual(data['status'], 'error')
+
+        open(self.log_file, 'w').close()
+        event, data = self.first_event('/api/logs/jd_monitor/stream')
+        self.assertEqual(event['event'], 'reset')
+        self.assertEqual(data['text'], '')
+
+
+class TestLogQuery(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.log_file = os.path.join(self.tmpdir.name, 'jd_monitor.log')
+        patcher = patch.dict(app.SCRIPTS['jd_monitor'], {'log_file': self.log_file})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write_log(self, entries):
+        logfile = IndexedLogFile(self.log_file)
+        logfile.write([
+            (ts, level, sku, json.dumps({'ts': ts, 'level': logging.getLevelName(level), 'msg': msg, 'sku': sku},
+                                        ensure_ascii=False))
+            for ts, level, msg, sku in entries
+        ])
+        logfile.close()
+
+    def query(self, params=''):
+        return self.client.get(f'/api/logs/jd_monitor/query{params}').get_json()
+
+    def test_filters(self):
+        self.write_log([
+            (1000.0, logging.INFO, '开始监控', None),
+            (1001.0, logging.INFO, '商品100可购买', '100'),
+            (1002.0, logging.ERROR, '检查商品200出错', '200'),
+            (1003.0, logging.WARNING, '商品100熔断', '100'),
+        ])
+        data = self.query()
+        self.assertEqual(data['status'], 'success')
+        self.assertEqual(len(data['data']), 4)
+        self.assertEqual([r['msg'] for r in self.query('?level=warning')['data']], ['检查商品200出错', '商品100熔断'])
+        self.assertEqual([r['msg'] for r in self.query('?sku=100')['data']], ['商品100可购买', '商品100熔断'])
+        self.assertEqual([r['msg'] for r in self.query('?start=1001&end=1003')['data']],
+                         ['商品100可购买', '检查商品200出错'])
+        self.assertEqual([r['msg'] for r in self.query('?limit=1')['data']], ['商品100熔断'])
+
+    def test_invalid_parameters(self):
+        self.write_log([(1000.0 + i, logging.INFO, f'第{i}条', None) for i in range(3)])
+        data = self.query('?level=verbose')
+        self.assertEqual(data, {'status': 'error', 'message': '无效的日志级别: verbose'})
+        # 无法解析的数字参数使用默认值，limit至少为1
+        self.assertEqual(len(self.query('?limit=abc&start=yesterday')['data']), 3)
+        self.assertEqual(len(self.query('?limit=0')['data']), 1)
+        self.assertEqual(len(self.query('?limit=-5')['data']), 1)
+
+    def test_empty_and_missing_log(self):
+        self.assertEqual(self.query(), {'status': 'success', 'data': []})
+        self.write_log([])
+        self.assertEqual(self.query(), {'status': 'success', 'data': []})
+        self.assertEqual(self.client.get('/api/logs/unknown/query').get_json()['status'], 'error')
+
+
+class TestShardsApi(AppTestCase):
+    def config_sections(self):
+        self.shard_path = os.path.join(self.tmpdir.name, 'shards.db')
+        return {'Shard': {'path': self.shard_path}}
+
+    def test_missing_registry(self):
+        data = self.client.get('/api/shards').get_json()
+        self.assertEqual(data, {'status': 'success', 'data': {'epoch': 0, 'members': {}}})
+        # 查询不会创建分片数据库
+        self.assertFalse(os.path.exists(self.shard_path))
+
+    def test_members(self):
+        registry = ShardRegistry(self.shard_path)
+        try:
+            registry.join('jd_monitor-0', pid=123)
+            registry.heartbeat('jd_monitor-0', sku_count=7)
+        finally:
+            registry.close()
+        data = self.client.get('/api/shards').get_json()['data']
+        self.assertEqual(data['epoch'], 1)
+        member = data['members']['jd_monitor-0']
+        self.assertEqual((member['pid'], member['skus']), (123, 7))
+
+
+class TestMetricsApi(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.metrics_dir = os.path.join(self.tmpdir.name, 'metrics')
+        patcher = patch.object(app, 'METRICS_DIR', self.metrics_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def export(self, name, **counters):
+        registry = MetricsRegistry()
+        registry.describe('http_retries_total', 'counter', 'HTTP请求重试次数')
+        for host, value in counters.items():
+            registry.inc('http_retries_total', value, host=host)
+        exporter = MetricsExporter(registry, self.metrics_dir, name)
+        exporter.flush()
+        return exporter
+
+    def test_empty_directory(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain; version=0.0.4'))
+        self.assertEqual(response.get_data(as_text=True).strip(), '')
+
+    def test_merges_processes(self):
+        self.export('weather', api=1)
+        self.export('jd_monitor-0', p3=2)
+        stale = self.export('jd_monitor-1', p3=5)
+        # 超过5分钟没有更新的快照属于已退出的进程
+        os.utime(stale.path, (time.time() - 600, time.time() - 600))
+        with open(os.path.join(self.metrics_dir, 'broken.json'), 'w') as f:
+            f.write('{')
+
+        text = self.client.get('/metrics').get_data(as_text=True)
+        self.assertIn('# TYPE http_retries_total counter', text)
+        self.assertIn('http_retries_total{process="weather",host="api"} 1', text)
+        self.assertIn('http_retries_total{process="jd_monitor-0",host="p3"} 2', text)
+        self.assertNotIn('jd_monitor-1', text)
+        self.assertNotIn('broken', text)
+
+
+if __name__ == '__main__':
+    unittest.main()
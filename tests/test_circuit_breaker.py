@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+import json
+from unittest.mock import patch
+from configparser import ConfigParser
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from circuit_breaker import BreakerRegistry, CircuitBreaker, classify_response, decorrelated_jitter
+from http_pool import HTTPResult
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeRandom:
+    """uniform 总是返回上限，便于计算退避时间"""
+
+    def uniform(self, low, high):
+        return high
+
+
+class TestClassify(unittest.TestCase):
+    def test_status(self):
+        self.assertIsNone(classify_response(200, b'{"stockInfo": {}}'))
+        self.assertIsNone(classify_response(200, b'  [1, 2]'))
+        self.assertIsNone(classify_response(304, b''))
+        self.assertEqual(classify_response(403, b''), 'blocked')
+        self.assertEqual(classify_response(429, b''), 'blocked')
+        self.assertEqual(classify_response(404, b'{}'), 'http_4xx')
+        self.assertEqual(classify_response(502, b'<html>Bad Gateway</html>'), 'http_5xx')
+
+    def test_body(self):
+        captcha = '<html><title>京东验证</title><script src="//risk_handler.jd.com"></script></html>'
+        self.assertEqual(classify_response(200, captcha.encode('utf-8')), 'captcha')
+        self.assertEqual(classify_response(200, b'<!DOCTYPE html><html></html>'), 'json')
+        self.assertEqual(classify_response(200, b''), 'json')
+        self.assertEqual(classify_response(200, b'null'), 'json')
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker('p.3.cn', threshold=3, base_delay=10, max_delay=100,
+                                      clock=self.clock, rng=FakeRandom())
+
+    def test_decorrelated_jitter(self):
+        rng = FakeRandom()
+        self.assertEqual(decorrelated_jitter(0, 1, 30, rng), 3)
+        self.assertEqual(decorrelated_jitter(3, 1, 30, rng), 9)
+        self.assertEqual(decorrelated_jitter(27, 1, 30, rng), 30)
+        for _ in range(100):
+            self.assertTrue(1 <= decorrelated_jitter(5, 1, 30) <= 15)
+
+    def test_opens_after_consecutive_failures(self):
+        self.assertFalse(self.breaker.record_failure('network'))
+        self.assertFalse(self.breaker.record_failure('http_5xx'))
+        self.assertTrue(self.breaker.allow())
+        self.assertTrue(self.breaker.record_failure('json'))
+        self.assertEqual(self.breaker.state, 'open')
+        self.assertFalse(self.breaker.allow())
+        self.assertEqual(self.breaker.retry_after(), 30)
+
+    def test_success_resets_count(self):
+        self.breaker.record_failure('network')
+        self.breaker.record_failure('network')
+        self.breaker.record_success()
+        self.breaker.record_failure('network')
+        self.breaker.record_failure('network')
+        self.assertEqual(self.breaker.state, 'closed')
+
+    def test_blocked_opens_immediately(self):
+        self.assertTrue(self.breaker.record_failure('captcha'))
+        self.assertFalse(self.breaker.allow())
+        # 其他4xx与接口是否可用无关
+        breaker = CircuitBreaker('c0.3.cn', threshold=1, clock=self.clock)
+        self.assertFalse(breaker.record_failure('http_4xx'))
+        self.assertTrue(breaker.allow())
+
+    def test_half_open_single_probe(self):
+        self.breaker.record_failure('blocked')
+        self.clock.now += 30
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual(self.breaker.state, 'half_open')
+        # 探测请求没有结果前其他请求继续等待
+        self.assertFalse(self.breaker.allow())
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, 'closed')
+        self.assertTrue(self.breaker.allow())
+        self.assertTrue(self.breaker.allow())
+
+    def test_failed_probe_backs_off(self):
+        self.breaker.record_failure('captcha')
+        self.assertEqual(self.breaker.retry_after(), 30)
+        self.clock.now += 30
+        self.assertTrue(self.breaker.allow())
+        self.assertTrue(self.breaker.record_failure('network'))
+        self.assertEqual(self.breaker.retry_after(), 90)
+        self.clock.now += 90
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure('network')
+        self.assertEqual(self.breaker.retry_after(), 100)
+
+    def test_probe_with_client_error_closes(self):
+        self.breaker.record_failure('captcha')
+        self.clock.now += 30
+        self.assertTrue(self.breaker.allow())
+        # 探测的商品不存在不代表接口不可用，不能一直停在半开状态
+        self.assertFalse(self.breaker.record_failure('http_4xx'))
+        self.assertEqual(self.breaker.state, 'closed')
+        self.assertTrue(self.breaker.allow())
+        self.assertTrue(self.breaker.allow())
+
+    def test_stuck_probe_times_out(self):
+        self.breaker.record_failure('captcha')
+        self.clock.now += 30
+        self.assertTrue(self.breaker.allow())
+        self.clock.now += self.breaker.probe_timeout
+        self.assertTrue(self.breaker.allow())
+
+    def test_registry_shared_per_host(self):
+        registry = BreakerRegistry(threshold=1, clock=self.clock)
+        breaker = registry.get('https://item-soa.jd.com/getWareBusiness?skuId=1')
+        self.assertIs(registry.get('https://item-soa.jd.com/getWareBusiness?skuId=2'), breaker)
+        self.assertIs(registry.get('item-soa.jd.com'), breaker)
+        self.assertIsNot(registry.get('https://p.3.cn/prices/mgets'), breaker)
+        breaker.record_failure('network')
+        self.assertEqual(registry.states(), {
+            (('host', 'item-soa.jd.com'),): 2,
+            (('host', 'p.3.cn'),): 0,
+        })
+        registry.configure(threshold=4)
+        self.assertEqual(registry.get('p.3.cn').threshold, 4)
+        self.assertEqual(registry.get('c0.3.cn').threshold, 4)
+
+
+class TestLiteRetry(unittest.TestCase):
+    def setUp(self):
+        self.test_config = 'test_breaker_config.ini'
+        config = ConfigParser()
+        config['JD'] = {'product_url': 'https://item.jd.com/123456.html'}
+        config['Monitor'] = {'check_interval': '60', 'notify_minutes_before': '5', 'jitter': '0'}
+        config['WxPusher'] = {'token': 'test_token', 'uids': '["test_uid"]'}
+        with open(self.test_config, 'w', encoding='utf-8') as f:
+            config.write(f)
+        from jd_monitor_lite import JDMonitor
+        self.monitor = JDMonitor(config_file=self.test_config)
+
+    def tearDown(self):
+        if os.path.exists(self.test_config):
+            os.remove(self.test_config)
+
+    @patch('time.sleep')
+    @patch('http_pool.ConnectionPool.request')
+    def test_captcha_not_retried(self, mock_request, mock_sleep):
+        mock_request.return_value = HTTPResult(200, 'OK', {}, '<html>验证一下，购物无忧</html>'.encode('utf-8'))
+        url = 'https://item-soa.jd.com/getWareBusiness?skuId=123456'
+        self.assertIsNone(self.monitor.make_request(url))
+        self.assertEqual(mock_request.call_count, 1)
+        # 熔断期间不再发出请求
+        self.assertIsNone(self.monitor.make_request(url))
+        self.assertEqual(mock_request.call_count, 1)
+
+    @patch('time.sleep')
+    @patch('http_pool.ConnectionPool.request')
+    def test_network_error_retried_with_backoff(self, mock_request, mock_sleep):
+        mock_request.side_effect = [ConnectionResetError('reset'), HTTPResult(200, 'OK', {}, json.dumps({'ok': 1}).encode())]
+        self.assertEqual(self.monitor.make_request('https://item-soa.jd.com/getWareBusiness?skuId=1'), {'ok': 1})
+        self.assertEqual(mock_request.call_count, 2)
+        delay = mock_sleep.call_args_list[-1][0][0]
+        self.assertTrue(self.monitor.retry_base_delay <= delay <= self.monitor.retry_base_delay * 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
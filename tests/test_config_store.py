@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+import json
+import tempfile
+import threading
+from unittest.mock import patch
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config_store import ConfigStore
+
+
+class TestConfigStore(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'config.ini')
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write('[WxPusher]\ntoken = t\nuids = []\n\n[Monitor]\ncheck_interval = 60\n')
+        self.store = ConfigStore(self.path)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_reads_are_cached_until_file_changes(self):
+        with patch.object(self.store, '_read', wraps=self.store._read) as read:
+            for _ in range(10):
+                self.assertEqual(self.store.get('Monitor', 'check_interval'), '60')
+            self.assertEqual(read.call_count, 0)
+
+            with open(self.path, 'w', encoding='utf-8') as f:
+                f.write('[Monitor]\ncheck_interval = 30\n')
+            os.utime(self.path, ns=(0, 10 ** 9))
+            self.assertEqual(self.store.get('Monitor', 'check_interval'), '30')
+            self.assertEqual(read.call_count, 1)
+
+    def test_update_writes_atomically_and_refreshes_cache(self):
+        self.store.update({'Monitor': {'check_interval': 45}, 'Weather': {'push_time': '08:00'}})
+        self.assertEqual(self.store.get('Monitor', 'check_interval'), '45')
+
+        reloaded = ConfigStore(self.path).as_dict()
+        self.assertEqual(reloaded['Weather']['push_time'], '08:00')
+        self.assertEqual(reloaded['WxPusher']['token'], 't')
+        self.assertEqual([name for name in os.listdir(self.tmpdir.name) if name.endswith('.tmp')], [])
+
+    def test_concurrent_writers_do_not_lose_updates(self):
+        def add_uid(uid):
+            def apply(config):
+                uids = json.loads(config.get('WxPusher', 'uids'))
+                uids.append(uid)
+                config.set('WxPusher', 'uids', json.dumps(uids))
+            self.store.modify(apply)
+
+        threads = [threading.Thread(target=add_uid, args=(f'uid{i}',)) for i in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(json.loads(self.store.get('WxPusher', 'uids'))), 20)
+
+    def test_as_dict_returns_copy(self):
+        data = self.store.as_dict()
+        data['Monitor']['check_interval'] = '1'
+        self.assertEqual(self.store.get('Monitor', 'check_interval'), '60')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+import tempfile
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config_watcher import ConfigWatcher
+
+
+class TestConfigWatcher(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'config.ini')
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write('[Monitor]\ncheck_interval = 60\n')
+        self.watcher = ConfigWatcher(self.path)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_unchanged(self):
+        self.assertFalse(self.watcher.changed())
+
+    def test_detects_rewrite_once(self):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write('[Monitor]\ncheck_interval = 30\n')
+        os.utime(self.path, ns=(0, 10 ** 9))
+        self.assertTrue(self.watcher.changed())
+        self.assertFalse(self.watcher.changed())
+
+    def test_detects_atomic_replace_and_delete(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write('[Monitor]\ncheck_interval = 60\n')
+        os.replace(tmp_path, self.path)
+        self.assertTrue(self.watcher.changed())
+
+        os.remove(self.path)
+        self.assertTrue(self.watcher.changed())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+import json
+import threading
+import urllib.request
+from unittest.mock import patch
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from jd_api import BatchFetcher, WareBusinessReader, extract_fields, parse_ware_business
+
+# 模拟的商品数据：sku -> (库存状态, 价格)
+PRODUCTS = {
+    '1001': (33, '99.00'),
+    '1002': (34, '199.00'),
+    '1003': (40, '-1.00'),
+}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """模拟京东库存、价格和商品详情接口"""
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        query = parse_qs(parsed.query)
+        self.server.paths.append(parsed.path)
+
+        if parsed.path == '/stocks':
+            skus = query['skuIds'][0].split(',')
+            body = {sku: {'StockState': PRODUCTS[sku][0]} for sku in skus if sku in PRODUCTS}
+        elif parsed.path == '/prices/mgets':
+            skus = [sku.replace('J_', '') for sku in query['skuIds'][0].split(',')]
+            body = [{'id': f'J_{sku}', 'p': PRODUCTS[sku][1]} for sku in skus if sku in PRODUCTS]
+        elif parsed.path == '/getWareBusiness':
+            sku = query['skuId'][0]
+            stock_state, price = PRODUCTS.get(sku, (34, '-1.00'))
+            body = {
+                'stockInfo': {'stockState': stock_state},
+                'wareInfo': {'wname': f'商品{sku}'},
+                'price': {'p': price},
+            }
+        else:
+            self.send_response(404)
+            self.end_headers()
+            return
+
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestBatchFetcher(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        self.server.paths = []
+        self.base = f'http://127.0.0.1:{self.server.server_address[1]}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.executor = ThreadPoolExecutor(max_workers=4)
+        self.fetcher = BatchFetcher(
+            self.fetch_json, self.fetch_single, self.executor, batch_size=2,
+            stock_api=self.base + '/stocks?type=getstocks&skuIds={skus}&area={area}',
+            price_api=self.base + '/prices/mgets?skuIds={skus}',
+        )
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.executor.shutdown()
+
+    def fetch_json(self, url):
+        with urllib.request.urlopen(url, timeout=5) as response:
+            return json.loads(response.read().decode('utf-8'))
+
+    def fetch_single(self, sku):
+        return parse_ware_business(self.fetch_json(f'{self.base}/getWareBusiness?skuId={sku}'))
+
+    def test_first_round_uses_single_requests(self):
+        # 首次查询需要获取商品名称，全部走单个请求
+        results = self.fetcher.fetch_all(list(PRODUCTS))
+        self.assertEqual(self.server.paths.count('/getWareBusiness'), 3)
+        self.assertTrue(results['1001'].is_available)
+        self.assertEqual(results['1002'].product_name, '商品1002')
+
+    def test_following_rounds_are_batched(self):
+        self.fetcher.fetch_all(list(PRODUCTS))
+        self.server.paths.clear()
+
+        results = self.fetcher.fetch_all(list(PRODUCTS))
+        # 3个商品按每批2个分为2批，每批一个库存请求和一个价格请求
+        self.assertNotIn('/getWareBusiness', self.server.paths)
+        self.assertEqual(self.server.paths.count('/stocks'), 2)
+        self.assertEqual(self.server.paths.count('/prices/mgets'), 2)
+
+        self.assertTrue(results['1001'].is_available)
+        self.assertFalse(results['1002'].is_available)
+        self.assertEqual(results['1001'].price, 99.0)
+        self.assertIsNone(results['1003'].price)
+        self.assertEqual(results['1003'].product_name, '商品1003')
+
+    def test_missing_sku_falls_back_to_single(self):
+        self.fetcher.fetch_all(['1001', '9999'])
+        self.server.paths.clear()
+
+        results = self.fetcher.fetch_all(['1001', '9999'])
+        # 批量接口没有返回9999，回退为单个请求
+        self.assertEqual(self.server.paths.count('/getWareBusiness'), 1)
+        self.assertFalse(results['9999'].is_available)
+
+    def test_presale_sku_uses_single_request(self):
+        with patch.dict(PRODUCTS, {'1004': (36, '59.00')}):
+            self.fetcher.fetch_all(['1001', '1004'])
+            self.server.paths.clear()
+
+            # 预售商品的预约信息只有单个请求能拿到
+            results = self.fetcher.fetch_all(['1001', '1004'])
+            self.assertEqual(self.server.paths.count('/getWareBusiness'), 1)
+            self.assertEqual(results['1004'].stock_state, 36)
+
+    def test_batched_sku_refreshed_periodically(self):
+        self.fetcher.refresh_every = 2
+        self.fetcher.fetch_all(['1001'])
+        counts = []
+        for _ in range(6):
+            self.server.paths.clear()
+            self.fetcher.fetch_all(['1001'])
+            counts.append(self.server.paths.count('/getWareBusiness'))
+        # 每批量查询2次后单独查询一次，发现之后公布的开售时间
+        self.assertEqual(counts, [0, 0, 1, 0, 0, 1])
+
+    def test_forget(self):
+        self.fetcher.fetch_all(['1001', '1002'])
+        self.fetcher.forget('1001')
+        self.assertEqual(list(self.fetcher.names), ['1002'])
+        self.server.paths.clear()
+        # 重新加入监控后按新商品处理，先走单个请求获取名称
+        self.fetcher.fetch_all(['1001'])
+        self.assertEqual(self.server.paths.count('/getWareBusiness'), 1)
+
+
+
+WARE_BUSINESS = {
+    'promotion': {'activity': [{'text': '满199减20', 'items': list(range(20))} for _ in range(10)]},
+    'wareInfo': {'wname': '测试商品'},
+    'stockInfo': {'stockState': 33},
+    'price': {'p': '99.00'},
+    'yuyueInfo': {'startTime': 1700000000000},
+}
+
+
+class FakeResponse:
+    def __init__(self, status_code, content=b'', headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+
+class TestExtractFields(unittest.TestCase):
+    def test_matches_full_parse(self):
+        body = json.dumps(WARE_BUSINESS, ensure_ascii=False, indent=1).encode('utf-8')
+        self.assertEqual(parse_ware_business(extract_fields(body)), parse_ware_business(json.loads(body)))
+
+    def test_nested_field_with_same_name(self):
+        # 促销中嵌套的同名字段不能被当作商品价格
+        data = dict(WARE_BUSINESS, promotion={'gift': {'price': {'p': '1.00'}}})
+        status = parse_ware_business(extract_fields(json.dumps(data).encode('utf-8')))
+        self.assertEqual(status.price, 99.0)
+
+    def test_missing_fields(self):
+        self.assertEqual(extract_fields(b'{"code": 0}'), {})
+        self.assertEqual(extract_fields(b'{"stockInfo": {"stockState": 34}}'), {'stockInfo': {'stockState': 34}})
+
+    def test_invalid_json(self):
+        with self.assertRaises(ValueError):
+            extract_fields('<html>验证码</html>'.encode('utf-8'))
+        with self.assertRaises(ValueError):
+            extract_fields(b'[1, 2]')
+
+
+class TestWareBusinessReader(unittest.TestCase):
+    def setUp(self):
+        self.responses = []
+        self.requests = []
+        self.reader = WareBusinessReader(self.get)
+
+    def get(self, url, headers):
+        self.requests.append((url, headers))
+        return self.responses.pop(0)
+
+    def test_not_modified_reuses_status(self):
+        body = json.dumps(WARE_BUSINESS).encode('utf-8')
+        self.responses = [FakeResponse(200, body, {'ETag': '"v1"'}), FakeResponse(304)]
+        first = self.reader.fetch('1001')
+        second = self.reader.fetch('1001')
+        self.assertIs(first, second)
+        self.assertIsNone(self.requests[0][1])
+        self.assertEqual(self.requests[1][1], {'If-None-Match': '"v1"'})
+
+    def test_unchanged_body_skips_parsing(self):
+        body = json.dumps(WARE_BUSINESS).encode('utf-8')
+        changed = json.dumps(dict(WARE_BUSINESS, price={'p': '89.00'})).encode('utf-8')
+        self.responses = [FakeResponse(200, body), FakeResponse(200, body), FakeResponse(200, changed)]
+        first = self.reader.fetch('1001')
+        self.assertIs(self.reader.fetch('1001'), first)
+        self.assertEqual(self.reader.fetch('1001').price, 89.0)
+
+    def test_forget(self):
+        body = json.dumps(WARE_BUSINESS).encode('utf-8')
+        self.responses = [FakeResponse(200, body, {'ETag': '"v1"'}), FakeResponse(200, body)]
+        self.reader.fetch('1001')
+        self.reader.forget('1001')
+        self.reader.fetch('1001')
+        self.assertIsNone(self.requests[1][1])
+
+
+if __name__ == '__main__':
+    unittest.main()
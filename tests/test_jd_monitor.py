@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+import json
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from configparser import ConfigParser
+from unittest.mock import Mock
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from jd_monitor import JDMonitor
+from jd_api import ProductStatus, EMPTY_STATUS
+from scheduler import Scheduler
+from adaptive import AdaptivePolicy
+from sku_store import SkuStore
+from price_history import PriceHistory
+from rules import RuleEngine, Rule
+from config_watcher import ConfigWatcher
+from notifier import NotificationDispatcher
+from sharding import ShardRegistry, ShardMember
+
+
+class StubFetcher:
+    """按商品返回预设状态，记录每轮请求的商品"""
+
+    def __init__(self, statuses):
+        self.statuses = statuses
+        self.calls = []
+
+    def fetch_all(self, skus):
+        self.calls.append(list(skus))
+        return {sku: self.statuses.get(sku, EMPTY_STATUS) for sku in skus}
+
+    def forget(self, sku):
+        pass
+
+
+class TestMultiSkuMonitor(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.config_file = os.path.join(self.tmpdir.name, 'config.ini')
+        self.write_config(['1001', '1002', '1003'])
+        self.monitor = JDMonitor(config_file=self.config_file)
+        self.prepare(self.monitor)
+
+    def tearDown(self):
+        self.monitor.store.close()
+        self.monitor.cycle_executor.shutdown(wait=True)
+        self.monitor.executor.shutdown(wait=True)
+        self.tmpdir.cleanup()
+
+    def write_config(self, skus, sections=None, **monitor):
+        config = ConfigParser()
+        config['JD'] = {
+            'product_urls': json.dumps([f'https://item.jd.com/{sku}.html' for sku in skus]),
+            'url_cache': os.path.join(self.tmpdir.name, 'url_cache.json'),
+        }
+        config['Monitor'] = {'check_interval': '60', 'notify_minutes_before': '5', **monitor}
+        config['WxPusher'] = {'token': 'test_token', 'uids': '["test_uid"]'}
+        config.read_dict(sections or {})
+        with open(self.config_file, 'w', encoding='utf-8') as f:
+            config.write(f)
+
+    def prepare(self, monitor):
+        """准备 run() 中创建的组件，不启动调度线程"""
+        monitor.scheduler = Scheduler()
+        monitor.cycle_executor = ThreadPoolExecutor(max_workers=1)
+        monitor.cycle_running = False
+        monitor.burst_futures = {}
+        monitor.reload_running = False
+        monitor.executor = ThreadPoolExecutor(max_workers=2)
+        monitor.fetcher = StubFetcher({})
+        monitor.rules_watcher = ConfigWatcher(os.path.join(self.tmpdir.name, 'rules.json'))
+        monitor.cycle_interval = monitor.check_interval
+        monitor.policy = AdaptivePolicy(monitor.check_interval, monitor.min_interval, monitor.max_interval, False)
+        for state in monitor.skus.values():
+            state.stats = monitor.policy.new_stats()
+        monitor.store = SkuStore(os.path.join(self.tmpdir.name, 'state.db'))
+        monitor.history = PriceHistory(os.path.join(self.tmpdir.name, 'history'))
+        monitor.rules = RuleEngine()
+        monitor.dispatcher = Mock()
+
+    def run_cycle(self, statuses):
+        """用预设状态执行一轮常规检查"""
+        self.monitor.fetcher = StubFetcher(statuses)
+        self.monitor.start_cycle()
+        # 等待检查线程完成，再在当前线程处理结果
+        self.monitor.cycle_executor.shutdown(wait=True)
+        self.monitor.cycle_executor = ThreadPoolExecutor(max_workers=1)
+        self.monitor.scheduler.run_pending()
+        return self.monitor.fetcher
+
+    def notified_keys(self):
+        return [call.kwargs['key'] for call in self.monitor.dispatcher.notify.call_args_list]
+
+    def test_state_per_sku(self):
+        self.assertEqual(list(self.monitor.skus), ['1001', '1002', '1003'])
+        self.assertEqual(self.monitor.skus['1002'].url, 'https://item.jd.com/1002.html')
+        self.assertEqual(self.monitor.product_id, '1001')
+
+    def test_cycle_updates_each_sku(self):
+        fetcher = self.run_cycle({
+            '1001': ProductStatus(True, '商品A', None, 99.0, 33),
+            '1002': ProductStatus(False, '商品B', None, 199.0, 34),
+        })
+        self.assertEqual(fetcher.calls, [['1001', '1002', '1003']])
+
+        a, b, c = (self.monitor.skus[sku] for sku in ('1001', '1002', '1003'))
+        self.assertTrue(a.last_status)
+        self.assertEqual((a.product_name, a.price, a.stock_state), ('商品A', 99.0, 33))
+        self.assertFalse(b.last_status)
+        self.assertEqual((b.product_name, b.price), ('商品B', 199.0))
+        # 检查失败的商品保留原有状态
+        self.assertIsNone(c.product_name)
+        self.assertIsNone(c.last_success)
+
+    def test_notification_per_sku(self):
+        self.run_cycle({
+            '1001': ProductStatus(True, '商品A', None, 99.0, 33),
+            '1002': ProductStatus(False, '商品B', None, 199.0, 34),
+        })
+        self.assertEqual(self.notified_keys(), ['1001:available'])
+        _, _, uids, url = self.monitor.dispatcher.notify.call_args.args
+        self.assertEqual(url, 'https://item.jd.com/1001.html')
+
+        # 状态没有变化不重复通知；另一个商品上架后单独通知
+        for state in self.monitor.skus.values():
+            state.next_check = 0
+        self.run_cycle({
+            '1001': ProductStatus(True, '商品A', None, 99.0, 33),
+            '1002': ProductStatus(True, '商品B', None, 199.0, 33),
+        })
+        self.assertEqual(self.notified_keys(), ['1001:available', '1002:available'])
+
+    def test_restock_after_sellout_notifies_again(self):
+        # 默认不合并通知，上架通知不在队列中等待
+        self.assertEqual(self.monitor.coalesce_window, 0)
+        self.monitor.dispatcher = NotificationDispatcher(Mock(), queue_file=None)
+        # 去重有效期内售罄后再次补货仍然通知，状态没有变化时不重复通知
+        for available in (True, True, False, True):
+            for state in self.monitor.skus.values():
+                state.next_check = 0
+            self.run_cycle({'1001': ProductStatus(available, '商品A', None, 99.0, 33 if available else 34)})
+        self.assertEqual(self.monitor.dispatcher.pending_count(), 2)
+
+    def test_added_and_removed_skus(self):
+        state = self.monitor.skus['1001']
+        self.monitor.scheduler.schedule(9e9, lambda: None, key=('burst', '1003'))
+
+        self.write_config(['1001', '1004'])
+        self.monitor.load_config()
+        self.assertEqual(self.monitor.added_skus, ['1004'])
+        self.assertEqual(sorted(self.monitor.removed_skus), ['1002', '1003'])
+        # 保留的商品沿用原有状态
+        self.assertIs(self.monitor.skus['1001'], state)
+
+        self.monitor.store.update('1002', product_name='商品B', last_status=1)
+        self.monitor.store.update('1004', product_name='商品D', price=9.9)
+        self.monitor.store.flush()
+        with self.assertLogs(level='INFO') as logs:
+            self.monitor.apply_sku_changes()
+        # 只统计本次恢复的商品，不是数据库中的全部记录
+        self.assertIn('恢复1个商品的状态', '\n'.join(logs.output))
+        self.assertIsNotNone(self.monitor.skus['1004'].stats)
+        # 新增的商品恢复保存的状态，删除的商品同时删除记录
+        self.assertEqual(self.monitor.skus['1004'].product_name, '商品D')
+        self.assertEqual(list(self.monitor.store.load_all()), ['1004'])
+        self.assertFalse(self.monitor.scheduler.is_scheduled(('burst', '1003')))
+
+        fetcher = self.run_cycle({'1004': ProductStatus(True, '商品D', None, 9.9, 33)})
+        self.assertEqual(fetcher.calls, [['1001', '1004']])
+        self.assertEqual(self.notified_keys(), ['1004:available'])
+
+    def test_result_for_removed_sku_ignored(self):
+        state = self.monitor.skus['1002']
+        self.write_config(['1001'])
+        self.monitor.load_config()
+        self.monitor.apply_sku_changes()
+
+        # 移除前已经提交的检查返回后不再写入记录，也不发送通知
+        self.monitor.handle_status(state, ProductStatus(True, '商品B', None, 199.0, 33))
+        self.monitor.store.flush()
+        self.monitor.history.flush()
+        self.assertEqual(self.monitor.store.load_all(), {})
+        self.assertEqual(self.notified_keys(), [])
+        self.assertFalse(os.listdir(os.path.join(self.tmpdir.name, 'history')))
+
+    def run_reload(self):
+        """执行一次配置重新加载，等待后台读取完成后应用"""
+        self.monitor.reload_config()
+        self.monitor.executor.shutdown(wait=True)
+        self.monitor.executor = ThreadPoolExecutor(max_workers=2)
+        self.monitor.scheduler.run_pending()
+
+    def test_reload_is_all_or_nothing(self):
+        # 配置有误时一项都不修改
+        self.write_config(['1001', '1004'], requests_per_second='3', check_interval='abc')
+        self.run_reload()
+        self.assertEqual(self.monitor.check_interval, 60)
+        self.assertEqual(self.monitor.requests_per_second, 2.0)
+        self.assertEqual(list(self.monitor.skus), ['1001', '1002', '1003'])
+        self.assertFalse(self.monitor.reload_running)
+
+        self.write_config(['1001', '1004'], requests_per_second='3', check_interval='30')
+        self.run_reload()
+        self.assertEqual(self.monitor.check_interval, 30)
+        self.assertEqual(self.monitor.rate_limiter.rate, 3.0)
+        self.assertEqual(list(self.monitor.skus), ['1001', '1004'])
+        self.assertEqual(self.monitor.removed_skus, ['1002', '1003'])
+
+    def test_rate_split_across_shards(self):
+        self.assertEqual(self.monitor.shard_rate(), (2.0, 5.0))
+        registry = ShardRegistry(os.path.join(self.tmpdir.name, 'shards.db'))
+        try:
+            self.monitor.shard_workers = 2
+            self.monitor.shard = ShardMember(registry, 'jd-0')
+            self.monitor.shard.join()
+            # 其他分片还没有加入时也按配置的分片数分配配额
+            self.assertEqual(self.monitor.shard_rate(), (1.0, 2.5))
+            for worker_id in ('jd-1', 'jd-2', 'jd-3'):
+                registry.join(worker_id)
+            self.monitor.shard.sync()
+            self.assertEqual(self.monitor.shard_rate(), (0.5, 1.25))
+            self.monitor.requests_per_second, self.monitor.burst = 2.0, 2
+            self.assertEqual(self.monitor.shard_rate(), (0.5, 1.0))
+        finally:
+            registry.close()
+
+    def test_reload_switches_storage_paths(self):
+        self.run_cycle({'1001': ProductStatus(True, '商品A', None, 99.0, 33)})
+        store_path = os.path.join(self.tmpdir.name, 'new.db')
+        history_path = os.path.join(self.tmpdir.name, 'new_history')
+        self.write_config(['1001', '1002', '1003'], {'Store': {'path': store_path},
+                                                     'History': {'path': history_path}})
+        self.run_reload()
+
+        # 修改路径后改用新的数据库和历史目录，已有状态写入新数据库
+        self.assertEqual(self.monitor.store.path, store_path)
+        self.assertEqual(self.monitor.history.directory, history_path)
+        self.monitor.store.flush()
+        self.assertEqual(self.monitor.store.load_all()['1001']['product_name'], '商品A')
+        for state in self.monitor.skus.values():
+            state.next_check = 0
+        self.run_cycle({'1001': ProductStatus(True, '商品A', None, 89.0, 33)})
+        self.monitor.history.flush()
+        self.assertEqual([record['price'] for record in self.monitor.history.query('1001')], [89.0])
+
+    def test_failed_price_keeps_last_price(self):
+        self.monitor.rules = RuleEngine([Rule.from_dict('cheap', {'sku': '1001', 'type': 'price_below', 'value': 100})])
+        stats = self.monitor.skus['1001'].stats
+        for price in (99.0, None, 99.0):
+            for state in self.monitor.skus.values():
+                state.next_check = 0
+            self.run_cycle({'1001': ProductStatus(False, '商品A', None, price, 34)})
+            self.assertEqual(self.monitor.skus['1001'].price, 99.0)
+        # 价格批量查询失败不算价格变化，恢复后不重复触发低价规则
+        self.assertEqual(self.notified_keys(), ['1001:rule:cheap'])
+        self.assertEqual(stats.value, (34, 99.0))
+
+    def test_burst_poll_skips_while_pending(self):
+        state = self.monitor.skus['1001']
+        state.burst_until = time.time() + 60
+        release = threading.Event()
+        calls = []
+
+        def check(product_id):
+            calls.append(product_id)
+            release.wait(5)
+            return ProductStatus(True, '商品A', None, 99.0, 33)
+
+        self.monitor.check_product_status = check
+        self.monitor.executor = ThreadPoolExecutor(max_workers=4)
+        try:
+            # 上一次检查没有返回时不再提交新的检查
+            for _ in range(3):
+                self.monitor.burst_poll(state)
+                time.sleep(0.01)
+            self.assertEqual(len(calls), 1)
+            self.assertTrue(self.monitor.scheduler.is_scheduled(('burst', '1001')))
+
+            release.set()
+            self.monitor.burst_futures['1001'].result()
+            self.monitor.burst_poll(state)
+            self.monitor.burst_futures['1001'].result()
+            self.assertEqual(len(calls), 2)
+        finally:
+            release.set()
+            self.monitor.executor.shutdown(wait=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
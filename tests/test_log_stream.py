@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+import json
+import tempfile
+import time
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from log_stream import LogHub, stream_events
+
+
+class TestLogStream(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'test.log')
+        self.write(''.join(f"line{i}\n" for i in range(10)))
+        self.hub = LogHub(poll_interval=0.01)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write(self, text, mode='w'):
+        with open(self.path, mode, encoding='utf-8') as f:
+            f.write(text)
+
+    def test_fan_out_to_all_subscribers(self):
+        first, initial = self.hub.subscribe(self.path, lines=2)
+        second, _ = self.hub.subscribe(self.path, lines=2)
+        self.assertEqual(initial[:2], ('reset', "line8\nline9\n"))
+
+        self.write("new\n", mode='a')
+        for subscription in (first, second):
+            self.assertEqual(subscription.get(timeout=2)[:2], ('append', "new\n"))
+
+        # 两个订阅共用一个读取线程
+        self.assertIs(first.source, second.source)
+        first.close()
+        second.close()
+
+    def wait_stopped(self, follower):
+        for _ in range(200):
+            if follower.thread is None:
+                return
+            time.sleep(0.01)
+
+    def test_reader_stops_without_subscribers(self):
+        subscription, _ = self.hub.subscribe(self.path)
+        subscription.close()
+        self.wait_stopped(subscription.source)
+        self.assertIsNone(subscription.source.thread)
+
+    def test_reconnect_with_cursor_only_sends_missing_lines(self):
+        subscription, initial = self.hub.subscribe(self.path, lines=1)
+        cursor = initial[2]
+        subscription.close()
+        self.wait_stopped(subscription.source)
+
+        self.write("missed\n", mode='a')
+        subscription, initial = self.hub.subscribe(self.path, lines=1, last_cursor=cursor)
+        self.assertEqual(initial[:2], ('append', "missed\n"))
+        subscription.close()
+
+    def test_rotation_sends_reset(self):
+        subscription, _ = self.hub.subscribe(self.path)
+        os.rename(self.path, self.path + '.1')
+        self.write("rotated\n")
+        self.assertEqual(subscription.get(timeout=2)[:2], ('reset', "rotated\n"))
+        subscription.close()
+
+    def test_stream_events_format_and_overflow(self):
+        subscription, initial = self.hub.subscribe(self.path, lines=1)
+        events = stream_events(subscription, initial, heartbeat=0.01)
+        self.assertEqual(next(events), "retry: 3000\n\n")
+
+        message = next(events)
+        self.assertIn(f"id: {initial[2]}\nevent: reset\n", message)
+        self.assertEqual(json.loads(message.split('data: ', 1)[1])['text'], "line9\n")
+        self.assertEqual(next(events), ": keepalive\n\n")
+
+        subscription.overflowed = True
+        self.assertTrue(next(events).startswith("event: overflow"))
+        with self.assertRaises(StopIteration):
+            next(events)
+        self.assertNotIn(subscription, subscription.source.subscribers)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+import tempfile
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from log_tail import tail_lines, read_since
+
+
+class TestLogTail(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'test.log')
+        self.write(''.join(f"第{i}行 INFO 测试日志\n" for i in range(1000)))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write(self, text, mode='w'):
+        with open(self.path, mode, encoding='utf-8') as f:
+            f.write(text)
+
+    def test_tail_returns_last_lines(self):
+        # 块大小小于一行时也要正确拼接
+        for block_size in (7, 64, 8192):
+            text, _ = tail_lines(self.path, 3, block_size=block_size)
+            self.assertEqual(text, "第997行 INFO 测试日志\n第998行 INFO 测试日志\n第999行 INFO 测试日志\n")
+
+    def test_tail_more_lines_than_file(self):
+        self.write("a\nb\n")
+        self.assertEqual(tail_lines(self.path, 10)[0], "a\nb\n")
+
+    def test_tail_skips_partial_last_line(self):
+        self.write("半行", mode='a')
+        text, cursor = tail_lines(self.path, 1)
+        self.assertEqual(text, "第999行 INFO 测试日志\n")
+
+        self.write("写完\n", mode='a')
+        text, _, reset = read_since(self.path, cursor)
+        self.assertEqual((text, reset), ("半行写完\n", False))
+
+    def test_read_since_returns_only_new_lines(self):
+        _, cursor = tail_lines(self.path, 5)
+        text, same_cursor, reset = read_since(self.path, cursor)
+        self.assertEqual((text, same_cursor, reset), ('', cursor, False))
+
+        self.write("新的一行\n", mode='a')
+        text, cursor, reset = read_since(self.path, cursor)
+        self.assertEqual((text, reset), ("新的一行\n", False))
+
+    def test_read_since_limits_bytes(self):
+        _, cursor = tail_lines(self.path, 1)
+        self.write("abc\n" * 10, mode='a')
+        text, cursor, _ = read_since(self.path, cursor, max_bytes=10)
+        self.assertEqual(text, "abc\nabc\n")
+        text, cursor, _ = read_since(self.path, cursor, max_bytes=1000)
+        self.assertEqual(text, "abc\n" * 8)
+
+    def test_rotation_and_truncation_restart_from_tail(self):
+        _, cursor = tail_lines(self.path, 1)
+
+        # 轮转：旧文件改名，新建同名文件
+        os.rename(self.path, self.path + '.1')
+        self.write("轮转后\n")
+        text, cursor, reset = read_since(self.path, cursor)
+        self.assertEqual((text, reset), ("轮转后\n", True))
+
+        # 截断：文件变得比游标短
+        self.write("x\n" * 5, mode='a')
+        _, cursor = tail_lines(self.path, 1)
+        with open(self.path, 'w') as f:
+            f.write("y\n")
+        text, _, reset = read_since(self.path, cursor)
+        self.assertEqual((text, reset), ("y\n", True))
+
+    def test_invalid_cursor_falls_back_to_tail(self):
+        text, _, reset = read_since(self.path, 'bad', lines=1)
+        self.assertEqual((text, reset), ("第999行 INFO 测试日志\n", True))
+
+
+if __name__ == '__main__':
+    unittest.main()
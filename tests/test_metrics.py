@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+import tempfile
+import threading
+import json
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from metrics import MetricsRegistry, MetricsExporter, render, load_snapshots
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = MetricsRegistry()
+
+    def test_counters_summed_across_threads(self):
+        def work():
+            for _ in range(1000):
+                self.registry.inc('requests_total', host='a')
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.registry.inc('requests_total', 5, host='b')
+
+        counters = {tuple(map(tuple, labels)): value
+                    for name, labels, value in self.registry.snapshot()['counters']}
+        self.assertEqual(counters[(('host', 'a'),)], 4000)
+        self.assertEqual(counters[(('host', 'b'),)], 5)
+
+    def test_histogram_buckets(self):
+        self.registry.describe('latency', 'histogram', '耗时', buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            self.registry.observe('latency', value)
+
+        [(name, labels, cell)] = self.registry.snapshot()['histograms']
+        # 分桶上界包含等于边界的值，最后一个分桶为 +Inf
+        self.assertEqual(cell[:3], [2, 1, 1])
+        self.assertAlmostEqual(cell[-2], 3.65)
+        self.assertEqual(cell[-1], 4)
+
+    def test_gauge_callbacks(self):
+        self.registry.gauge_callback('queue_depth', lambda: 3)
+        self.registry.gauge_callback('age', lambda: {(('sku', '1'),): 12.5})
+        self.registry.gauge_callback('broken', lambda: 1 / 0)
+
+        gauges = {(name, tuple(map(tuple, labels))): value
+                  for name, labels, value in self.registry.snapshot()['gauges']}
+        self.assertEqual(gauges, {('queue_depth', ()): 3, ('age', (('sku', '1'),)): 12.5})
+
+
+class TestRender(unittest.TestCase):
+    def test_render_merges_processes(self):
+        first = MetricsRegistry()
+        first.describe('requests_total', 'counter', '请求次数')
+        first.describe('latency', 'histogram', '耗时', buckets=(1.0,))
+        first.inc('requests_total', host='a')
+        first.observe('latency', 0.5)
+        second = MetricsRegistry()
+        second.inc('requests_total', 2, host='a')
+        second.set_gauge('depth', 7)
+
+        # 经过JSON序列化，与从快照文件读取的结果一致
+        snapshots = json.loads(json.dumps({'jd_monitor-0': first.snapshot(), 'jd_monitor-1': second.snapshot()}))
+        text = render(snapshots)
+
+        self.assertEqual(text.count('# TYPE requests_total counter'), 1)
+        self.assertIn('requests_total{process="jd_monitor-0",host="a"} 1', text)
+        self.assertIn('requests_total{process="jd_monitor-1",host="a"} 2', text)
+        self.assertIn('latency_bucket{process="jd_monitor-0",le="1.0"} 1', text)
+        self.assertIn('latency_bucket{process="jd_monitor-0",le="+Inf"} 1', text)
+        self.assertIn('latency_count{process="jd_monitor-0"} 1', text)
+        self.assertIn('# TYPE depth gauge', text)
+        self.assertIn('depth{process="jd_monitor-1"} 7', text)
+
+    def test_label_escaping(self):
+        registry = MetricsRegistry()
+        registry.inc('errors_total', reason='a"b\\c')
+        text = render({'weather': registry.snapshot()})
+        self.assertIn('errors_total{process="weather",reason="a\\"b\\\\c"} 1', text)
+
+
+class TestMetricsExporter(unittest.TestCase):
+    def test_flush_and_load(self):
+        registry = MetricsRegistry()
+        registry.inc('requests_total')
+        with tempfile.TemporaryDirectory() as tmp:
+            exporter = MetricsExporter(registry, tmp, 'weather', interval=60)
+            exporter.flush()
+            snapshots = load_snapshots(tmp)
+            self.assertEqual(list(snapshots), ['weather'])
+            self.assertEqual(snapshots['weather']['counters'], [['requests_total', [], 1]])
+
+            # 长时间没有更新的快照视为进程已退出
+            os.utime(exporter.path, (0, 0))
+            self.assertEqual(load_snapshots(tmp), {})
+
+            # 正常停止时删除快照
+            exporter.start()
+            exporter.stop()
+            self.assertFalse(os.path.exists(exporter.path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+import tempfile
+import threading
+import time
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from notifier import DedupCache, NotificationDispatcher
+
+
+class TestNotificationDispatcher(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.queue_file = os.path.join(self.tmpdir.name, 'queue.json')
+        self.sent = []
+        self.fail = False
+        self.release = threading.Event()
+        self.release.set()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def send(self, notification):
+        self.release.wait(5)
+        if self.fail:
+            return False
+        self.sent.append(notification)
+        return True
+
+    def wait_for(self, condition, timeout=5):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if condition():
+                return True
+            time.sleep(0.01)
+        return False
+
+    def test_notify_does_not_block_on_send(self):
+        self.release.clear()
+        dispatcher = NotificationDispatcher(self.send, self.queue_file)
+        dispatcher.start()
+
+        started = time.time()
+        dispatcher.notify('标题', '内容', ['uid1'])
+        self.assertLess(time.time() - started, 0.1)
+
+        self.release.set()
+        self.assertTrue(self.wait_for(lambda: len(self.sent) == 1))
+        dispatcher.stop()
+
+    def test_coalesces_per_uid_set(self):
+        dispatcher = NotificationDispatcher(self.send, self.queue_file)
+        for i in range(3):
+            dispatcher.notify(f'标题{i}', f'内容{i}', ['uid1'], f'https://item.jd.com/{i}.html')
+        dispatcher.notify('其他', '内容', ['uid2'])
+        dispatcher.start()
+
+        self.assertTrue(self.wait_for(lambda: len(self.sent) == 2))
+        dispatcher.stop()
+        merged = next(n for n in self.sent if n.uids == ('uid1',))
+        self.assertIn('3条', merged.title)
+        self.assertIn('内容2', merged.content)
+        self.assertIsNone(merged.url)
+
+    def test_failed_messages_retry_and_persist(self):
+        self.fail = True
+        dispatcher = NotificationDispatcher(self.send, self.queue_file, base_delay=0.05)
+        dispatcher.start()
+        dispatcher.notify('标题', '内容', ['uid1'])
+
+        self.assertTrue(self.wait_for(lambda: os.path.exists(self.queue_file)))
+        dispatcher.stop()
+
+        # 重启后继续发送，发送成功后删除持久化文件
+        self.fail = False
+        dispatcher = NotificationDispatcher(self.send, self.queue_file, base_delay=0.05)
+        dispatcher.start()
+        self.assertTrue(self.wait_for(lambda: len(self.sent) == 1))
+        self.assertTrue(self.wait_for(lambda: not os.path.exists(self.queue_file)))
+        dispatcher.stop()
+        self.assertEqual(self.sent[0].title, '标题')
+
+    def test_queued_messages_persisted_before_send(self):
+        self.release.clear()
+        dispatcher = NotificationDispatcher(self.send, self.queue_file, coalesce_window=5)
+        dispatcher.start()
+        dispatcher.notify('标题1', '内容', ['uid1'])
+        dispatcher.notify('标题2', '内容', ['uid1'])
+
+        # 合并窗口内进程被杀死，重启后仍能发送
+        restarted = NotificationDispatcher(self.send, self.queue_file)
+        self.assertTrue(self.wait_for(lambda: len(restarted.load()) == 2))
+        self.assertEqual([item.title for item in restarted.load()], ['标题1', '标题2'])
+
+        self.release.set()
+        dispatcher.stop()
+        self.assertFalse(os.path.exists(self.queue_file))
+
+    def test_duplicate_events_are_dropped(self):
+        dispatcher = NotificationDispatcher(self.send, self.queue_file)
+        self.assertTrue(dispatcher.notify('上架', '内容', ['uid1'], key='1001:available'))
+        self.assertFalse(dispatcher.notify('上架', '内容', ['uid1'], key='1001:available'))
+        # 不同接收人或不同事件不算重复
+        self.assertTrue(dispatcher.notify('上架', '内容', ['uid2'], key='1001:available'))
+        self.assertTrue(dispatcher.notify('上架', '内容', ['uid1'], key='1002:available'))
+        self.assertEqual(dispatcher.pending_count(), 3)
+
+        # 清除去重记录后同一事件可以再次通知
+        dispatcher.reset('1001:available', ['uid1'])
+        self.assertTrue(dispatcher.notify('上架', '内容', ['uid1'], key='1001:available'))
+        self.assertFalse(dispatcher.notify('上架', '内容', ['uid2'], key='1001:available'))
+
+    def test_burst_within_window_becomes_one_digest(self):
+        dispatcher = NotificationDispatcher(self.send, self.queue_file, coalesce_window=0.2)
+        dispatcher.start()
+        for i in range(5):
+            dispatcher.notify(f'标题{i}', f'内容{i}', ['uid1'])
+            time.sleep(0.02)
+
+        self.assertTrue(self.wait_for(lambda: len(self.sent) >= 1))
+        time.sleep(0.3)
+        dispatcher.stop()
+        self.assertEqual(len(self.sent), 1)
+        self.assertIn('5条', self.sent[0].title)
+
+
+class TestDedupCache(unittest.TestCase):
+    def test_ttl_and_lru_bound(self):
+        now = [0.0]
+        cache = DedupCache(max_size=2, ttl=10, clock=lambda: now[0])
+        self.assertFalse(cache.seen('a'))
+        self.assertTrue(cache.seen('a'))
+
+        now[0] = 11
+        self.assertFalse(cache.seen('a'))
+
+        cache.seen('b')
+        cache.seen('c')
+        self.assertEqual(len(cache.entries), 2)
+        self.assertFalse(cache.seen('a'))
+
+
+if __name__ == '__main__':
+    unittest.main()
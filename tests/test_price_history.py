@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+import tempfile
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from price_history import PriceHistory, RECORD
+
+
+class TestPriceHistory(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.history = PriceHistory(self.tmpdir.name)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_fixed_width_records(self):
+        for i in range(5):
+            self.history.append('1001', 1000 + i, 34, 99.5)
+        self.assertEqual(self.history.flush(), 5)
+        self.assertEqual(os.path.getsize(self.history.path_for('1001')), 5 * RECORD.size)
+
+    def test_query_range(self):
+        for i in range(100):
+            self.history.append('1001', 1000 + i * 10, 33 if i % 2 else 34, 100 + i)
+        self.history.append('1001', 2000, 34, None)
+        self.history.flush()
+
+        records = self.history.query('1001', start=1050, end=1090)
+        self.assertEqual([r['timestamp'] for r in records], [1050, 1060, 1070, 1080, 1090])
+        self.assertEqual(records[0]['price'], 105)
+
+        latest = self.history.query('1001', limit=2)
+        self.assertEqual([r['timestamp'] for r in latest], [1990, 2000])
+        self.assertIsNone(latest[-1]['price'])
+
+    def test_missing_and_invalid_sku(self):
+        self.assertEqual(self.history.query('2002'), [])
+        with self.assertRaises(ValueError):
+            self.history.query('../config')
+
+    def test_compact_keeps_changes_and_bucket_last(self):
+        # 前两小时每分钟一条，价格在第30分钟变化一次
+        for minute in range(120):
+            price = 99.0 if minute < 30 else 89.0
+            self.history.append('1001', minute * 60, 34, price)
+        self.history.append('1001', 7200, 33, 89.0)
+        self.history.flush()
+
+        removed = self.history.compact('1001', before=7200, bucket=3600)
+        records = self.history.query('1001')
+        self.assertEqual(removed, 121 - len(records))
+        self.assertEqual(
+            [(r['timestamp'], r['price']) for r in records],
+            [(0, 99.0), (1800, 89.0), (3540, 89.0), (7140, 89.0), (7200, 89.0)]
+        )
+
+    def test_compact_only_given_skus(self):
+        for sku in ('1001', '1002'):
+            for minute in range(120):
+                self.history.append(sku, minute * 60, 34, 99.0)
+        self.history.flush()
+
+        # 其他分片负责的商品不处理
+        removed = self.history.compact_all(before=7200, bucket=3600, product_ids=['1001'])
+        self.assertEqual(removed, 117)
+        self.assertEqual(len(self.history.query('1001')), 3)
+        self.assertEqual(len(self.history.query('1002')), 120)
+        self.assertEqual(sorted(os.listdir(self.history.directory)), ['.lock', '1001.bin', '1002.bin'])
+
+
+if __name__ == '__main__':
+    unittest.main()
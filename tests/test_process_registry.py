@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+import tempfile
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from process_registry import ProcessRegistry
+
+
+class TestProcessRegistry(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        # pid -> 启动时间
+        self.processes = {100: 1000.0}
+        self.registry = ProcessRegistry(self.tmpdir.name, self.processes.get)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_record_and_get(self):
+        self.assertIsNone(self.registry.get('weather'))
+        self.registry.record('weather', 100)
+        self.assertEqual(self.registry.get('weather'), 100)
+
+        # 其他工作进程通过同一目录看到相同状态
+        other = ProcessRegistry(self.tmpdir.name, self.processes.get)
+        self.assertEqual(other.get('weather'), 100)
+
+        self.registry.remove('weather')
+        self.assertIsNone(other.get('weather'))
+        self.registry.remove('weather')
+
+    def test_exited_process(self):
+        self.registry.record('weather', 100)
+        del self.processes[100]
+        self.assertIsNone(self.registry.get('weather'))
+
+    def test_reused_pid(self):
+        self.registry.record('weather', 100)
+        # 同一个pid被新的进程使用
+        self.processes[100] = 5000.0
+        self.assertIsNone(self.registry.get('weather'))
+
+    def test_corrupt_pid_file(self):
+        with open(self.registry.pid_path('weather'), 'w') as f:
+            f.write('not json')
+        with self.assertLogs(level='ERROR'):
+            self.assertIsNone(self.registry.get('weather'))
+
+
+if __name__ == '__main__':
+    unittest.main()
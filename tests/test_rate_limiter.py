@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rate_limiter import RateLimiter
+
+
+class FakeClock:
+    """可手动推进的时钟"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestRateLimiter(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.limiter = RateLimiter(rate=2.0, burst=2, jitter=0, clock=self.clock, sleep=lambda s: None)
+
+    def test_burst_passes_without_wait(self):
+        self.assertEqual(self.limiter.acquire('https://item-soa.jd.com/a'), 0)
+        self.assertEqual(self.limiter.acquire('https://item-soa.jd.com/b'), 0)
+
+    def test_requests_queue_behind_each_other(self):
+        url = 'https://item-soa.jd.com/getWareBusiness'
+        self.limiter.acquire(url)
+        self.limiter.acquire(url)
+        # 令牌用完后按速率依次排队
+        self.assertAlmostEqual(self.limiter.acquire(url), 0.5)
+        self.assertAlmostEqual(self.limiter.acquire(url), 1.0)
+
+        # 时间推进后令牌恢复
+        self.clock.now = 10.0
+        self.assertEqual(self.limiter.acquire(url), 0)
+
+    def test_hosts_are_limited_separately(self):
+        for _ in range(2):
+            self.limiter.acquire('https://item-soa.jd.com/x')
+        self.assertGreater(self.limiter.acquire('https://item-soa.jd.com/x'), 0)
+        self.assertEqual(self.limiter.acquire('https://p.3.cn/prices/mgets'), 0)
+
+    def test_jitter_only_added_when_waiting(self):
+        limiter = RateLimiter(rate=1.0, burst=1, jitter=0.3, clock=self.clock, sleep=lambda s: None)
+        self.assertEqual(limiter.acquire('https://c0.3.cn/stocks'), 0)
+        wait = limiter.acquire('https://c0.3.cn/stocks')
+        self.assertGreaterEqual(wait, 1.0)
+        self.assertLessEqual(wait, 1.3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+import json
+import tempfile
+from datetime import datetime, timedelta
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from jd_api import ProductStatus
+from rules import Rule, RuleEngine, PRICE_BELOW, PRICE_DROP, STOCK_CHANGE, START_WINDOW
+
+
+def status(price=None, stock_state=34, start_time=None):
+    return ProductStatus(stock_state in (33, 40), '测试商品', start_time, price, stock_state)
+
+
+class TestRuleEngine(unittest.TestCase):
+    def test_price_below_fires_on_crossing_only(self):
+        engine = RuleEngine([Rule(1, '1001', PRICE_BELOW, 100)])
+        self.assertEqual(len(engine.evaluate('1001', status(price=99.0), 34, 120.0)), 1)
+        # 已经低于目标价时不重复提醒
+        self.assertEqual(engine.evaluate('1001', status(price=98.0), 34, 99.0), [])
+
+    def test_price_drop_percent(self):
+        engine = RuleEngine([Rule(1, '1001', PRICE_DROP, 10)])
+        self.assertEqual(engine.evaluate('1001', status(price=95.0), 34, 100.0), [])
+        fired = engine.evaluate('1001', status(price=80.0), 34, 100.0)
+        self.assertIn('降幅20.0%', fired[0][2])
+
+    def test_stock_transition_filters(self):
+        engine = RuleEngine([Rule(1, '*', STOCK_CHANGE, from_state=34, to_state=33)])
+        self.assertEqual(len(engine.evaluate('1001', status(stock_state=33), 34, None)), 1)
+        self.assertEqual(engine.evaluate('1001', status(stock_state=36), 34, None), [])
+        self.assertEqual(engine.evaluate('1001', status(stock_state=33), 33, None), [])
+
+    def test_start_window_fires_once(self):
+        now = datetime(2025, 1, 1, 10, 0)
+        engine = RuleEngine([Rule(1, '1001', START_WINDOW, 10)])
+        start = now + timedelta(minutes=5)
+        self.assertEqual(len(engine.evaluate('1001', status(start_time=start), 34, None, now)), 1)
+        self.assertEqual(engine.evaluate('1001', status(start_time=start), 34, None, now), [])
+
+    def test_only_indexed_skus_are_evaluated(self):
+        engine = RuleEngine(Rule(i, str(i), PRICE_BELOW, 100) for i in range(10000))
+        self.assertEqual(engine.count, 10000)
+        self.assertEqual(engine.evaluate('20000', status(price=1.0), 34, 200.0), [])
+        self.assertEqual(len(engine.evaluate('42', status(price=1.0), 34, 200.0)), 1)
+
+    def test_load_skips_invalid_rules(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False, encoding='utf-8') as f:
+            json.dump([{'sku': '1001', 'type': 'price_below', 'value': 100}, {'sku': '1001', 'type': 'bogus'}], f)
+        try:
+            engine = RuleEngine.load(f.name)
+        finally:
+            os.remove(f.name)
+        self.assertEqual(engine.count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+import threading
+import time
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scheduler import Scheduler
+
+
+class TestScheduler(unittest.TestCase):
+    def setUp(self):
+        self.now = 100.0
+        self.scheduler = Scheduler(clock=lambda: self.now)
+        self.calls = []
+
+    def test_runs_due_tasks_in_time_order(self):
+        self.scheduler.schedule(105, self.calls.append, 'b')
+        self.scheduler.schedule(101, self.calls.append, 'a')
+        self.scheduler.schedule(200, self.calls.append, 'c')
+
+        self.now = 110
+        self.assertEqual(self.scheduler.run_pending(), 2)
+        self.assertEqual(self.calls, ['a', 'b'])
+
+    def test_same_key_keeps_latest(self):
+        self.scheduler.schedule(101, self.calls.append, 'old', key='remind')
+        self.scheduler.schedule(150, self.calls.append, 'new', key='remind')
+
+        self.now = 120
+        self.scheduler.run_pending()
+        self.assertEqual(self.calls, [])
+
+        self.now = 150
+        self.scheduler.run_pending()
+        self.assertEqual(self.calls, ['new'])
+        self.assertFalse(self.scheduler.is_scheduled('remind'))
+
+    def test_cancel(self):
+        self.scheduler.schedule(101, self.calls.append, 'x', key='burst')
+        self.scheduler.cancel('burst')
+        self.now = 200
+        self.scheduler.run_pending()
+        self.assertEqual(self.calls, [])
+
+    def test_run_wakes_at_due_time(self):
+        scheduler = Scheduler()
+        fired = []
+        due = time.time() + 0.05
+        scheduler.schedule(due, lambda: (fired.append(time.time()), scheduler.stop()))
+
+        thread = threading.Thread(target=scheduler.run)
+        thread.start()
+        thread.join(2)
+
+        self.assertEqual(len(fired), 1)
+        self.assertLess(abs(fired[0] - due), 0.05)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+import tempfile
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sharding import HashRing, ShardRegistry, ShardMember
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestHashRing(unittest.TestCase):
+    def setUp(self):
+        self.skus = [str(100000000 + i * 7919) for i in range(10000)]
+
+    def test_balanced_assignment(self):
+        ring = HashRing([f"jd_monitor-{i}" for i in range(4)])
+        counts = {}
+        for sku in self.skus:
+            node = ring.node_for(sku)
+            counts[node] = counts.get(node, 0) + 1
+        self.assertEqual(len(counts), 4)
+        # 每个节点负责的商品数偏离平均值不超过40%
+        for count in counts.values():
+            self.assertLess(abs(count - 2500), 1000)
+
+    def test_adding_node_moves_only_its_share(self):
+        ring = HashRing([f"jd_monitor-{i}" for i in range(4)])
+        before = {sku: ring.node_for(sku) for sku in self.skus}
+        ring.add('jd_monitor-4')
+        after = {sku: ring.node_for(sku) for sku in self.skus}
+
+        moved = [sku for sku in self.skus if before[sku] != after[sku]]
+        # 只有分给新节点的商品换了节点，约占1/5
+        self.assertTrue(all(after[sku] == 'jd_monitor-4' for sku in moved))
+        self.assertLess(len(moved), len(self.skus) * 0.3)
+
+        ring.remove('jd_monitor-4')
+        self.assertEqual({sku: ring.node_for(sku) for sku in self.skus}, before)
+
+    def test_empty_ring(self):
+        self.assertIsNone(HashRing().node_for('1001'))
+
+
+class TestShardRegistry(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'shards.db')
+        self.clock = FakeClock()
+        self.registry = ShardRegistry(self.path, clock=self.clock)
+
+    def tearDown(self):
+        self.registry.close()
+        self.tmpdir.cleanup()
+
+    def test_membership_changes_bump_epoch(self):
+        epoch, members = self.registry.members()
+        self.assertEqual(members, [])
+
+        self.registry.join('a')
+        self.registry.join('b')
+        epoch_after_join, members = self.registry.members()
+        self.assertEqual(members, ['a', 'b'])
+        self.assertGreater(epoch_after_join, epoch)
+
+        # 心跳不改变成员
+        self.registry.heartbeat('a', sku_count=10)
+        self.assertEqual(self.registry.members()[0], epoch_after_join)
+        self.assertEqual(self.registry.status()['a']['skus'], 10)
+
+        self.registry.leave('b')
+        self.assertEqual(self.registry.members(), (epoch_after_join + 1, ['a']))
+
+    def test_prune_stale_members(self):
+        self.registry.join('a')
+        self.registry.join('b')
+        self.clock.now += 30
+        self.registry.heartbeat('a')
+        with self.assertLogs(level='WARNING'):
+            self.assertEqual(self.registry.prune(ttl=20), ['b'])
+        self.assertEqual(self.registry.members()[1], ['a'])
+        self.assertEqual(self.registry.prune(ttl=20), [])
+
+        # 被移除的成员恢复心跳后重新加入
+        self.registry.heartbeat('b')
+        self.assertEqual(self.registry.members()[1], ['a', 'b'])
+
+    def test_members_rebalance(self):
+        skus = [str(1000 + i) for i in range(200)]
+        first = ShardMember(self.registry, 'jd_monitor-0')
+        first.join()
+        self.assertTrue(all(first.owns(sku) for sku in skus))
+
+        second = ShardMember(ShardRegistry(self.path, clock=self.clock), 'jd_monitor-1')
+        second.join()
+        self.assertTrue(first.sync())
+        self.assertFalse(first.sync())
+
+        # 每个商品恰好由一个分片负责
+        for sku in skus:
+            self.assertNotEqual(first.owns(sku), second.owns(sku))
+        self.assertTrue(any(second.owns(sku) for sku in skus))
+
+        second.leave()
+        self.assertTrue(first.sync())
+        self.assertTrue(all(first.owns(sku) for sku in skus))
+        second.registry.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
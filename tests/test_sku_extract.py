@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sku_extract import extract_sku, extract_skus, is_short_link, iter_skus
+
+
+class TestSkuExtract(unittest.TestCase):
+    def test_url_variants(self):
+        cases = {
+            'https://item.jd.com/100012043978.html': '100012043978',
+            'https://item.m.jd.com/product/100012043978.html?sid=x': '100012043978',
+            'https://item.jd.com/product/100012043978.html': '100012043978',
+            'https://re.jd.com/product/123.html': '123',
+            'https://so.m.jd.com/ware/search.action?wareId=456': '456',
+            'https://x.jd.com/page?from=a&skuId=789': '789',
+            'https://3.cn/2eg-GYHr': None,
+        }
+        for url, sku in cases.items():
+            self.assertEqual(extract_sku(url), sku, url)
+
+    def test_short_link(self):
+        self.assertTrue(is_short_link('https://3.cn/2eg-GYHr'))
+        self.assertFalse(is_short_link('https://item.jd.com/1.html'))
+
+    def test_share_text_stream(self):
+        lines = [
+            '【京东】好物推荐 https://item.jd.com/1001.html，快来看看',
+            'url\thttps://item.m.jd.com/product/1002.html\t备注',
+            '打开链接 https://3.cn/abc-DEF 查看',
+            '没有链接的行',
+        ]
+        self.assertEqual(list(iter_skus(lines)), [
+            ('https://item.jd.com/1001.html', '1001'),
+            ('https://item.m.jd.com/product/1002.html', '1002'),
+            ('https://3.cn/abc-DEF', None),
+        ])
+
+    def test_extract_skus_dedups_and_resolves(self):
+        class Resolver:
+            def resolve_all(self, urls):
+                return {url: '1003' for url in urls}
+
+        lines = ['https://item.jd.com/1001.html', 'https://item.jd.com/1001.html', 'https://3.cn/x']
+        self.assertEqual(extract_skus(lines), ['1001'])
+        self.assertEqual(extract_skus(lines, Resolver()), ['1001', '1003'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+import tempfile
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sku_store import SkuStore
+
+
+class TestSkuStore(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'state.db')
+        self.store = SkuStore(self.path)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmpdir.cleanup()
+
+    def test_updates_are_merged_until_flush(self):
+        self.store.update('1001', last_status=0, price=99.0)
+        self.store.update('1001', last_status=1)
+        self.assertEqual(self.store.load_all(), {})
+
+        self.assertEqual(self.store.flush(), 1)
+        row = self.store.load_all()['1001']
+        self.assertEqual(row['last_status'], 1)
+        self.assertEqual(row['price'], 99.0)
+
+    def test_state_survives_reopen(self):
+        self.store.update('1001', product_name='测试商品', last_status=1, notification_sent=1, start_time=1700000000.0)
+        self.store.close()
+
+        self.store = SkuStore(self.path)
+        row = self.store.load_all()['1001']
+        self.assertEqual(row['product_name'], '测试商品')
+        self.assertEqual(row['notification_sent'], 1)
+        self.assertEqual(row['start_time'], 1700000000.0)
+
+    def test_partial_update_keeps_other_fields(self):
+        self.store.update('1001', price=99.0, stock_state=34)
+        self.store.flush()
+        self.store.update('1001', stock_state=33)
+        self.store.flush()
+
+        row = self.store.load_all()['1001']
+        self.assertEqual(row['price'], 99.0)
+        self.assertEqual(row['stock_state'], 33)
+
+    def test_unknown_field_rejected(self):
+        with self.assertRaises(ValueError):
+            self.store.update('1001', foo=1)
+
+    def test_delete(self):
+        self.store.update('1001', last_status=1)
+        self.store.update('1002', last_status=1)
+        self.store.flush()
+        self.store.delete(['1001'])
+        self.assertEqual(list(self.store.load_all()), ['1002'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+import json
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from status_stream import StatusHub, format_status_event
+
+
+class TestStatusHub(unittest.TestCase):
+    def setUp(self):
+        self.state = {'weather': {'status': 'stopped', 'pid': None}}
+        self.hub = StatusHub(self.collect, self.sample, interval=0.01, metrics_interval=3600)
+
+    def collect(self):
+        return {script_id: dict(info) for script_id, info in self.state.items()}
+
+    def sample(self, pid):
+        if pid == 404:
+            raise ProcessLookupError(pid)
+        return {'uptime': 5, 'rss': 1024, 'cpu': 1.5}
+
+    def test_snapshot_adds_metrics_for_running_processes(self):
+        self.state['jd_monitor'] = {'status': 'running', 'pid': 123}
+        self.state['gone'] = {'status': 'running', 'pid': 404}
+        data = self.hub.snapshot()
+        self.assertEqual(data['jd_monitor'], {'status': 'running', 'pid': 123, 'uptime': 5, 'rss': 1024, 'cpu': 1.5})
+        self.assertEqual(data['weather'], {'status': 'stopped', 'pid': None})
+        self.assertEqual(data['gone'], {'status': 'running', 'pid': 404})
+
+    def test_pushes_only_on_change(self):
+        subscription, initial = self.hub.subscribe()
+        self.assertEqual(initial, ('status', {'weather': {'status': 'stopped', 'pid': None}}))
+
+        # 状态不变时不推送
+        self.assertIsNone(subscription.get(timeout=0.1))
+
+        self.state['weather'] = {'status': 'running', 'pid': 123}
+        self.hub.refresh()
+        kind, data = subscription.get(timeout=2)
+        self.assertEqual(kind, 'status')
+        self.assertEqual(data['weather']['pid'], 123)
+        self.assertIsNone(subscription.get(timeout=0.1))
+        subscription.close()
+
+    def test_periodic_metrics_while_running(self):
+        self.state['weather'] = {'status': 'running', 'pid': 123}
+        self.hub.metrics_interval = 0.05
+        subscription, _ = self.hub.subscribe()
+        kind, data = subscription.get(timeout=2)
+        self.assertEqual(kind, 'metrics')
+        self.assertEqual(data['weather']['rss'], 1024)
+        subscription.close()
+
+    def test_format_status_event(self):
+        text = format_status_event(('status', {'weather': {'status': 'stopped'}}))
+        self.assertTrue(text.startswith("event: status\ndata: "))
+        self.assertTrue(text.endswith("\n\n"))
+        self.assertEqual(json.loads(text[len("event: status\ndata: "):]), {'weather': {'status': 'stopped'}})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+import tempfile
+import logging
+import gzip
+import glob
+import json
+import time
+from unittest.mock import patch
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from structured_log import (IndexedLogFile, AsyncLogHandler, JsonFormatter, query_log, render_text,
+                            parse_level)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def entry(ts, level, msg, sku=None):
+    data = {'ts': ts, 'level': logging.getLevelName(level), 'msg': msg}
+    if sku:
+        data['sku'] = sku
+    return ts, level, sku, json.dumps(data, ensure_ascii=False)
+
+
+class TestIndexedLogFile(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'jd_monitor.log')
+        self.clock = FakeClock()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_query_by_level_sku_and_time(self):
+        logfile = IndexedLogFile(self.path, clock=self.clock)
+        logfile.write([
+            entry(1000.0, logging.INFO, '开始监控'),
+            entry(1001.0, logging.INFO, '商品: A - 可购买', '100'),
+            entry(1002.0, logging.ERROR, '检查商品200状态时出错', '200'),
+            entry(1003.0, logging.WARNING, '上一轮检查尚未完成'),
+        ])
+        logfile.write([entry(1004.0, logging.ERROR, '检查商品100状态时出错', '100')])
+        logfile.close()
+
+        self.assertEqual([r['msg'] for r in query_log(self.path, sku='100')],
+                         ['商品: A - 可购买', '检查商品100状态时出错'])
+        self.assertEqual([r['ts'] for r in query_log(self.path, level='warning')], [1002.0, 1003.0, 1004.0])
+        self.assertEqual([r['ts'] for r in query_log(self.path, start=1001.0, end=1003.0)], [1001.0, 1002.0])
+        # 只返回最新的limit条
+        self.assertEqual([r['ts'] for r in query_log(self.path, limit=2)], [1003.0, 1004.0])
+        self.assertEqual([r['ts'] for r in query_log(self.path, limit=2, chunk=1)], [1003.0, 1004.0])
+        self.assertEqual(query_log(self.path, sku='300'), [])
+
+    def test_time_range_with_interleaved_writers(self):
+        # 两个进程的批次交错写入，时间戳不是严格递增
+        first = IndexedLogFile(self.path, clock=self.clock)
+        second = IndexedLogFile(self.path, clock=self.clock)
+        first.write([entry(1000.0, logging.INFO, 'a0'), entry(1002.0, logging.INFO, 'a2')])
+        second.write([entry(1001.0, logging.INFO, 'b1'), entry(1003.0, logging.INFO, 'b3')])
+        first.write([entry(1004.0, logging.INFO, 'a4')])
+        second.write([entry(1002.5, logging.INFO, 'b2.5')])
+        first.close()
+        second.close()
+
+        records = query_log(self.path, start=1001.0, end=1003.0)
+        self.assertEqual([r['msg'] for r in records], ['a2', 'b1', 'b2.5'])
+        self.assertEqual([r['msg'] for r in query_log(self.path, start=1004.0)], ['a4'])
+
+    def test_rotation_compresses_and_resets_index(self):
+        logfile = IndexedLogFile(self.path, max_bytes=200, backup_count=2, clock=self.clock)
+        for i in range(12):
+            self.clock.now += 1
+            logfile.write([entry(self.clock.now, logging.INFO, f"第{i}条日志" + 'x' * 40)])
+        logfile.close()
+
+        backups = glob.glob(self.path + '.*.gz')
+        self.assertEqual(len(backups), 2)
+        with gzip.open(sorted(backups)[-1], 'rt', encoding='utf-8') as f:
+            self.assertTrue(all(json.loads(line)['msg'].startswith('第') for line in f))
+        # 索引只覆盖当前文件，偏移与当前文件一致
+        records = query_log(self.path)
+        self.assertEqual(records[-1]['msg'], '第11条日志' + 'x' * 40)
+        with open(self.path, 'r', encoding='utf-8') as f:
+            self.assertEqual(len(records), len(f.readlines()))
+
+    def test_rotation_by_time(self):
+        logfile = IndexedLogFile(self.path, rotate_interval=60, clock=self.clock)
+        logfile.write([entry(self.clock.now, logging.INFO, '旧日志')])
+        self.clock.now += 61
+        logfile.write([entry(self.clock.now, logging.INFO, '新日志')])
+        logfile.close()
+        self.assertEqual(len(glob.glob(self.path + '.*.gz')), 1)
+        self.assertEqual([r['msg'] for r in query_log(self.path)], ['新日志'])
+
+    def test_writer_follows_rotation_by_other_process(self):
+        first = IndexedLogFile(self.path, max_bytes=100, clock=self.clock)
+        second = IndexedLogFile(self.path, max_bytes=100, clock=self.clock)
+        first.write([entry(1000.0, logging.INFO, 'a' * 120)])
+        second.write([entry(1001.0, logging.INFO, '触发轮转')])
+        first.write([entry(1002.0, logging.INFO, '轮转后')])
+        first.close()
+        second.close()
+        self.assertEqual([r['msg'] for r in query_log(self.path)], ['触发轮转', '轮转后'])
+
+
+class TestAsyncLogHandler(unittest.TestCase):
+    def test_records_written_in_background(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'weather.log')
+            handler = AsyncLogHandler(IndexedLogFile(path))
+            handler.setFormatter(JsonFormatter())
+            logger = logging.getLogger('test_structured_log')
+            logger.propagate = False
+            logger.setLevel(logging.INFO)
+            logger.addHandler(handler)
+            try:
+                logger.info('天气预报推送成功')
+                logger.warning('商品状态异常', extra={'sku': '100012043978'})
+            finally:
+                logger.removeHandler(handler)
+                handler.close()
+
+            records = query_log(path, sku='100012043978')
+            self.assertEqual(len(records), 1)
+            self.assertEqual(records[0]['level'], 'WARNING')
+            self.assertEqual(records[0]['sku'], '100012043978')
+            self.assertEqual(len(query_log(path)), 2)
+
+    def test_writer_survives_unexpected_errors(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'jd_monitor.log')
+            logfile = IndexedLogFile(path)
+            handler = AsyncLogHandler(logfile)
+            handler.setFormatter(JsonFormatter())
+            write = logfile.write
+            calls = []
+
+            def flaky_write(items):
+                calls.append(len(items))
+                if len(calls) == 1:
+                    raise ValueError('意外错误')
+                write(items)
+
+            logfile.write = flaky_write
+            logger = logging.getLogger('test_structured_log.flaky')
+            logger.propagate = False
+            logger.setLevel(logging.INFO)
+            logger.addHandler(handler)
+            try:
+                with patch('sys.stderr'):
+                    logger.info('第一条')
+                    deadline = time.time() + 5
+                    while not calls and time.time() < deadline:
+                        time.sleep(0.01)
+                    # 写入失败后后台线程仍在运行
+                    logger.info('第二条')
+            finally:
+                logger.removeHandler(handler)
+                handler.close()
+            self.assertEqual([r['msg'] for r in query_log(path)], ['第二条'])
+
+
+class TestRenderText(unittest.TestCase):
+    def test_json_lines_rendered_as_text(self):
+        text = '2025-04-03 16:31:24,734 - ERROR - 旧格式\n' + json.dumps({'ts': 0.5, 'level': 'INFO', 'msg': '新格式'})
+        lines = render_text(text).split('\n')
+        self.assertEqual(lines[0], '2025-04-03 16:31:24,734 - ERROR - 旧格式')
+        self.assertTrue(lines[1].endswith(',500 - INFO - 新格式'))
+
+    def test_parse_level(self):
+        self.assertEqual(parse_level('error'), logging.ERROR)
+        self.assertEqual(parse_level('30'), 30)
+        self.assertIsNone(parse_level('verbose'))
+        self.assertIsNone(parse_level(None))
+
+
+if __name__ == '__main__':
+    unittest.main()
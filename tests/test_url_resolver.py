@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+import re
+import tempfile
+import threading
+import time
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from url_resolver import SkuResolver
+
+SHORT_LINKS = {
+    'https://3.cn/a': 'https://item.jd.com/1001.html',
+    'https://3.cn/b': 'https://item.jd.com/1002.html',
+    'https://3.cn/c': 'https://item.jd.com/1003.html',
+}
+
+
+def extract(url):
+    match = re.search(r'item\.jd\.com/(\d+)\.html', url)
+    return match.group(1) if match else None
+
+
+class TestSkuResolver(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache_file = os.path.join(self.tmpdir.name, 'url_cache.json')
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def resolve(self, url):
+        with self.lock:
+            self.calls.append(url)
+        time.sleep(0.1)
+        if url not in SHORT_LINKS:
+            raise IOError('not found')
+        return SHORT_LINKS[url]
+
+    def make_resolver(self, **kwargs):
+        return SkuResolver(self.resolve, extract, cache_file=self.cache_file, **kwargs)
+
+    def test_standard_url_needs_no_network(self):
+        resolver = self.make_resolver()
+        self.assertEqual(resolver.get('https://item.jd.com/42.html'), '42')
+        self.assertEqual(self.calls, [])
+        self.assertFalse(os.path.exists(self.cache_file))
+
+    def test_bulk_resolution_is_concurrent_and_cached(self):
+        resolver = self.make_resolver()
+        started = time.time()
+        results = resolver.resolve_all(list(SHORT_LINKS))
+        # 三个链接并发解析，总耗时接近单个请求
+        self.assertLess(time.time() - started, 0.25)
+        self.assertEqual(results['https://3.cn/b'], '1002')
+
+        # 新的解析器从缓存文件读取，不再联网
+        self.calls.clear()
+        resolver = self.make_resolver()
+        self.assertEqual(resolver.get('https://3.cn/c'), '1003')
+        self.assertEqual(self.calls, [])
+
+    def test_failures_are_negatively_cached(self):
+        now = [1000.0]
+        resolver = self.make_resolver(negative_ttl=60, clock=lambda: now[0])
+        self.assertIsNone(resolver.get('https://3.cn/missing'))
+        self.assertIsNone(resolver.get('https://3.cn/missing'))
+        self.assertEqual(len(self.calls), 1)
+
+        # 失败结果过期后重新解析
+        now[0] += 61
+        resolver.get('https://3.cn/missing')
+        self.assertEqual(len(self.calls), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+import json
+import tempfile
+import time
+import subprocess
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from worker_supervisor import Supervisor, SupervisorClient
+
+SLEEPER = '''
+import time
+open({started!r}, 'w').close()
+try:
+    while True:
+        time.sleep(0.05)
+except KeyboardInterrupt:
+    open({cleaned!r}, 'w').close()
+'''
+
+CRASHER = '''
+print("starting")
+raise RuntimeError("boom")
+'''
+
+STUBBORN = '''
+import time
+while True:
+    try:
+        time.sleep(0.05)
+    except KeyboardInterrupt:
+        pass
+'''
+
+
+class TestWorkerSupervisor(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.dir = self.tmpdir.name
+        self.run_dir = os.path.join(self.dir, 'run')
+        self.started = os.path.join(self.dir, 'started')
+        self.cleaned = os.path.join(self.dir, 'cleaned')
+        workers = {}
+        for name, source in (('sleeper', SLEEPER.format(started=self.started, cleaned=self.cleaned)),
+                             ('crasher', CRASHER), ('stubborn', STUBBORN)):
+            path = os.path.join(self.dir, f'{name}.py')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(source)
+            workers[name] = {'name': name, 'file': path, 'log_file': f'{name}.log'}
+        self.supervisor = Supervisor(workers, run_dir=self.run_dir, stop_timeout=0.3, base_delay=10)
+        self.client = SupervisorClient(self.run_dir)
+
+    def tearDown(self):
+        self.supervisor.stopping = True
+        self.wait_for(lambda: all(w.state in ('stopped', 'backoff') for w in self.supervisor.workers.values()))
+        self.tmpdir.cleanup()
+
+    def wait_for(self, condition, timeout=5):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            self.supervisor.reconcile()
+            if condition():
+                return True
+            time.sleep(0.02)
+        return False
+
+    def test_start_and_graceful_stop(self):
+        worker = self.supervisor.workers['sleeper']
+        self.client.set_desired('sleeper', True)
+        self.supervisor.reconcile()
+        self.assertEqual(worker.state, 'running')
+        self.assertTrue(self.wait_for(lambda: os.path.exists(self.started)))
+
+        with open(os.path.join(self.run_dir, 'supervisor.json'), encoding='utf-8') as f:
+            status = json.load(f)['workers']['sleeper']
+        self.assertEqual((status['status'], status['pid']), ('running', worker.pid))
+
+        self.client.set_desired('sleeper', False)
+        self.assertTrue(self.wait_for(lambda: worker.state == 'stopped'))
+        # SIGTERM转换为KeyboardInterrupt，脚本的收尾逻辑会执行
+        self.assertTrue(os.path.exists(self.cleaned))
+        self.assertEqual(worker.last_exit, 0)
+
+    def test_crash_restarts_with_backoff_and_captures_output(self):
+        worker = self.supervisor.workers['crasher']
+        self.client.set_desired('crasher', True)
+        self.assertTrue(self.wait_for(lambda: worker.state == 'backoff'))
+        self.assertEqual((worker.restarts, worker.last_exit), (1, 1))
+        self.assertGreater(worker.next_start, time.time() + 5)
+
+        with open(worker.console_log, encoding='utf-8') as f:
+            output = f.read()
+        self.assertIn("starting", output)
+        self.assertIn("RuntimeError: boom", output)
+
+        # 等待重启期间停止
+        self.client.set_desired('crasher', False)
+        self.supervisor.reconcile()
+        self.assertEqual(worker.state, 'stopped')
+
+    def test_backoff_is_exponential_and_capped(self):
+        self.supervisor.base_delay = 1
+        self.supervisor.max_delay = 10
+        self.assertEqual([self.supervisor.backoff(n) for n in range(6)], [0, 1, 2, 4, 8, 10])
+
+    def test_kills_worker_ignoring_sigterm(self):
+        worker = self.supervisor.workers['stubborn']
+        self.client.set_desired('stubborn', True)
+        self.supervisor.reconcile()
+        time.sleep(0.2)
+        self.client.set_desired('stubborn', False)
+        self.assertTrue(self.wait_for(lambda: worker.state == 'stopped'))
+        self.assertEqual(worker.last_exit, -9)
+
+    def test_sharded_worker_group(self):
+        script = os.path.join(self.dir, 'sharded.py')
+        with open(script, 'w', encoding='utf-8') as f:
+            f.write("import os, time\n"
+                    f"open(os.path.join({self.dir!r}, os.environ['SHARD_ID']), 'w').close()\n"
+                    "time.sleep(30)\n")
+        config = os.path.join(self.dir, 'config.ini')
+        with open(config, 'w', encoding='utf-8') as f:
+            f.write(f"[Shard]\nworkers = 2\npath = {os.path.join(self.dir, 'shards.db')}\n")
+        supervisor = Supervisor({'sharded': {'name': 'sharded', 'file': script, 'shard_env': 'SHARD_ID'}},
+                                run_dir=self.run_dir, stop_timeout=0.3, config_file=config)
+        self.supervisor = supervisor
+        self.assertEqual(sorted(supervisor.workers), ['sharded-0', 'sharded-1'])
+
+        self.client.set_desired('sharded', True)
+        self.assertTrue(self.wait_for(lambda: all(
+            os.path.exists(os.path.join(self.dir, name)) for name in supervisor.workers)))
+
+        # 状态按脚本汇总，分片明细放在shards中
+        status = self.client.read_status()['workers']['sharded']
+        self.assertEqual((status['status'], status['state']), ('running', 'running'))
+        self.assertEqual(sorted(status['shards']), ['sharded-0', 'sharded-1'])
+
+        # 分片意外退出时从成员列表中移除，其余分片立即重新分配
+        supervisor.shard_registry.join('sharded-1')
+        os.kill(supervisor.workers['sharded-1'].pid, 9)
+        self.assertTrue(self.wait_for(lambda: supervisor.workers['sharded-1'].state == 'backoff'))
+        self.assertNotIn('sharded-1', supervisor.shard_registry.members()[1])
+        self.assertEqual(self.client.read_status()['workers']['sharded']['state'], 'degraded')
+
+    def exited_pid(self):
+        process = subprocess.Popen([sys.executable, '-c', 'pass'])
+        process.wait()
+        return process.pid
+
+    def write_heartbeat(self, pid, heartbeat):
+        with open(os.path.join(self.run_dir, 'supervisor.json'), 'w', encoding='utf-8') as f:
+            json.dump({'pid': pid, 'heartbeat': heartbeat, 'workers': {}}, f)
+
+    def test_single_supervisor_lock(self):
+        lock_file = self.client.acquire_lock()
+        try:
+            self.assertIsNone(self.client.acquire_lock())
+        finally:
+            lock_file.close()
+
+    def test_alive_does_not_take_lock(self):
+        self.assertFalse(self.client.alive())
+        self.supervisor.write_status(force=True)
+        self.assertTrue(self.client.alive())
+        # 探测期间监督进程仍然可以拿到锁
+        lock_file = self.client.acquire_lock()
+        self.assertIsNotNone(lock_file)
+        try:
+            self.assertTrue(self.client.alive())
+        finally:
+            lock_file.close()
+
+        # 心跳超时或进程已经退出都视为没有运行
+        self.write_heartbeat(os.getpid(), time.time() - 60)
+        self.assertFalse(self.client.alive())
+        self.write_heartbeat(self.exited_pid(), time.time())
+        self.assertFalse(self.client.alive())
+
+    def test_status_without_supervisor(self):
+        self.client.set_desired('sleeper', True)
+        self.supervisor.reconcile()
+        # 写入状态文件的监督进程已经退出时视为没有运行
+        status = self.client.read_status()
+        self.write_heartbeat(self.exited_pid(), status['heartbeat'])
+        self.assertEqual(self.client.status(['sleeper'])['sleeper']['status'], 'stopped')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,12 +3,13 @@
 
 import unittest
 import json
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch
 from configparser import ConfigParser
 import os
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from jd_monitor_lite import JDMonitor
+from http_pool import HTTPResult
 
 class TestWxPusherNotification(unittest.TestCase):
     def setUp(self):
@@ -34,16 +35,14 @@ class TestWxPusherNotification(unittest.TestCase):
         if os.path.exists(self.test_config):
             os.remove(self.test_config)
     
-    @patch('urllib.request.urlopen')
-    def test_successful_notification(self, mock_urlopen):
+    @patch('http_pool.ConnectionPool.request')
+    def test_successful_notification(self, mock_request):
         # 模拟成功响应
-        mock_response = MagicMock()
-        mock_response.read.return_value = json.dumps({
+        mock_request.return_value = HTTPResult(200, 'OK', {}, json.dumps({
             'success': True,
             'msg': 'success',
             'data': {'messageId': '123'}
-        }).encode('utf-8')
-        mock_urlopen.return_value = mock_response
+        }).encode('utf-8'))
         
         result = self.monitor.send_wxpusher_notification(
             "测试标题",
@@ -51,16 +50,14 @@ class TestWxPusherNotification(unittest.TestCase):
         )
         self.assertTrue(result)
     
-    @patch('urllib.request.urlopen')
-    def test_failed_notification(self, mock_urlopen):
+    @patch('http_pool.ConnectionPool.request')
+    def test_failed_notification(self, mock_request):
         # 模拟失败响应
-        mock_response = MagicMock()
-        mock_response.read.return_value = json.dumps({
+        mock_request.return_value = HTTPResult(200, 'OK', {}, json.dumps({
             'success': False,
             'msg': 'invalid token',
             'data': None
-        }).encode('utf-8')
-        mock_urlopen.return_value = mock_response
+        }).encode('utf-8'))
         
         result = self.monitor.send_wxpusher_notification(
             "测试标题",
@@ -85,10 +82,10 @@ class TestWxPusherNotification(unittest.TestCase):
         )
         self.assertFalse(result)
     
-    @patch('urllib.request.urlopen')
-    def test_network_error(self, mock_urlopen):
+    @patch('http_pool.ConnectionPool.request')
+    def test_network_error(self, mock_request):
         # 模拟网络错误
-        mock_urlopen.side_effect = Exception('Network error')
+        mock_request.side_effect = Exception('Network error')
         
         result = self.monitor.send_wxpusher_notification(
             "测试标题",
@@ -96,18 +93,26 @@ class TestWxPusherNotification(unittest.TestCase):
         )
         self.assertFalse(result)
     
-    @patch('urllib.request.urlopen')
-    def test_json_decode_error(self, mock_urlopen):
+    @patch('http_pool.ConnectionPool.request')
+    def test_json_decode_error(self, mock_request):
         # 模拟JSON解析错误
-        mock_response = MagicMock()
-        mock_response.read.return_value = b'Invalid JSON'
-        mock_urlopen.return_value = mock_response
+        mock_request.return_value = HTTPResult(200, 'OK', {}, b'Invalid JSON')
         
         result = self.monitor.send_wxpusher_notification(
             "测试标题",
             "测试内容"
         )
         self.assertFalse(result)
+    
+    @patch('metrics.start_exporter')
+    @patch('http_pool.ConnectionPool.request')
+    def test_run_exports_metrics(self, mock_request, mock_start_exporter):
+        mock_request.return_value = HTTPResult(200, 'OK', {}, json.dumps({'success': True}).encode('utf-8'))
+        self.monitor.run()
+        # 运行期间导出指标，退出时停止导出
+        mock_start_exporter.assert_called_once_with('jd_monitor_lite')
+        mock_start_exporter.return_value.stop.assert_called_once_with()
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from sku_extract import extract_sku
+
+
+class SkuResolver:
+    """商品链接到商品ID的解析缓存
+
+    能直接从链接中提取商品ID的不联网；短链接解析结果写入缓存文件，
+    成功结果和失败结果分别设置有效期，启动时整批链接并发解析。
+    """
+
+    def __init__(self, resolve, extract=extract_sku, cache_file='url_cache.json', ttl=30 * 86400,
+                 negative_ttl=3600, max_workers=8, clock=time.time):
+        # resolve(url) 返回跳转后的链接，失败时抛出异常
+        # extract(url) 从链接中提取商品ID，不联网，失败返回None
+        self.resolve = resolve
+        self.extract = extract
+        self.cache_file = cache_file
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_workers = max_workers
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.dirty = False
+        # url -> {'sku': 商品ID或None, 'expires': 过期时间}
+        self.cache = self.load()
+
+    def load(self):
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return {}
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logging.error(f"读取链接解析缓存失败: {e}")
+            return {}
+
+    def save(self):
+        """缓存有变化时写入文件"""
+        with self.lock:
+            if not self.cache_file or not self.dirty:
+                return
+            now = self.clock()
+            cache = {url: entry for url, entry in self.cache.items() if entry['expires'] > now}
+            self.dirty = False
+        try:
+            # 多个分片进程共用缓存文件，临时文件按进程区分
+            tmp_file = f"{self.cache_file}.{os.getpid()}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(cache, f, ensure_ascii=False)
+            os.replace(tmp_file, self.cache_file)
+        except Exception as e:
+            logging.error(f"保存链接解析缓存失败: {e}")
+
+    def cached(self, url):
+        """查询缓存，返回 (是否命中, 商品ID)"""
+        with self.lock:
+            entry = self.cache.get(url)
+        if entry and entry['expires'] > self.clock():
+            return True, entry['sku']
+        return False, None
+
+    def remember(self, url, sku):
+        ttl = self.ttl if sku else self.negative_ttl
+        with self.lock:
+            self.cache[url] = {'sku': sku, 'expires': self.clock() + ttl}
+            self.dirty = True
+
+    def resolve_one(self, url):
+        """解析单个链接，结果写入内存缓存"""
+        try:
+            sku = self.extract(self.resolve(url))
+        except Exception as e:
+            logging.error(f"解析短链接失败: {e}")
+            sku = None
+        if not sku:
+            logging.error(f"无法从URL中提取商品ID: {url}")
+        self.remember(url, sku)
+        return sku
+
+    def lookup(self, url):
+        """不联网能得到结果时直接返回 (True, 商品ID)，否则返回 (False, None)"""
+        # 链接本身包含商品ID时不必解析
+        sku = self.extract(url)
+        if sku:
+            return True, sku
+        return self.cached(url)
+
+    def resolve_all(self, urls):
+        """并发解析一批链接，返回 url -> 商品ID（失败为None）"""
+        results = {}
+        pending = []
+        for url in urls:
+            found, sku = self.lookup(url)
+            if found:
+                results[url] = sku
+            elif url not in pending:
+                pending.append(url)
+
+        if pending:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(pending))) as executor:
+                for url, sku in zip(pending, executor.map(self.resolve_one, pending)):
+                    results[url] = sku
+            self.save()
+        return results
+
+    def get(self, url):
+        """解析单个链接"""
+        return self.resolve_all([url])[url]
@@ -4,11 +4,16 @@ from datetime import datetime
 import time
 from configparser import ConfigParser
 import json
+from notifier import NotificationDispatcher
+from config_watcher import ConfigWatcher
+import metrics
+from structured_log import setup_logging
 
 class WeatherMonitor:
     def __init__(self, config_file='config.ini'):
         self.config_file = config_file
         self.load_config()
+        self.config_watcher = ConfigWatcher(self.config_file)
 
     def load_config(self):
         """加载配置文件"""
@@ -20,19 +25,33 @@ class WeatherMonitor:
         self.push_time = config.get('Weather', 'push_time')
         self.wxpusher_token = config.get('WxPusher', 'token')
         self.wxpusher_uids = json.loads(config.get('WxPusher', 'uids'))
+        # 未送达的通知保存在该文件中，重启后继续发送
+        self.notify_queue_file = config.get('Weather', 'queue_file', fallback='weather_notify_queue.json')
 
     def get_weather_forecast(self):
         """获取明天的天气预报"""
+        host = 'restapi.amap.com'
         try:
             # 高德天气API接口
-            url = "https://restapi.amap.com/v3/weather/weatherInfo"
+            url = f"https://{host}/v3/weather/weatherInfo"
             params = {
                 'city': self.city_id,
                 'key': self.api_key,
                 'extensions': 'all'  # 获取预报天气
             }
-            response = requests.get(url, params=params)
-            data = response.json()
+            start = time.perf_counter()
+            try:
+                response = requests.get(url, params=params, timeout=15)
+            except Exception as e:
+                metrics.inc('http_request_errors_total', host=host, reason=type(e).__name__)
+                raise
+            finally:
+                metrics.observe('http_request_duration_seconds', time.perf_counter() - start, host=host)
+            try:
+                data = response.json()
+            except ValueError:
+                metrics.inc('json_decode_errors_total', host=host)
+                raise
 
             if data['status'] == '1' and data['forecasts']:
                 # 获取明天的天气数据（索引0是今天，1是明天）
@@ -118,11 +137,21 @@ class WeatherMonitor:
 
         return message
 
-    def send_wxpusher_notification(self, content):
-        """发送WxPusher通知"""
+    def notify(self, content):
+        """通知交给后台线程发送，不阻塞推送循环"""
         if not self.wxpusher_token or not self.wxpusher_uids:
             logging.error("WxPusher配置不完整，无法发送通知")
             return False
+        # 同一天的预报只推送一次
+        key = f"weather:{datetime.now().strftime('%Y-%m-%d')}"
+        return self.dispatcher.notify("今日天气预报", content, self.wxpusher_uids, key=key)
+
+    def send_wxpusher_notification(self, content, uids=None):
+        """发送WxPusher通知"""
+        uids = uids or self.wxpusher_uids
+        if not self.wxpusher_token or not uids:
+            logging.error("WxPusher配置不完整，无法发送通知")
+            return False
 
         try:
             url = "https://wxpusher.zjiecode.com/api/send/message"
@@ -131,29 +160,47 @@ class WeatherMonitor:
                 "content": content,
                 "summary": "今日天气预报",
                 "contentType": 1,
-                "uids": self.wxpusher_uids
+                "uids": uids
             }
 
-            response = requests.post(url, json=data)
+            start = time.perf_counter()
+            response = requests.post(url, json=data, timeout=10)
             result = response.json()
+            metrics.observe('notify_send_duration_seconds', time.perf_counter() - start)
 
             if result.get('success'):
+                metrics.inc('notify_sent_total', result='success')
                 logging.info("天气预报推送成功")
                 return True
             else:
+                metrics.inc('notify_sent_total', result='failed')
                 logging.error(f"天气预报推送失败: {result}")
                 return False
 
         except Exception as e:
+            metrics.inc('notify_sent_total', result='error')
             logging.error(f"发送天气预报通知时出错: {e}")
             return False
 
     def run(self):
         """运行天气监控程序"""
         logging.info("启动天气预报推送服务")
+        self.dispatcher = NotificationDispatcher(
+            lambda n: self.send_wxpusher_notification(n.content, list(n.uids)),
+            queue_file=self.notify_queue_file,
+            dedup_ttl=86400
+        )
+        self.dispatcher.start()
+        metrics.gauge_callback('notify_queue_depth', self.dispatcher.pending_count)
+        self.metrics_exporter = metrics.start_exporter('weather')
         
         while True:
             try:
+                # 配置文件修改后直接生效，不需要重启
+                if self.config_watcher.changed():
+                    self.load_config()
+                    logging.info(f"配置已重新加载，推送时间: {self.push_time}")
+                
                 current_time = datetime.now()
                 target_time = datetime.strptime(self.push_time, '%H:%M').time()
                 
@@ -164,7 +211,7 @@ class WeatherMonitor:
                     if weather_data:
                         message = self.format_weather_message(weather_data)
                         if message:
-                            self.send_wxpusher_notification(message)
+                            self.notify(message)
                     
                     # 等待一分钟，避免重复推送
                     time.sleep(60)
@@ -172,19 +219,18 @@ class WeatherMonitor:
                     # 每分钟检查一次
                     time.sleep(60)
 
+            except KeyboardInterrupt:
+                logging.info("程序已手动停止")
+                self.dispatcher.stop()
+                self.metrics_exporter.stop()
+                break
+
             except Exception as e:
                 logging.error(f"天气预报服务运行出错: {e}")
                 time.sleep(60)
 
 if __name__ == '__main__':
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler('weather.log', encoding='utf-8'),
-            logging.StreamHandler()
-        ]
-    )
+    setup_logging('weather.log')
     
     weather_monitor = WeatherMonitor()
     weather_monitor.run()
\ No newline at end of file
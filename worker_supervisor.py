@@ -0,0 +1,520 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import importlib
+import json
+import logging
+import os
+import runpy
+import signal
+import subprocess
+import sys
+import time
+import traceback
+from configparser import ConfigParser
+from process_registry import ProcessRegistry, probe_process
+from sharding import ShardRegistry
+
+try:
+    import fcntl
+except ImportError:  # Windows下没有fcntl，无法保证只有一个监督进程
+    fcntl = None
+
+# 受监督的脚本
+WORKERS = {
+    'weather': {
+        'name': '天气监控',
+        'file': 'weather.py',
+        'log_file': 'weather.log'
+    },
+    'jd_monitor': {
+        'name': '京东商品监控',
+        'file': 'jd_monitor.py',
+        'log_file': 'jd_monitor.log',
+        # 按配置中 [Shard] workers 启动多个进程，通过该环境变量告诉脚本自己的分片ID
+        'shard_env': 'JD_SHARD_ID'
+    }
+}
+
+# 监督进程启动时预先导入的模块，子进程fork后不必重新导入
+PRELOAD_MODULES = ('requests',)
+
+STATUS_FILE = 'supervisor.json'
+LOCK_FILE = 'supervisor.lock'
+
+
+def _terminate(signum, frame):
+    # 把停止信号转换为KeyboardInterrupt，脚本中已有的收尾逻辑（保存状态、发送剩余通知）会执行
+    raise KeyboardInterrupt
+
+
+def _run_child(path, console_log, env):
+    """在fork出的子进程中运行脚本，相当于 python3 path，不会返回"""
+    os.environ.update(env)
+    signal.signal(signal.SIGTERM, _terminate)
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    code = 0
+    try:
+        # 标准输出和错误输出写入文件，不会因为没人读取而阻塞
+        fd = os.open(console_log, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        os.dup2(fd, 1)
+        os.dup2(fd, 2)
+        os.close(fd)
+        sys.stdout = open(1, 'w', encoding='utf-8', buffering=1, closefd=False)
+        sys.stderr = open(2, 'w', encoding='utf-8', buffering=1, closefd=False)
+        # 去掉继承自监督进程的日志配置，脚本自己的日志配置才会生效
+        for handler in logging.root.handlers[:]:
+            logging.root.removeHandler(handler)
+        sys.argv = [path]
+        runpy.run_path(path, run_name='__main__')
+    except SystemExit as e:
+        code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    except KeyboardInterrupt:
+        code = 0
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    finally:
+        try:
+            # 写完日志队列中剩余的日志
+            logging.shutdown()
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(code)
+
+
+class WorkerState:
+    """一个受监督脚本的运行状态"""
+    __slots__ = ('name', 'group', 'file', 'console_log', 'env', 'pid', 'process', 'state', 'started_at',
+                 'restarts', 'failures', 'last_exit', 'next_start', 'stop_deadline')
+
+    def __init__(self, name, file, console_log, group=None, env=None):
+        self.name = name
+        # 同一个脚本的多个分片属于同一组，一起启动和停止
+        self.group = group or name
+        self.file = file
+        self.console_log = console_log
+        self.env = env or {}
+        self.pid = None
+        # 不能fork时使用的Popen对象
+        self.process = None
+        # stopped / running / stopping / backoff
+        self.state = 'stopped'
+        self.started_at = None
+        self.restarts = 0
+        # 连续的异常退出次数，决定重启前的等待时间
+        self.failures = 0
+        self.last_exit = None
+        self.next_start = 0
+        self.stop_deadline = None
+
+    def to_dict(self):
+        return {
+            'status': 'running' if self.state in ('running', 'stopping') else 'stopped',
+            'state': self.state,
+            'pid': self.pid,
+            'started_at': self.started_at,
+            'restarts': self.restarts,
+            'last_exit': self.last_exit,
+            'next_start': self.next_start if self.state == 'backoff' else None,
+        }
+
+
+class Supervisor:
+    """在一个常驻进程中管理所有监控脚本
+
+    监督进程预先导入常用模块后fork出子进程运行脚本，省去每次启动解释器
+    和导入依赖的时间；子进程的输出写入 run_dir 下的文件。脚本意外退出时
+    按指数退避自动重启，稳定运行 stable_after 秒后退避时间重新计算。
+    Web端通过 run_dir 中的期望状态文件启动/停止脚本，监督进程把
+    各脚本的状态和心跳时间写入状态文件。
+    """
+
+    def __init__(self, workers=WORKERS, run_dir='run', poll_interval=0.5, base_delay=1.0, max_delay=300.0,
+                 stable_after=60.0, stop_timeout=10.0, heartbeat=5.0, use_fork=None, clock=time.time,
+                 config_file='config.ini'):
+        self.run_dir = run_dir
+        self.poll_interval = poll_interval
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.stable_after = stable_after
+        self.stop_timeout = stop_timeout
+        self.heartbeat = heartbeat
+        self.use_fork = hasattr(os, 'fork') if use_fork is None else use_fork
+        self.clock = clock
+        self.client = SupervisorClient(run_dir)
+        self.registry = ProcessRegistry(run_dir, probe_process)
+        self.groups = list(workers)
+        self.load_shard_config(config_file)
+        self.workers = {}
+        for group, spec in workers.items():
+            count = self.shard_workers if spec.get('shard_env') else 1
+            for i in range(count):
+                name = group if count == 1 else f"{group}-{i}"
+                env = {spec['shard_env']: name} if count > 1 else {}
+                self.workers[name] = WorkerState(name, spec['file'], os.path.join(run_dir, f"{name}.out.log"),
+                                                 group, env)
+        # 有分片时充当协调者：分片进程退出后立即移出成员列表，其余分片马上接手它的商品
+        self.shard_registry = None
+        if any(worker.env for worker in self.workers.values()):
+            self.shard_registry = ShardRegistry(self.shard_path)
+        self.last_prune = 0
+        self.last_status = None
+        self.last_write = 0
+        self.stopping = False
+        # 运行期间一直持有的监督进程锁
+        self.lock_file = None
+
+    def load_shard_config(self, config_file):
+        """分片进程数等配置，修改后需要重启监督进程"""
+        config = ConfigParser()
+        config.read(config_file, encoding='utf-8')
+        self.shard_workers = max(1, config.getint('Shard', 'workers', fallback=1))
+        self.shard_path = config.get('Shard', 'path', fallback='shards.db')
+        self.shard_ttl = config.getfloat('Shard', 'ttl', fallback=20.0)
+
+    def backoff(self, failures):
+        """第failures次连续异常退出后重启前等待的秒数"""
+        if failures <= 0:
+            return 0.0
+        return min(self.max_delay, self.base_delay * 2 ** (failures - 1))
+
+    def spawn(self, worker):
+        # 子进程把指标快照写入 run_dir/metrics/<名称>.json，由Web端的 /metrics 汇总
+        env = dict(worker.env, METRICS_DIR=os.path.join(self.run_dir, 'metrics'), METRICS_NAME=worker.name)
+        if self.use_fork:
+            pid = os.fork()
+            if pid == 0:
+                # 子进程不能继续持有监督进程锁，否则监督进程退出后仍被视为在运行
+                if self.lock_file is not None:
+                    self.lock_file.close()
+                _run_child(worker.file, worker.console_log, env)
+            return pid
+        with open(worker.console_log, 'ab') as console:
+            worker.process = subprocess.Popen([sys.executable, worker.file], stdout=console, stderr=console,
+                                              env=dict(os.environ, **env))
+        return worker.process.pid
+
+    def start(self, worker):
+        worker.pid = self.spawn(worker)
+        worker.state = 'running'
+        worker.started_at = self.clock()
+        worker.stop_deadline = None
+        self.registry.record(worker.name, worker.pid)
+        logging.info(f"已启动 {worker.name}，pid={worker.pid}")
+
+    def stop(self, worker):
+        """发送停止信号，超过 stop_timeout 秒仍未退出时强制结束"""
+        if worker.state != 'running':
+            return
+        worker.state = 'stopping'
+        worker.stop_deadline = self.clock() + self.stop_timeout
+        self.signal(worker, signal.SIGTERM)
+
+    def signal(self, worker, signum):
+        try:
+            os.kill(worker.pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def poll(self, worker):
+        """子进程已退出时返回退出码，否则返回None"""
+        if worker.process is not None:
+            return worker.process.poll()
+        try:
+            pid, status = os.waitpid(worker.pid, os.WNOHANG)
+        except ChildProcessError:
+            return -1
+        if pid == 0:
+            return None
+        if os.WIFSIGNALED(status):
+            return -os.WTERMSIG(status)
+        return os.WEXITSTATUS(status)
+
+    def exited(self, worker, code, wanted):
+        now = self.clock()
+        stopping = worker.state == 'stopping'
+        worker.last_exit = code
+        worker.pid = None
+        worker.process = None
+        self.registry.remove(worker.name)
+        if worker.env and self.shard_registry:
+            self.shard_registry.leave(worker.name)
+        if stopping or not wanted:
+            worker.state = 'stopped'
+            logging.info(f"{worker.name} 已停止，退出码 {code}")
+            return
+
+        # 意外退出：稳定运行一段时间后退出的重新计算退避时间
+        if worker.started_at is not None and now - worker.started_at >= self.stable_after:
+            worker.failures = 0
+        worker.failures += 1
+        worker.restarts += 1
+        worker.next_start = now + self.backoff(worker.failures)
+        worker.state = 'backoff'
+        logging.warning(f"{worker.name} 意外退出，退出码 {code}，{worker.next_start - now:.0f}秒后重启")
+
+    def reconcile(self):
+        """检查所有脚本，使实际状态和期望状态一致"""
+        now = self.clock()
+        for worker in self.workers.values():
+            wanted = not self.stopping and self.client.desired(worker.group)
+
+            if worker.state in ('running', 'stopping'):
+                code = self.poll(worker)
+                if code is not None:
+                    self.exited(worker, code, wanted)
+                elif not wanted and worker.state == 'running':
+                    self.stop(worker)
+                elif worker.state == 'stopping' and now >= worker.stop_deadline:
+                    logging.warning(f"{worker.name} 未在{self.stop_timeout}秒内退出，强制结束")
+                    self.signal(worker, getattr(signal, 'SIGKILL', signal.SIGTERM))
+                    worker.stop_deadline = now + self.stop_timeout
+
+            if worker.state == 'backoff' and not wanted:
+                worker.state = 'stopped'
+            if wanted and worker.state == 'stopped':
+                # 手动启动时重新计算退避时间
+                worker.failures = 0
+                self.start(worker)
+            elif wanted and worker.state == 'backoff' and now >= worker.next_start:
+                self.start(worker)
+
+        if self.shard_registry and now - self.last_prune >= self.heartbeat:
+            # 卡死但没有退出的分片靠心跳超时移除
+            self.last_prune = now
+            try:
+                self.shard_registry.prune(self.shard_ttl)
+            except Exception as e:
+                logging.error(f"清理分片成员失败: {e}")
+        self.write_status()
+
+    def write_status(self, force=False):
+        """状态变化或到心跳时间时写入状态文件"""
+        status = {}
+        for group in self.groups:
+            members = [worker for worker in self.workers.values() if worker.group == group]
+            if len(members) == 1:
+                status[group] = members[0].to_dict()
+                continue
+            # 多个分片汇总为一条：任一分片在运行即为运行中
+            shards = {worker.name: worker.to_dict() for worker in members}
+            running = [info for info in shards.values() if info['status'] == 'running']
+            if len(running) == len(shards):
+                state = 'running'
+            elif running:
+                state = 'degraded'
+            else:
+                state = 'backoff' if any(worker.state == 'backoff' for worker in members) else 'stopped'
+            status[group] = {
+                'status': 'running' if running else 'stopped',
+                'state': state,
+                'pid': running[0]['pid'] if running else None,
+                'started_at': min((info['started_at'] for info in running), default=None),
+                'restarts': sum(info['restarts'] for info in shards.values()),
+                'last_exit': None,
+                'next_start': None,
+                'shards': shards,
+            }
+        now = self.clock()
+        if not force and status == self.last_status and now - self.last_write < self.heartbeat:
+            return
+        self.last_status = status
+        self.last_write = now
+        path = os.path.join(self.run_dir, STATUS_FILE)
+        tmp_path = path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'pid': os.getpid(), 'heartbeat': now, 'workers': status}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.error(f"写入监督状态失败: {e}")
+
+    def kill_orphans(self):
+        """结束上一次监督进程异常退出后遗留的脚本进程"""
+        for name in self.workers:
+            pid = self.registry.get(name)
+            if pid:
+                logging.warning(f"结束遗留的 {name} 进程，pid={pid}")
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
+            self.registry.remove(name)
+
+    def shutdown(self, signum=None, frame=None):
+        self.stopping = True
+
+    def run(self):
+        """监督进程主循环，已有监督进程在运行时直接返回False"""
+        self.lock_file = self.client.acquire_lock()
+        if self.lock_file is None:
+            logging.info("监督进程已在运行")
+            return False
+
+        for name in PRELOAD_MODULES:
+            try:
+                importlib.import_module(name)
+            except ImportError:
+                pass
+
+        signal.signal(signal.SIGTERM, self.shutdown)
+        signal.signal(signal.SIGINT, self.shutdown)
+        self.kill_orphans()
+        logging.info(f"监督进程已启动，pid={os.getpid()}")
+        try:
+            while True:
+                self.reconcile()
+                if self.stopping and all(w.state in ('stopped', 'backoff') for w in self.workers.values()):
+                    break
+                time.sleep(self.poll_interval)
+        finally:
+            # 退出时保留期望状态，下次启动后自动恢复运行
+            self.write_status(force=True)
+            self.lock_file.close()
+            self.lock_file = None
+            logging.info("监督进程已停止")
+        return True
+
+
+class SupervisorClient:
+    """Web端和命令行通过 run_dir 中的文件与监督进程通信"""
+
+    def __init__(self, run_dir='run', stale_after=30.0):
+        self.run_dir = run_dir
+        self.stale_after = stale_after
+        os.makedirs(run_dir, exist_ok=True)
+
+    def want_path(self, name):
+        return os.path.join(self.run_dir, f"{name}.want")
+
+    def desired(self, name):
+        """脚本是否应该运行"""
+        try:
+            with open(self.want_path(name), 'r', encoding='utf-8') as f:
+                return f.read().strip() == 'running'
+        except FileNotFoundError:
+            return False
+
+    def set_desired(self, name, running):
+        path = self.want_path(name)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write('running' if running else 'stopped')
+        os.replace(tmp_path, path)
+
+    def acquire_lock(self):
+        """获取监督进程锁，返回需要一直保持打开的文件；已被占用时返回None"""
+        lock_file = open(os.path.join(self.run_dir, LOCK_FILE), 'a')
+        if fcntl is None:
+            return lock_file
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return None
+        return lock_file
+
+    def read_status(self):
+        try:
+            with open(os.path.join(self.run_dir, STATUS_FILE), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def alive(self):
+        """监督进程是否在运行：状态文件中的进程还存在，且心跳没有超时
+
+        只读取状态文件，不去获取监督进程锁，探测时不会让正在启动的监督进程拿不到锁。
+        """
+        data = self.read_status()
+        if not data or time.time() - data['heartbeat'] >= self.stale_after:
+            return False
+        if os.name == 'nt':
+            return True
+        try:
+            os.kill(data['pid'], 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def status(self, names=WORKERS):
+        """各脚本的状态；监督进程没有运行时全部视为已停止"""
+        data = self.read_status() if self.alive() else None
+        workers = data['workers'] if data else {}
+        return {
+            name: workers.get(name, {'status': 'stopped', 'state': 'stopped', 'pid': None})
+            for name in names
+        }
+
+    def ensure_running(self):
+        """监督进程没有运行时在后台启动"""
+        if self.alive():
+            return False
+        script = os.path.abspath(__file__)
+        subprocess.Popen([sys.executable, script, 'run', '--run-dir', self.run_dir],
+                         stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                         start_new_session=True)
+        return True
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='监控脚本监督进程')
+    parser.add_argument('command', choices=['run', 'daemon', 'shutdown', 'start', 'stop', 'restart', 'status'])
+    parser.add_argument('name', nargs='?', help='脚本名称：' + '、'.join(WORKERS))
+    parser.add_argument('--run-dir', default=os.environ.get('RUN_DIR', 'run'))
+    args = parser.parse_args(argv)
+    client = SupervisorClient(args.run_dir)
+
+    if args.command == 'run':
+        logging.basicConfig(
+            level=logging.INFO,
+            format='%(asctime)s - %(levelname)s - %(message)s',
+            handlers=[
+                logging.FileHandler(os.path.join(args.run_dir, 'supervisor.log'), encoding='utf-8'),
+                logging.StreamHandler()
+            ]
+        )
+        return 0 if Supervisor(run_dir=args.run_dir).run() else 1
+
+    if args.command == 'daemon':
+        print('监督进程已启动' if client.ensure_running() else '监督进程已在运行')
+        return 0
+
+    if args.command == 'shutdown':
+        data = client.read_status()
+        if not client.alive() or not data:
+            print('监督进程未在运行')
+            return 1
+        os.kill(data['pid'], signal.SIGTERM)
+        print('监督进程正在停止')
+        return 0
+
+    if args.command == 'status':
+        running = client.alive()
+        print(f"监督进程: {'运行中' if running else '未运行'}")
+        for name, info in client.status().items():
+            print(f"{name:12} {info['state']:10} pid={info.get('pid')} 重启次数={info.get('restarts', 0)}")
+        return 0
+
+    if args.name not in WORKERS:
+        parser.error(f"未知的脚本: {args.name}")
+    if args.command == 'restart':
+        client.set_desired(args.name, False)
+        # 等待监督进程停止脚本后再重新启动
+        for _ in range(60):
+            if client.status()[args.name]['status'] == 'stopped':
+                break
+            time.sleep(0.5)
+    client.set_desired(args.name, args.command != 'stop')
+    client.ensure_running()
+    print(f"{args.name}: {'停止' if args.command == 'stop' else '启动'}请求已提交")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,7 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# 生产环境入口：gunicorn -c gunicorn.conf.py wsgi:app
+from app import app
+
+application = app